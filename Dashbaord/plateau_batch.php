@@ -0,0 +1,83 @@
+<?php
+// Batched insert endpoint for the inspection station uploader.
+// Body: {"records": [{"uid": "...", "plateau_number": 3, "duration_seconds": 12.5, "record_time": 1760000000.0}, ...]}
+// Requires sql/001_batch_upload.sql (unique record_uid) so retried batches are ignored.
+$servername = "localhost";
+$username   = "root";
+$password   = "";
+$dbname     = "PEC";
+
+// rows per INSERT statement
+$chunk_size = 200;
+
+header("Content-Type: application/json");
+
+function reply($code, $body) {
+    http_response_code($code);
+    echo json_encode($body);
+    exit;
+}
+
+// Persistent connection ("p:" prefix): reused across requests by the PHP worker
+mysqli_report(MYSQLI_REPORT_OFF);
+$conn = new mysqli("p:" . $servername, $username, $password, $dbname);
+if ($conn->connect_error) {
+    reply(503, ["status" => "error", "error" => "Connection failed: " . $conn->connect_error]);
+}
+
+$payload = json_decode(file_get_contents("php://input"), true);
+if (!is_array($payload) || !isset($payload["records"]) || !is_array($payload["records"])) {
+    reply(400, ["status" => "error", "error" => "expected {\"records\": [...]}"]);
+}
+
+$rows = [];
+foreach ($payload["records"] as $r) {
+    if (!isset($r["uid"]) || !preg_match('/^[0-9a-f]{32}$/', $r["uid"])) {
+        reply(400, ["status" => "error", "error" => "record without a valid uid"]);
+    }
+    $rows[] = [
+        $r["uid"],
+        isset($r["plateau_number"]) ? intval($r["plateau_number"]) : 0,
+        isset($r["duration_seconds"]) ? floatval($r["duration_seconds"]) : 0,
+        isset($r["record_time"]) ? floatval($r["record_time"]) : microtime(true),
+    ];
+}
+
+// Prepared statements are cached per chunk size for the life of this request
+$statements = [];
+function statement_for($conn, &$statements, $n) {
+    if (!isset($statements[$n])) {
+        $values = implode(", ", array_fill(0, $n, "(?, ?, ?, FROM_UNIXTIME(?))"));
+        $statements[$n] = $conn->prepare(
+            "INSERT INTO plateau_monitor (record_uid, plateau_number, duration_seconds, record_time)
+             VALUES $values
+             ON DUPLICATE KEY UPDATE record_uid = record_uid"
+        );
+    }
+    return $statements[$n];
+}
+
+$inserted = 0;
+$conn->begin_transaction();
+foreach (array_chunk($rows, $chunk_size) as $chunk) {
+    $stmt = statement_for($conn, $statements, count($chunk));
+    if (!$stmt) {
+        $conn->rollback();
+        reply(500, ["status" => "error", "error" => $conn->error]);
+    }
+    $params = [];
+    foreach ($chunk as $row) {
+        array_push($params, ...$row);
+    }
+    $stmt->bind_param(str_repeat("sidd", count($chunk)), ...$params);
+    if (!$stmt->execute()) {
+        $conn->rollback();
+        reply(500, ["status" => "error", "error" => $stmt->error]);
+    }
+    // 1 per new row, 0 for a uid already stored by an earlier attempt
+    $inserted += max(0, $stmt->affected_rows);
+}
+$conn->commit();
+
+reply(200, ["status" => "ok", "received" => count($rows), "inserted" => $inserted]);
+?>
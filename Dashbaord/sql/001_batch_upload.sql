@@ -0,0 +1,5 @@
+-- Batched uploads from the inspection station (plateau_batch.php)
+-- record_uid is the journal uid of the part: a retried batch inserts nothing twice.
+ALTER TABLE plateau_monitor
+    ADD COLUMN record_uid CHAR(32) NULL,
+    ADD UNIQUE KEY uq_plateau_monitor_record_uid (record_uid);
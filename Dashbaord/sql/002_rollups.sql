@@ -0,0 +1,80 @@
+-- Pre-aggregated hourly / daily rollups of plateau_monitor, kept up to date by
+-- an AFTER INSERT trigger, so the dashboard gauges read a handful of rows
+-- instead of scanning the day with DATE(record_time).
+--
+-- Run once, ideally while nothing is inserting (the backfill and the trigger
+-- must not both count the same rows).
+
+-- Range predicates on record_time (history / TRS views) use this index
+ALTER TABLE plateau_monitor ADD INDEX idx_plateau_monitor_record_time (record_time);
+
+CREATE TABLE IF NOT EXISTS plateau_rollup_hourly (
+    bucket_start   DATETIME         NOT NULL,   -- record_time truncated to the hour
+    plateau_number INT              NOT NULL,
+    piece_count    INT UNSIGNED     NOT NULL,   -- COUNT(*)
+    duration_count INT UNSIGNED     NOT NULL,   -- COUNT(duration_seconds), for AVG
+    duration_sum   DOUBLE           NOT NULL,
+    duration_min   DOUBLE           NULL,
+    duration_max   DOUBLE           NULL,
+    PRIMARY KEY (bucket_start, plateau_number)
+);
+
+CREATE TABLE IF NOT EXISTS plateau_rollup_daily (
+    day            DATE             NOT NULL,   -- DATE(record_time)
+    plateau_number INT              NOT NULL,
+    piece_count    INT UNSIGNED     NOT NULL,
+    duration_count INT UNSIGNED     NOT NULL,
+    duration_sum   DOUBLE           NOT NULL,
+    duration_min   DOUBLE           NULL,
+    duration_max   DOUBLE           NULL,
+    PRIMARY KEY (day, plateau_number)
+);
+
+-- Backfill from the existing history
+INSERT INTO plateau_rollup_hourly
+SELECT DATE_FORMAT(record_time, '%Y-%m-%d %H:00:00'), plateau_number,
+       COUNT(*), COUNT(duration_seconds), COALESCE(SUM(duration_seconds), 0),
+       MIN(duration_seconds), MAX(duration_seconds)
+FROM plateau_monitor
+GROUP BY 1, 2;
+
+INSERT INTO plateau_rollup_daily
+SELECT DATE(record_time), plateau_number,
+       COUNT(*), COUNT(duration_seconds), COALESCE(SUM(duration_seconds), 0),
+       MIN(duration_seconds), MAX(duration_seconds)
+FROM plateau_monitor
+GROUP BY 1, 2;
+
+DROP TRIGGER IF EXISTS plateau_monitor_rollup;
+
+DELIMITER //
+CREATE TRIGGER plateau_monitor_rollup AFTER INSERT ON plateau_monitor
+FOR EACH ROW
+BEGIN
+    INSERT INTO plateau_rollup_hourly
+        (bucket_start, plateau_number, piece_count, duration_count, duration_sum, duration_min, duration_max)
+    VALUES
+        (DATE_FORMAT(NEW.record_time, '%Y-%m-%d %H:00:00'), NEW.plateau_number,
+         1, NEW.duration_seconds IS NOT NULL, COALESCE(NEW.duration_seconds, 0),
+         NEW.duration_seconds, NEW.duration_seconds)
+    ON DUPLICATE KEY UPDATE
+        piece_count    = piece_count + 1,
+        duration_count = duration_count + (NEW.duration_seconds IS NOT NULL),
+        duration_sum   = duration_sum + COALESCE(NEW.duration_seconds, 0),
+        duration_min   = LEAST(COALESCE(duration_min, NEW.duration_seconds), COALESCE(NEW.duration_seconds, duration_min)),
+        duration_max   = GREATEST(COALESCE(duration_max, NEW.duration_seconds), COALESCE(NEW.duration_seconds, duration_max));
+
+    INSERT INTO plateau_rollup_daily
+        (day, plateau_number, piece_count, duration_count, duration_sum, duration_min, duration_max)
+    VALUES
+        (DATE(NEW.record_time), NEW.plateau_number,
+         1, NEW.duration_seconds IS NOT NULL, COALESCE(NEW.duration_seconds, 0),
+         NEW.duration_seconds, NEW.duration_seconds)
+    ON DUPLICATE KEY UPDATE
+        piece_count    = piece_count + 1,
+        duration_count = duration_count + (NEW.duration_seconds IS NOT NULL),
+        duration_sum   = duration_sum + COALESCE(NEW.duration_seconds, 0),
+        duration_min   = LEAST(COALESCE(duration_min, NEW.duration_seconds), COALESCE(NEW.duration_seconds, duration_min)),
+        duration_max   = GREATEST(COALESCE(duration_max, NEW.duration_seconds), COALESCE(NEW.duration_seconds, duration_max));
+END//
+DELIMITER ;
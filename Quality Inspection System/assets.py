@@ -0,0 +1,127 @@
+"""HMI icons and fonts, and an on-disk bundle of pre-rendered screen layers."""
+import os
+import json
+import math
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Bump when anything drawn into the cached layers changes
+ASSET_VERSION = 1
+
+# -------------------------
+# Icons
+# -------------------------
+def create_icon(icon_type, size=24, color=(255,255,255)):
+    img = Image.new("RGBA", (size, size), (0,0,0,0))
+    draw = ImageDraw.Draw(img)
+    if icon_type == "detection":
+        draw.ellipse([(4,4),(size-4,size-4)], outline=color, width=2)
+        draw.ellipse([(8,8),(size-8,size-8)], fill=color)
+    elif icon_type == "calibration":
+        center = size//2
+        r = size//3
+        draw.ellipse([(center-r,center-r),(center+r,center+r)], outline=color, width=2)
+        for i in range(8):
+            a = i*(2*math.pi/8)
+            x1 = center + int(r*math.cos(a))
+            y1 = center + int(r*math.sin(a))
+            x2 = center + int((r+5)*math.cos(a))
+            y2 = center + int((r+5)*math.sin(a))
+            draw.line([(x1,y1),(x2,y2)], fill=color, width=2)
+    elif icon_type == "production":
+        draw.rectangle([(4,4),(size-4,size-4)], outline=color, width=2)
+        for i in range(1,3):
+            y = 4 + i * ((size-8)//3)
+            draw.line([(4,y),(size-4,y)], fill=color, width=1)
+        for i in range(1,3):
+            x = 4 + i * ((size-8)//3)
+            draw.line([(x,4),(x,size-4)], fill=color, width=1)
+    elif icon_type == "back":
+        draw.polygon([(4,size//2),(size-4,4),(size-4,size-4)], fill=color)
+    elif icon_type == "home":
+        draw.polygon([(size//2,4),(4,size//2),(size-4,size//2)], fill=color)
+        draw.rectangle([(size//4,size//2),(3*size//4,size-4)], fill=color)
+    return img
+
+
+ICON_TYPES = ("detection", "calibration", "production", "back", "home")
+
+_icons = None
+
+
+def icons():
+    """All menu icons, rendered on first use."""
+    global _icons
+    if _icons is None:
+        _icons = {name: create_icon(name) for name in ICON_TYPES}
+    return _icons
+
+
+# -------------------------
+# Fonts
+# -------------------------
+class Fonts:
+    """Menu fonts, each loaded the first time it is drawn with."""
+    SPECS = {
+        "title": ("DejaVuSans-Bold.ttf", 20),
+        "option": ("DejaVuSans.ttf", 16),
+        "small": ("DejaVuSans.ttf", 12),
+    }
+
+    def __init__(self):
+        self._loaded = {}
+
+    def get(self, name):
+        font = self._loaded.get(name)
+        if font is None:
+            path, size = self.SPECS[name]
+            try:
+                font = ImageFont.truetype(path, size)
+            except Exception:
+                font = ImageFont.load_default()
+            self._loaded[name] = font
+        return font
+
+
+# -------------------------
+# Layer bundle
+# -------------------------
+class LayerBundle:
+    """Pre-rendered PIL layers stored as one .npz, valid for one `signature`.
+
+    The signature describes everything the layers depend on (asset version,
+    panel size, menu entries); a bundle written for another signature is
+    ignored, so stale layers are never shown. Keys are strings or tuples of
+    JSON values, as used by the menu's layer cache.
+    """
+    def __init__(self, path, signature):
+        self.path = path
+        self.signature = json.dumps(signature, sort_keys=True)
+
+    def load(self):
+        """{key: PIL image}, or {} when there is no valid bundle."""
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                index = json.loads(str(data["index"]))
+                if index.get("signature") != self.signature:
+                    return {}
+                layers = {}
+                for i, key in enumerate(index["keys"]):
+                    layers[tuple(key) if isinstance(key, list) else key] = \
+                        Image.fromarray(data[f"layer{i}"], index["modes"][i])
+                return layers
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError) as e:
+            print("Ignoring unreadable asset bundle:", e)
+            return {}
+
+    def save(self, layers):
+        keys = list(layers)
+        index = {"signature": self.signature, "keys": keys, "modes": [layers[k].mode for k in keys]}
+        arrays = {f"layer{i}": np.asarray(layers[k]) for i, k in enumerate(keys)}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = self.path + ".tmp.npz"
+        np.savez(tmp, index=np.array(json.dumps(index)), **arrays)
+        os.replace(tmp, self.path)
@@ -0,0 +1,846 @@
+"""Off-line benchmarks for the inspection pipeline.
+
+Runs on a workstation without the Pi hardware, e.g.:
+
+    python benchmark.py replay recorded_frames/
+    python benchmark.py replay frames.npy --repeat 5 --json
+    python benchmark.py pipeline frames.npy --display-ms 40
+    python benchmark.py trigger frames.npy --parts 50 --burst 3
+    python benchmark.py display frames.npy
+    python benchmark.py stations --stations 1 2 4
+    python benchmark.py coarse recorded_frames/ --scale 2
+    python benchmark.py events --presses 200 --gap-ms 20
+    python benchmark.py startup --runs 5
+    python benchmark.py stream --viewers 1 4 --slow-ms 300
+    python benchmark.py track --parts 50
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import numpy as np
+import cv2
+
+from detection import ClipDetector, CoarseToFineDetector, DetectionParams, ENGINES, STAGES, parse_roi
+from pipeline import DetectionPipeline
+from trigger import TriggeredInspector
+from metrics import MetricsRegistry
+from display import DisplayBuffer
+from stations import Station, StationPool
+from events import EventDispatcher
+from stream import PreviewStream
+from tracker import PartTracker
+from fakes import ReplayCamera, FakeDisplay, RecordingOutputs, FakeFrameSource, FakeFixture, SimulatedGPIO
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+# -------------------------
+# Frame loading
+# -------------------------
+def load_frames(path):
+    """Loads recorded frames as RGB arrays from a `.npy` stack or an image directory."""
+    if os.path.isfile(path) and path.endswith(".npy"):
+        stack = np.load(path)
+        if stack.ndim == 3:
+            stack = stack[np.newaxis]
+        return [np.ascontiguousarray(f) for f in stack]
+    if os.path.isdir(path):
+        frames = []
+        for name in sorted(os.listdir(path)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            img = cv2.imread(os.path.join(path, name), cv2.IMREAD_COLOR)
+            if img is None:
+                print("Warning: could not read", name)
+                continue
+            # recorded with cv2 (BGR); the camera hands us RGB
+            frames.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        return frames
+    raise ValueError(f"not a .npy stack or image directory: {path}")
+
+
+# -------------------------
+# Statistics helpers
+# -------------------------
+def percentiles_ms(samples):
+    arr = np.asarray(samples, np.float64) * 1000.0
+    if arr.size == 0:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(arr.max())}
+
+
+def print_table(stats):
+    width = max([12] + [len(stage) + 2 for stage in stats])
+    print(f"{'stage':<{width}}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, s in stats.items():
+        print(f"{stage:<{width}}{s['p50']:>10.3f}{s['p95']:>10.3f}{s['p99']:>10.3f}{s['max']:>10.3f}")
+
+
+# -------------------------
+# replay
+# -------------------------
+def replay(frames, detector, repeat=1, warmup=3):
+    for frame in frames[:warmup]:
+        detector.detect(frame)
+
+    samples = {stage: [] for stage in STAGES + ("total",)}
+    verdicts = {"OK": 0, "NOK": 0}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            result = detector.detect(frame)
+            for stage, dt in result.timings.items():
+                samples.setdefault(stage, []).append(dt)
+            verdicts[result.verdict] += 1
+    elapsed = time.perf_counter() - start
+
+    processed = repeat * len(frames)
+    return {
+        "frames": processed,
+        "seconds": elapsed,
+        "fps": processed / elapsed if elapsed > 0 else 0.0,
+        "verdicts": verdicts,
+        "stages": {stage: percentiles_ms(s) for stage, s in samples.items()},
+    }
+
+
+def cmd_replay(args):
+    frames = load_frames(args.frames)
+    if not frames:
+        print("No frames found in", args.frames)
+        return 1
+    params = DetectionParams(min_area=args.min_area, kernel_size=args.kernel,
+                             iterations=args.iterations, expected_clips=args.clips,
+                             roi=parse_roi(args.roi) if args.roi else None, lut=args.lut,
+                             engine=args.engine)
+    report = replay(frames, ClipDetector(params), repeat=args.repeat, warmup=args.warmup)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"{report['frames']} frames in {report['seconds']:.3f}s -> {report['fps']:.1f} fps")
+        print(f"verdicts: {report['verdicts']}")
+        print_table(report["stages"])
+    return 0
+
+
+# -------------------------
+# pipeline
+# -------------------------
+def run_serial(frames, detector, display_delay, duration):
+    """Capture, detect and display in series, as the original loop did."""
+    camera = ReplayCamera(frames)
+    display = FakeDisplay(display_delay)
+    processed = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        frame = camera.capture_array()
+        detector.detect(frame)
+        display.display(frame)
+        processed += 1
+    elapsed = time.perf_counter() - start
+    return {"processed": processed, "displayed": display.frames, "fps": processed / elapsed}
+
+
+def run_pipelined(frames, detector, display_delay, duration):
+    camera = ReplayCamera(frames)
+    display = FakeDisplay(display_delay)
+    pipeline = DetectionPipeline(camera, detector, display=display, render=lambda packet: packet.frame)
+    start = time.perf_counter()
+    pipeline.start()
+    time.sleep(duration)
+    pipeline.stop()
+    elapsed = time.perf_counter() - start
+    stats = pipeline.stats()
+    stats["fps"] = stats["processed"] / elapsed
+    return stats
+
+
+def cmd_pipeline(args):
+    frames = load_frames(args.frames)
+    if not frames:
+        print("No frames found in", args.frames)
+        return 1
+    detector = ClipDetector(DetectionParams(roi=parse_roi(args.roi) if args.roi else None))
+    delay = args.display_ms / 1000.0
+    serial = run_serial(frames, detector, delay, args.duration)
+    pipelined = run_pipelined(frames, detector, delay, args.duration)
+    if args.json:
+        print(json.dumps({"serial": serial, "pipelined": pipelined}))
+    else:
+        print(f"simulated display push: {args.display_ms:.1f} ms/frame")
+        print(f"serial     : {serial['fps']:8.1f} inspected fps, {serial['displayed']} frames shown")
+        print(f"pipelined  : {pipelined['fps']:8.1f} inspected fps, {pipelined['displayed']} frames shown, "
+              f"{pipelined['dropped_display']} stale display frames dropped")
+    return 0
+
+
+# -------------------------
+# trigger
+# -------------------------
+def cmd_trigger(args):
+    frames = load_frames(args.frames)
+    if not frames:
+        print("No frames found in", args.frames)
+        return 1
+    detector = ClipDetector(DetectionParams(roi=parse_roi(args.roi) if args.roi else None))
+    camera = ReplayCamera(frames, fps=args.camera_fps)
+    outputs = RecordingOutputs()
+    metrics = MetricsRegistry()
+    inspector = TriggeredInspector(camera, detector, outputs, burst=args.burst,
+                                   discard=args.discard, preview_interval=args.period,
+                                   metrics=metrics)
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    inspector.start()
+    # parts arrive at any phase of the free-running sensor's frame period
+    rng = np.random.default_rng(0)
+    for _ in range(args.parts):
+        time.sleep(args.period + rng.uniform(0.0, 1.0 / args.camera_fps))
+        inspector.trigger()
+    while inspector.inspections < args.parts and inspector.is_alive():
+        time.sleep(0.01)
+    inspector.stop()
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+
+    summary = inspector.latency_summary()
+    report = {"parts": inspector.inspections, "frames_captured": camera.captured,
+              "cpu_fraction": cpu / wall, "latency_ms": summary, "stages": metrics.snapshot()}
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"{report['parts']} parts, {camera.captured} frames captured, "
+              f"CPU busy {100 * report['cpu_fraction']:.1f}% of one core")
+        print(f"trigger->verdict ms: p50 {summary['p50']:.2f}  p95 {summary['p95']:.2f}  "
+              f"p99 {summary['p99']:.2f}  max {summary['max']:.2f}")
+        print_table(report["stages"])
+    return 0
+
+
+# -------------------------
+# display
+# -------------------------
+def display_before(frame):
+    """The original per-frame path: PIL round trip, per-pixel lambda, luma byte list."""
+    from PIL import Image
+    tft_frame = cv2.resize(frame[:, :, :3], (320, 240))
+    image = Image.eval(Image.fromarray(tft_frame), lambda x: 255 - x)
+    return list(image.convert("RGB").tobytes())
+
+
+def display_after(frame, buffer):
+    """Preallocated resize/invert/RGB565 buffer handed to spidev as a memoryview."""
+    return memoryview(buffer.convert(frame)).cast("B")
+
+
+def cmd_display(args):
+    frames = load_frames(args.frames)
+    if not frames:
+        print("No frames found in", args.frames)
+        return 1
+    if args.channels == 4:
+        pad = np.full(frames[0].shape[:2] + (1,), 255, np.uint8)
+        frames = [np.concatenate((f, pad), axis=2) for f in frames]
+    buffer = DisplayBuffer(320, 240, invert=True)
+    samples = {"before": [], "after": []}
+    for _ in range(args.repeat):
+        for frame in frames:
+            t0 = time.perf_counter()
+            display_before(frame)
+            t1 = time.perf_counter()
+            display_after(frame, buffer)
+            t2 = time.perf_counter()
+            samples["before"].append(t1 - t0)
+            samples["after"].append(t2 - t1)
+    stats = {name: percentiles_ms(s) for name, s in samples.items()}
+    if args.json:
+        print(json.dumps(stats))
+    else:
+        print_table(stats)
+        print(f"speedup (p50): {stats['before']['p50'] / max(stats['after']['p50'], 1e-9):.1f}x")
+    return 0
+
+
+# -------------------------
+# stations
+# -------------------------
+def make_sources(count, frames=None):
+    if frames:
+        return [ReplayCamera(frames) for _ in range(count)]
+    return [FakeFrameSource(seed=i) for i in range(count)]
+
+
+def run_stations_serial(count, frames, duration):
+    """All stations captured and detected in turn by one process (one GIL)."""
+    stations = [Station(f"s{i}", src) for i, src in enumerate(make_sources(count, frames))]
+    detectors = [ClipDetector(s.params) for s in stations]
+    processed = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        for station, detector in zip(stations, detectors):
+            detector.detect(station.source.capture_array())
+            processed += 1
+    return processed / (time.perf_counter() - start)
+
+
+def run_stations_pool(count, frames, duration, slots):
+    stations = [Station(f"s{i}", src) for i, src in enumerate(make_sources(count, frames))]
+    pool = StationPool(stations, slots=slots).start()
+    # let the worker processes come up before measuring
+    time.sleep(0.5)
+    before = sum(w.processed for w in pool.workers)
+    start = time.perf_counter()
+    time.sleep(duration)
+    processed = sum(w.processed for w in pool.workers) - before
+    elapsed = time.perf_counter() - start
+    pool.stop()
+    return processed / elapsed
+
+
+def cmd_stations(args):
+    frames = load_frames(args.frames) if args.frames else None
+    if args.frames and not frames:
+        print("No frames found in", args.frames)
+        return 1
+    rows = []
+    for count in args.stations:
+        serial = run_stations_serial(count, frames, args.duration)
+        pooled = run_stations_pool(count, frames, args.duration, args.slots)
+        rows.append({"stations": count, "serial_fps": serial, "pool_fps": pooled,
+                     "speedup": pooled / serial if serial else 0.0})
+    if args.json:
+        print(json.dumps({"cpus": os.cpu_count(), "runs": rows}))
+    else:
+        print(f"{os.cpu_count()} CPUs, total inspected frames/s across all stations")
+        print(f"{'stations':<10}{'1 process':>12}{'per station':>14}{'speedup':>10}")
+        for r in rows:
+            print(f"{r['stations']:<10}{r['serial_fps']:>12.1f}{r['pool_fps']:>14.1f}{r['speedup']:>9.2f}x")
+    return 0
+
+
+# -------------------------
+# coarse
+# -------------------------
+def compare_coarse(frames, params, scale, margin, repeat=1):
+    """Full-resolution vs coarse-to-fine detection on the same frames."""
+    full = ClipDetector(params)
+    c2f = CoarseToFineDetector(params, scale=scale, area_margin=margin)
+    samples = {"full": [], "coarse-to-fine": []}
+    verdicts_agree = counts_agree = 0
+    mismatches = []
+    for _ in range(repeat):
+        for i, frame in enumerate(frames):
+            ref = full.detect(frame)
+            res = c2f.detect(frame)
+            samples["full"].append(ref.timings["total"])
+            samples["coarse-to-fine"].append(res.timings["total"])
+            verdicts_agree += ref.ok == res.ok
+            counts_agree += ref.valid_contours == res.valid_contours
+            if ref.ok != res.ok and i not in mismatches:
+                mismatches.append(i)
+    n = repeat * len(frames)
+    stats = {name: percentiles_ms(s) for name, s in samples.items()}
+    mean_full = sum(samples["full"]) / n
+    mean_c2f = sum(samples["coarse-to-fine"]) / n
+    return {
+        "frames": n,
+        "scale": scale,
+        "speedup_mean": mean_full / mean_c2f if mean_c2f else 0.0,
+        "speedup_p50": stats["full"]["p50"] / max(stats["coarse-to-fine"]["p50"], 1e-9),
+        "verdict_agreement": verdicts_agree / n,
+        "count_agreement": counts_agree / n,
+        "refined_fraction": c2f.refined / c2f.inspected,
+        "verdict_mismatches": mismatches,
+        "stages": stats,
+    }
+
+
+def cmd_coarse(args):
+    frames = load_frames(args.frames)
+    if not frames:
+        print("No frames found in", args.frames)
+        return 1
+    order = "RGBX" if frames[0].shape[2] == 4 else "RGB"
+    params = DetectionParams(min_area=args.min_area, expected_clips=args.clips, color_order=order,
+                             roi=parse_roi(args.roi) if args.roi else None, lut=args.lut)
+    report = compare_coarse(frames, params, args.scale, args.margin, args.repeat)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"{report['frames']} frames, coarse pass at 1/{args.scale} resolution")
+        print_table(report["stages"])
+        print(f"speedup: {report['speedup_mean']:.2f}x mean, {report['speedup_p50']:.2f}x p50")
+        print(f"verdict agreement {100 * report['verdict_agreement']:.2f}%, "
+              f"clip count agreement {100 * report['count_agreement']:.2f}%, "
+              f"{100 * report['refined_fraction']:.1f}% of frames re-checked at full resolution")
+        if report["verdict_mismatches"]:
+            print("verdict differs on frames:", report["verdict_mismatches"][:20])
+    return 0
+
+
+# -------------------------
+# events
+# -------------------------
+BUTTON_PIN = 27
+
+
+def press_buttons(gpio, presses, gap):
+    """Presses the simulated button `presses` times, `gap` seconds apart, on a thread."""
+    def run():
+        for _ in range(presses):
+            time.sleep(gap)
+            gpio.press(BUTTON_PIN)
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return t
+
+
+def run_polling(presses, gap, poll_interval):
+    """The old main loop: edge callback fills one slot, the loop checks it every poll_interval."""
+    gpio = SimulatedGPIO()
+    gpio.setup(BUTTON_PIN, gpio.IN, pull_up_down=gpio.PUD_UP)
+    lock = threading.Lock()
+    slot = [None]
+
+    def on_edge(channel):
+        with lock:
+            slot[0] = time.perf_counter()
+
+    gpio.add_event_detect(BUTTON_PIN, gpio.FALLING, callback=on_edge)
+    latencies = []
+    wakeups = 0
+    cpu = time.process_time()
+    presser = press_buttons(gpio, presses, gap)
+    while presser.is_alive() or slot[0] is not None:
+        wakeups += 1
+        with lock:
+            t, slot[0] = slot[0], None
+        if t is not None:
+            latencies.append(time.perf_counter() - t)
+        time.sleep(poll_interval)
+    return latencies, wakeups, time.process_time() - cpu
+
+
+def run_dispatcher(presses, gap):
+    """Edges queued on an EventDispatcher; the loop blocks until the next one."""
+    gpio = SimulatedGPIO()
+    gpio.setup(BUTTON_PIN, gpio.IN, pull_up_down=gpio.PUD_UP)
+    events = EventDispatcher()
+    events.watch_pin(gpio, BUTTON_PIN, gpio.FALLING, "button", "ok")
+    latencies = []
+    wakeups = 0
+    cpu = time.process_time()
+    presser = press_buttons(gpio, presses, gap)
+    while len(latencies) < presses:
+        wakeups += 1
+        ev = events.next_event(("button",), timeout=gap * presses + 1.0)
+        if ev is None:
+            break
+        latencies.append(time.perf_counter() - ev.t)
+    presser.join()
+    return latencies, wakeups, time.process_time() - cpu
+
+
+def cmd_events(args):
+    gap = args.gap_ms / 1000.0
+    report = {}
+    for name, (latencies, wakeups, cpu) in (
+            ("polling", run_polling(args.presses, gap, args.poll_ms / 1000.0)),
+            ("dispatcher", run_dispatcher(args.presses, gap))):
+        report[name] = {"presses": args.presses, "handled": len(latencies),
+                        "lost": args.presses - len(latencies), "wakeups": wakeups,
+                        "cpu_s": cpu, "latency_ms": percentiles_ms(latencies)}
+    if args.json:
+        print(json.dumps(report))
+        return 0
+    for name, r in report.items():
+        lat = r["latency_ms"]
+        print(f"{name:10s} {r['handled']}/{r['presses']} presses handled ({r['lost']} lost), "
+              f"{r['wakeups']} wakeups, press->handler ms p50 {lat['p50']:.2f}  "
+              f"p99 {lat['p99']:.2f}  max {lat['max']:.2f}")
+    return 0
+
+
+# -------------------------
+# startup
+# -------------------------
+# Boot to first menu frame on fake hardware, in a fresh interpreter, so
+# interpreter start and every import are included. argv: launch time,
+# asset bundle path, "lazy" / "eager", camera open s, camera start s
+STARTUP_CHILD = """
+import sys, time, json
+t_launch = float(sys.argv[1])
+import main
+t_import = time.time()
+from hardware import Hardware
+from display import DirtyRegionDisplay
+from fakes import SimulatedGPIO, FakeDisplay, FakePicamera2
+main.ASSET_PATH = sys.argv[2]
+open_s, start_s = float(sys.argv[4]), float(sys.argv[5])
+hw = Hardware(gpio=SimulatedGPIO, screen=lambda: DirtyRegionDisplay(FakeDisplay()),
+              camera=lambda: FakePicamera2(start_delay=start_s, open_delay=open_s),
+              setup_gpio=main.setup_gpio, metrics=main.metrics)
+if sys.argv[3] == "eager":
+    hw.camera   # the old order: camera started before the first frame
+menu = main.start_hmi(hw)
+t_menu = time.time()
+cached = menu.layers_cached
+hw.camera
+t_camera = time.time()
+print(json.dumps({"import_ms": (t_import - t_launch) * 1000, "first_frame_ms": (t_menu - t_launch) * 1000,
+                  "camera_ready_ms": (t_camera - t_launch) * 1000}))
+"""
+
+
+# Launch -> first menu frame budget with lazy hardware and cached layers.
+# Off the Pi with fakes this measures ~0.2 s, almost all of it imports.
+STARTUP_TARGET_MS = 500.0
+
+
+def run_startup(asset_path, mode, camera_open, camera_start):
+    t_launch = time.time()
+    out = subprocess.run([sys.executable, "-c", STARTUP_CHILD, repr(t_launch), asset_path, mode,
+                          str(camera_open), str(camera_start)],
+                         cwd=os.path.dirname(os.path.abspath(__file__)),
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def cmd_startup(args):
+    report = {"target_ms": args.target_ms}
+    with tempfile.TemporaryDirectory() as tmp:
+        asset_path = os.path.join(tmp, "hmi_layers.npz")
+        for mode in ("eager", "lazy"):
+            for cache in ("cold", "warm"):
+                runs = []
+                for _ in range(args.runs):
+                    if cache == "cold" and os.path.exists(asset_path):
+                        os.remove(asset_path)
+                    runs.append(run_startup(asset_path, mode, args.camera_open_ms / 1000.0,
+                                            args.camera_start_ms / 1000.0))
+                report[f"{mode}/{cache}"] = {k: float(np.median([r[k] for r in runs])) for k in runs[0]}
+    report["meets_target"] = report["lazy/warm"]["first_frame_ms"] <= args.target_ms
+    if args.json:
+        print(json.dumps(report))
+        return 0
+    print(f"median of {args.runs} runs, simulated camera open {args.camera_open_ms:.0f} ms "
+          f"+ start {args.camera_start_ms:.0f} ms")
+    print(f"{'startup':12s} {'imports':>9s} {'1st frame':>10s} {'camera ok':>10s}")
+    for name, r in report.items():
+        if isinstance(r, dict):
+            print(f"{name:12s} {r['import_ms']:9.0f} {r['first_frame_ms']:10.0f} {r['camera_ready_ms']:10.0f}")
+    print(f"target: first menu frame within {args.target_ms:.0f} ms of launch -> "
+          f"{'met' if report['meets_target'] else 'MISSED'}")
+    return 0
+
+
+# -------------------------
+# stream
+# -------------------------
+def read_mjpeg(port, stop_event, delay, received):
+    """One viewer: reads parts of /stream.mjpg, sleeping `delay` s after each."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request("GET", "/stream.mjpg")
+    response = conn.getresponse()
+    try:
+        while not stop_event.is_set():
+            line = response.readline()
+            if not line:
+                break
+            if not line.startswith(b"--"):
+                continue
+            length = 0
+            while True:
+                header = response.readline().strip()
+                if not header:
+                    break
+                if header.lower().startswith(b"content-length:"):
+                    length = int(header.split(b":")[1])
+            response.read(length)
+            received.append(time.perf_counter())
+            if delay:
+                time.sleep(delay)
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def run_stream(frames, detector, duration, viewers, slow_delay, max_fps, quality):
+    """Detect + offer loop with the preview off (viewers=None), idle (0) or watched."""
+    camera = ReplayCamera(frames) if frames else FakeFrameSource()
+    preview = None
+    clients = []
+    stop_event = threading.Event()
+    if viewers is not None:
+        preview = PreviewStream(0, host="127.0.0.1", max_fps=max_fps, jpeg_quality=quality).start()
+        delays = [0.0] * viewers
+        if viewers and slow_delay:
+            delays[-1] = slow_delay
+        for delay in delays:
+            received = []
+            t = threading.Thread(target=read_mjpeg, args=(preview.port, stop_event, delay, received),
+                                 daemon=True)
+            t.start()
+            clients.append((t, received, delay))
+        deadline = time.perf_counter() + 2.0
+        while preview.viewers < viewers and time.perf_counter() < deadline:
+            time.sleep(0.01)
+    samples = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        t0 = time.perf_counter()
+        frame = camera.capture_array()
+        detector.detect(frame)
+        if preview is not None:
+            preview.offer(frame)
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    stop_event.set()
+    row = {"fps": len(samples) / elapsed, "loop_ms": percentiles_ms(samples)}
+    if preview is not None:
+        preview.stop()
+        for t, _, _ in clients:
+            t.join(2.0)
+        row.update(preview.stats())
+        row["viewer_fps"] = [round(len(received) / elapsed, 1) for _, received, _ in clients]
+    return row
+
+
+def idle_offer_ns(frame, calls=200000):
+    """Cost of offer() with nobody connected."""
+    preview = PreviewStream(0)
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        preview.offer(frame)
+    return (time.perf_counter() - t0) / calls * 1e9
+
+
+def cmd_stream(args):
+    frames = load_frames(args.frames) if args.frames else None
+    if args.frames and not frames:
+        print("No frames found in", args.frames)
+        return 1
+    detector = ClipDetector(DetectionParams(roi=parse_roi(args.roi) if args.roi else None))
+    runs = [("off", None), ("idle", 0)] + [(f"{n} viewers", n) for n in args.viewers]
+    report = {}
+    for name, viewers in runs:
+        report[name] = run_stream(frames, detector, args.duration, viewers,
+                                  args.slow_ms / 1000.0, args.max_fps, args.quality)
+    sample = frames[0] if frames else FakeFrameSource().capture_array()
+    report["idle_offer_ns"] = idle_offer_ns(sample)
+    if args.json:
+        print(json.dumps(report))
+        return 0
+    base = report["off"]["loop_ms"]["p50"]
+    print(f"preview capped at {args.max_fps:.0f} fps"
+          + (f", last viewer reads every {args.slow_ms:.0f} ms" if args.slow_ms else ""))
+    for name, _ in runs:
+        r = report[name]
+        lat = r["loop_ms"]
+        line = (f"{name:10s} {r['fps']:7.1f} fps  loop ms p50 {lat['p50']:.2f} "
+                f"({lat['p50'] - base:+.2f})  p99 {lat['p99']:.2f}")
+        if "encoded" in r:
+            line += (f"  | {r['encoded']} encoded, {r['sent']} sent, {r['skipped']} skipped, "
+                     f"viewer fps {r['viewer_fps']}")
+        print(line)
+    print(f"offer() with no viewer: {report['idle_offer_ns']:.0f} ns")
+    return 0
+
+
+# -------------------------
+# track
+# -------------------------
+def run_every_frame(source, detector, frames):
+    """The old loop: every frame detected, presence only implied by the clip count."""
+    samples = []
+    verdicts = 0
+    for _ in range(frames):
+        frame = source.capture_array()
+        t0 = time.perf_counter()
+        result = detector.detect(frame)
+        samples.append(time.perf_counter() - t0)
+        verdicts += 1 if result.valid_contours else 0
+    return {"frames": frames, "detections": frames, "verdicts": verdicts,
+            "frame_ms": percentiles_ms(samples), "cpu_ms_per_frame": sum(samples) / frames * 1000.0}
+
+
+def run_tracked(source, detector, frames, fps, tracker):
+    """Tracker gate on every frame, detection only for settled plateaus (frame times at `fps`)."""
+    samples = []
+    gate = []
+    detections = 0
+    parts = []
+    for i in range(frames):
+        frame = source.capture_array()
+        t0 = time.perf_counter()
+        departed = tracker.update(frame, i / fps)
+        gate.append(time.perf_counter() - t0)
+        if departed is not None:
+            parts.append(departed)
+        if tracker.wants_detection:
+            tracker.add_result(detector.detect(frame), i / fps)
+            detections += 1
+        samples.append(time.perf_counter() - t0)
+    return {"frames": frames, "detections": detections, "parts": parts,
+            "frame_ms": percentiles_ms(samples), "gate_ms": percentiles_ms(gate),
+            "cpu_ms_per_frame": sum(samples) / frames * 1000.0}
+
+
+def cmd_track(args):
+    detector = ClipDetector(DetectionParams())
+    make = lambda: FakeFixture(channels=args.channels, move_frames=args.move_frames,
+                               dwell_frames=args.dwell_frames, gap_frames=args.gap_frames)
+    source = make()
+    frames = args.parts * source.cycle + source.gap_frames
+    baseline = run_every_frame(make(), detector, frames)
+    tracked = run_tracked(source, detector, frames, args.fps,
+                          PartTracker(votes=args.votes, first_id=1))
+    truth = {pid: (ok, (last - first + 1) / args.fps) for pid, ok, first, last in source.parts}
+    parts = tracked.pop("parts")
+    matched = sum(1 for p in parts if p.id in truth and truth[p.id][0] == p.ok)
+    dwell_err = [abs(p.dwell - truth[p.id][1]) for p in parts if p.id in truth]
+    cycles = [p.cycle_time for p in parts if p.cycle_time is not None]
+    tracked.update({"true_parts": len(truth), "tracked_parts": len(parts), "verdicts_matched": matched,
+                    "missed": sum(1 for p in parts if p.missed),
+                    "dwell_error_ms": percentiles_ms(dwell_err),
+                    "cycle_s": float(np.median(cycles)) if cycles else None,
+                    "true_cycle_s": source.cycle / args.fps})
+    if args.json:
+        print(json.dumps({"every_frame": baseline, "tracked": tracked}))
+        return 0
+    print(f"{args.parts} plateaus, {frames} frames at {args.fps:.0f} fps "
+          f"({args.dwell_frames} at rest, {args.gap_frames} empty between plateaus)")
+    print(f"every frame: {baseline['detections']} detections, {baseline['cpu_ms_per_frame']:.2f} ms/frame, "
+          f"{baseline['verdicts']} frame verdicts with clips in view")
+    print(f"tracked    : {tracked['detections']} detections, {tracked['cpu_ms_per_frame']:.2f} ms/frame "
+          f"(gate p50 {tracked['gate_ms']['p50']:.3f} ms), "
+          f"{baseline['cpu_ms_per_frame'] / max(tracked['cpu_ms_per_frame'], 1e-9):.1f}x less CPU")
+    print(f"plateaus   : {tracked['tracked_parts']}/{tracked['true_parts']} tracked, "
+          f"{tracked['verdicts_matched']} verdicts match, {tracked['missed']} missed")
+    print(f"dwell error: p50 {tracked['dwell_error_ms']['p50']:.0f} ms  max {tracked['dwell_error_ms']['max']:.0f} ms; "
+          f"cycle {tracked['cycle_s'] or 0:.2f} s (true {tracked['true_cycle_s']:.2f} s)")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Inspection pipeline benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("replay", help="replay recorded frames through the detector")
+    p.add_argument("frames", help="directory of images or .npy stack (N,H,W,3) of RGB frames")
+    p.add_argument("--repeat", type=int, default=1)
+    p.add_argument("--warmup", type=int, default=3)
+    p.add_argument("--min-area", type=float, default=50)
+    p.add_argument("--kernel", type=int, default=5)
+    p.add_argument("--iterations", type=int, default=1)
+    p.add_argument("--clips", type=int, default=2, help="expected clip count for an OK part")
+    p.add_argument("--roi", help='clip windows "x,y,w,h;x,y,w,h" (default: whole frame)')
+    p.add_argument("--lut", action="store_true", help="segment with the RGB565 colour LUT instead of HSV")
+    p.add_argument("--engine", choices=ENGINES, default="contours", help="blob search after segmentation")
+    p.add_argument("--json", action="store_true", help="print the report as JSON")
+    p.set_defaults(func=cmd_replay)
+
+    p = sub.add_parser("pipeline", help="compare the serial loop with the threaded pipeline")
+    p.add_argument("frames", help="directory of images or .npy stack of RGB frames")
+    p.add_argument("--display-ms", type=float, default=40.0, help="simulated SPI push time per frame")
+    p.add_argument("--duration", type=float, default=3.0, help="seconds per mode")
+    p.add_argument("--roi", help='clip windows "x,y,w,h;x,y,w,h"')
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_pipeline)
+
+    p = sub.add_parser("trigger", help="trigger-to-verdict latency of the triggered mode")
+    p.add_argument("frames", help="directory of images or .npy stack of RGB frames")
+    p.add_argument("--parts", type=int, default=50, help="number of simulated triggers")
+    p.add_argument("--period", type=float, default=0.2, help="seconds between parts")
+    p.add_argument("--burst", type=int, default=3)
+    p.add_argument("--discard", type=int, default=1)
+    p.add_argument("--camera-fps", type=float, default=30.0)
+    p.add_argument("--roi", help='clip windows "x,y,w,h;x,y,w,h"')
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_trigger)
+
+    p = sub.add_parser("display", help="per-frame cost of preparing a camera frame for the TFT")
+    p.add_argument("frames", help="directory of images or .npy stack of RGB frames")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--channels", type=int, choices=(3, 4), default=4,
+                   help="4 = XBGR8888 camera frames as delivered by picamera2")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_display)
+
+    p = sub.add_parser("stations", help="multi-station throughput, one process vs one process per station")
+    p.add_argument("--frames", help="images or .npy stack to replay (default: synthetic frames)")
+    p.add_argument("--stations", type=int, nargs="+", default=[1, 2, 4], help="station counts to measure")
+    p.add_argument("--duration", type=float, default=3.0, help="seconds per measurement")
+    p.add_argument("--slots", type=int, default=2, help="shared frame slots per station")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_stations)
+
+    p = sub.add_parser("coarse", help="coarse-to-fine vs full-resolution detection: speedup and agreement")
+    p.add_argument("frames", help="directory of images or .npy stack of RGB(X) frames")
+    p.add_argument("--scale", type=int, default=2, help="downscale factor of the coarse pass")
+    p.add_argument("--margin", type=float, default=0.35,
+                   help="relative band around min_area that triggers a full-resolution re-check")
+    p.add_argument("--min-area", type=float, default=50)
+    p.add_argument("--clips", type=int, default=2)
+    p.add_argument("--roi", help='clip windows "x,y,w,h;x,y,w,h"')
+    p.add_argument("--lut", action="store_true")
+    p.add_argument("--repeat", type=int, default=1)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_coarse)
+
+    p = sub.add_parser("events", help="button handling: 50 ms polling loop vs the event dispatcher")
+    p.add_argument("--presses", type=int, default=200)
+    p.add_argument("--gap-ms", type=float, default=20.0, help="time between simulated presses")
+    p.add_argument("--poll-ms", type=float, default=50.0, help="sleep of the polling loop")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_events)
+
+    p = sub.add_parser("startup", help="launch to first menu frame on fake hardware, eager vs lazy start")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--camera-open-ms", type=float, default=300.0, help="simulated Picamera2() construction")
+    p.add_argument("--camera-start-ms", type=float, default=1000.0, help="simulated configure + start")
+    p.add_argument("--target-ms", type=float, default=STARTUP_TARGET_MS,
+                   help="cold-start budget for the first menu frame (warm asset cache)")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_startup)
+
+    p = sub.add_parser("stream", help="inspection cost of the network preview: off, idle and watched")
+    p.add_argument("--frames", help="images or .npy stack to replay (default: synthetic frames)")
+    p.add_argument("--viewers", type=int, nargs="+", default=[1, 4], help="viewer counts to measure")
+    p.add_argument("--slow-ms", type=float, default=0.0,
+                   help="make the last viewer pause this long after each frame")
+    p.add_argument("--max-fps", type=float, default=10.0)
+    p.add_argument("--quality", type=int, default=70)
+    p.add_argument("--duration", type=float, default=3.0, help="seconds per measurement")
+    p.add_argument("--roi", help='clip windows "x,y,w,h;x,y,w,h"')
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_stream)
+
+    p = sub.add_parser("track", help="part tracker on a synthetic fixture: one verdict per plateau vs every frame")
+    p.add_argument("--parts", type=int, default=50, help="plateaus passing through the fixture")
+    p.add_argument("--fps", type=float, default=30.0, help="frame rate used for the frame times")
+    p.add_argument("--move-frames", type=int, default=6)
+    p.add_argument("--dwell-frames", type=int, default=20, help="frames a plateau stays at rest")
+    p.add_argument("--gap-frames", type=int, default=15, help="empty frames between plateaus")
+    p.add_argument("--votes", type=int, default=3)
+    p.add_argument("--channels", type=int, choices=(3, 4), default=3)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_track)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
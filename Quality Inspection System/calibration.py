@@ -0,0 +1,121 @@
+"""Derives the clip colour band and minimum clip area from known-good parts."""
+import os
+import json
+import time
+import numpy as np
+import cv2
+
+from detection import ClipDetector, DetectionParams, HSV_CONVERSIONS
+
+# Loose band used only to find the clips on the sample frames
+SEARCH_LOWER = (10, 60, 60)
+SEARCH_UPPER = (40, 255, 255)
+
+# -------------------------
+# Calibration profile
+# -------------------------
+class CalibrationProfile:
+    """Calibrated HSV band and minimum clip area, as stored on disk."""
+    def __init__(self, yellow_lower, yellow_upper, min_area, samples=0, created=None):
+        self.yellow_lower = tuple(int(v) for v in yellow_lower)
+        self.yellow_upper = tuple(int(v) for v in yellow_upper)
+        self.min_area = float(min_area)
+        self.samples = int(samples)
+        self.created = time.time() if created is None else created
+
+    def to_dict(self):
+        return {"yellow_lower": list(self.yellow_lower), "yellow_upper": list(self.yellow_upper),
+                "min_area": self.min_area, "samples": self.samples, "created": self.created}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["yellow_lower"], d["yellow_upper"], d["min_area"],
+                   d.get("samples", 0), d.get("created"))
+
+    def params(self, **kwargs):
+        """DetectionParams with the calibrated band (compiled to a LUT) and area."""
+        kwargs.setdefault("lut", True)
+        return DetectionParams(yellow_lower=self.yellow_lower, yellow_upper=self.yellow_upper,
+                               min_area=self.min_area, **kwargs)
+
+
+def save_profile(profile, path):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(profile.to_dict(), f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_profile(path):
+    """The saved profile, or None when the line has not been calibrated yet."""
+    try:
+        with open(path) as f:
+            return CalibrationProfile.from_dict(json.load(f))
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError) as e:
+        print("Ignoring unreadable calibration file:", e)
+        return None
+
+
+# -------------------------
+# Calibrator
+# -------------------------
+class HsvCalibrator:
+    """Collects clip pixels and clip areas from frames of known-good parts.
+
+    Each sample is searched with a loose yellow band; it is only accepted when
+    it shows exactly `expected_clips` clips, so a badly placed part does not
+    skew the band. `compute()` turns the collected pixels into a band (robust
+    percentiles plus a margin) and the smallest clip area into `min_area`.
+    """
+    def __init__(self, params=None, max_pixels=20000, seed=0):
+        base = params or DetectionParams()
+        self.color_order = base.color_order
+        self.expected_clips = base.expected_clips
+        self.search = ClipDetector(DetectionParams(
+            yellow_lower=SEARCH_LOWER, yellow_upper=SEARCH_UPPER,
+            kernel_size=base.kernel_size, iterations=base.iterations, min_area=base.min_area,
+            expected_clips=base.expected_clips, roi=base.roi, color_order=base.color_order,
+            engine=base.engine))
+        self.max_pixels = max_pixels
+        self._rng = np.random.default_rng(seed)
+        self._pixels = []
+        self.areas = []
+        self.accepted = 0
+        self.rejected = 0
+
+    def add_sample(self, frame):
+        """Adds one known-good frame; returns the search result (`.ok` = accepted)."""
+        result = self.search.detect(frame)
+        if not result.ok:
+            self.rejected += 1
+            return result
+        hsv = cv2.cvtColor(frame, HSV_CONVERSIONS[self.color_order])
+        in_band = cv2.inRange(hsv, np.array(SEARCH_LOWER, np.uint8), np.array(SEARCH_UPPER, np.uint8))
+        pixels = []
+        for x, y, w, h in result.boxes:
+            box = in_band[y:y+h, x:x+w] > 0
+            pixels.append(hsv[y:y+h, x:x+w][box])
+        pixels = np.concatenate(pixels)
+        if len(pixels) > self.max_pixels:
+            pixels = pixels[self._rng.choice(len(pixels), self.max_pixels, replace=False)]
+        self._pixels.append(pixels)
+        self.areas.extend(result.areas)
+        self.accepted += 1
+        return result
+
+    def compute(self, low_pct=1.0, high_pct=99.0, margin=(3, 30, 30), area_fraction=0.5):
+        """CalibrationProfile from the accepted samples (ValueError if there are none)."""
+        if not self._pixels:
+            raise ValueError("no accepted calibration samples")
+        pixels = np.concatenate(self._pixels).astype(np.int32)
+        lo = np.percentile(pixels, low_pct, axis=0) - margin
+        hi = np.percentile(pixels, high_pct, axis=0) + margin
+        limits = np.array((179, 255, 255))
+        lower = np.clip(np.floor(lo), 0, limits).astype(int)
+        upper = np.clip(np.ceil(hi), 0, limits).astype(int)
+        min_area = max(1.0, area_fraction * min(self.areas))
+        return CalibrationProfile(lower, upper, min_area, samples=self.accepted)
@@ -0,0 +1,88 @@
+"""One persistent Picamera2 session shared by every screen."""
+import time
+import threading
+import numpy as np
+import cv2
+
+# Screen mode -> stream it reads
+MODES = {
+    "preview": "lores",
+    "inspect": "main",
+}
+
+
+class CameraManager:
+    """Configures a dual-stream session (main + lores) once and never restarts it.
+
+    `main` is the full-size stream used for inspection and calibration,
+    `lores` a small YUV420 stream at panel size for previews. Switching mode
+    with `use()` only changes which stream `capture_array()` reads, so there is
+    no stop / configure / start and no sensor re-settling. The time from a
+    switch to the first frame of the new stream is recorded as
+    `camera.mode_switch`. The manager is a drop-in frame source wherever a
+    Picamera2 was used (`capture_array()`).
+    """
+    def __init__(self, picam2, main_size=(640, 480), lores_size=(320, 240),
+                 main_format="XBGR8888", metrics=None):
+        self.picam2 = picam2
+        self.main_size = tuple(main_size)
+        # lores width a multiple of 64 keeps the YUV rows free of padding
+        self.lores_size = tuple(lores_size)
+        self.main_format = main_format
+        self.metrics = metrics
+        self.mode = "preview"
+        self.started = False
+        self.switches = 0
+        self._switched_at = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Configures both streams and starts the sensor (once, at startup)."""
+        config = self.picam2.create_video_configuration(
+            main={"size": self.main_size, "format": self.main_format},
+            lores={"size": self.lores_size, "format": "YUV420"})
+        self.picam2.configure(config)
+        self.picam2.start()
+        self.started = True
+        return self
+
+    def use(self, mode):
+        """Selects the stream that `capture_array()` reads ("preview" or "inspect")."""
+        if mode not in MODES:
+            raise ValueError(f"unknown camera mode: {mode!r}")
+        with self._lock:
+            if mode != self.mode:
+                self.mode = mode
+                self.switches += 1
+                self._switched_at = time.perf_counter()
+
+    def capture_array(self, name=None):
+        """Latest frame of the current mode's stream (or of stream `name`).
+
+        main frames come back as configured (4-channel XBGR8888 -> R,G,B,X),
+        lores frames are converted from YUV420 to 3-channel RGB.
+        """
+        stream = name or MODES[self.mode]
+        frame = self.picam2.capture_array(stream)
+        if stream == "lores":
+            frame = self._lores_to_rgb(frame)
+        if self._switched_at is not None and name is None:
+            with self._lock:
+                t_switch, self._switched_at = self._switched_at, None
+            if t_switch is not None and self.metrics is not None:
+                self.metrics.record("camera.mode_switch", time.perf_counter() - t_switch)
+        return frame
+
+    def _lores_to_rgb(self, yuv):
+        w, h = self.lores_size
+        # a fresh array per frame, like every other capture
+        return cv2.cvtColor(np.ascontiguousarray(yuv[:h * 3 // 2, :w]), cv2.COLOR_YUV2RGB_I420)
+
+    def stop(self):
+        if not self.started:
+            return
+        self.started = False
+        try:
+            self.picam2.stop()
+        except Exception:
+            pass
@@ -0,0 +1,374 @@
+import copy
+import time
+import numpy as np
+import cv2
+
+# -------------------------
+# Detection parameters
+# -------------------------
+# Native camera layouts -> single OpenCV conversion straight to HSV
+# (4-channel XBGR8888/XRGB8888 frames are accepted as is, the pad byte is ignored)
+HSV_CONVERSIONS = {
+    "RGB": cv2.COLOR_RGB2HSV,
+    "BGR": cv2.COLOR_BGR2HSV,
+    "RGBX": cv2.COLOR_RGB2HSV,
+    "BGRX": cv2.COLOR_BGR2HSV,
+}
+
+# Native camera layouts -> one SIMD pack to a 16-bit RGB565 colour index
+# (R in the top 5 bits), used to address a ColorLut
+RGB565_INDEX_CONVERSIONS = {
+    "RGB": cv2.COLOR_RGB2BGR565,
+    "BGR": cv2.COLOR_BGR2BGR565,
+    "RGBX": cv2.COLOR_RGBA2BGR565,
+    "BGRX": cv2.COLOR_BGRA2BGR565,
+}
+
+
+class ColorLut:
+    """Clip / not-clip decision for every RGB565 colour (64K-entry table).
+
+    Built once from an HSV band. Segmentation is then one pack of the frame
+    to RGB565 plus one table lookup per pixel, with no HSV conversion and no
+    range test. The 5-6-5 quantisation only matters within a few levels of
+    the band edges.
+    """
+    def __init__(self, lower, upper):
+        i = np.arange(65536, dtype=np.uint32)
+        # centre of each RGB565 cell
+        rgb = np.stack([((i >> 11) & 31) << 3 | 4,
+                        ((i >> 5) & 63) << 2 | 2,
+                        (i & 31) << 3 | 4], axis=-1).astype(np.uint8).reshape(256, 256, 3)
+        hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+        # as an image: column = low byte, row = high byte of the index
+        self.table = cv2.inRange(hsv, np.array(lower, np.uint8), np.array(upper, np.uint8))
+
+    def index(self, frame, color_order):
+        """RGB565 colour index of every pixel (two bytes per pixel, little-endian)."""
+        return cv2.cvtColor(frame, RGB565_INDEX_CONVERSIONS[color_order])
+
+    def lookup(self, index, dst):
+        # the two index bytes are the (x, y) source of a nearest-neighbour
+        # remap into the table, which OpenCV runs vectorised
+        coords = np.empty(index.shape[:2] + (2,), np.int16)
+        np.copyto(coords, index, casting="unsafe")
+        cv2.remap(self.table, coords, None, cv2.INTER_NEAREST, dst=dst)
+        return dst
+
+
+# Blob search after segmentation:
+# "contours":   outer contours + per-contour area / box; cheapest on clean
+#               masks with a handful of blobs
+# "components": one labelling pass with per-blob statistics, filtered as
+#               arrays; its cost hardly grows with the blob count, so it wins
+#               on noisy masks with hundreds of blobs
+ENGINES = ("contours", "components")
+
+
+class DetectionParams:
+    """Tunable values of the yellow-clip pipeline (defaults match the line setup).
+
+    `roi` is an optional list of (x, y, w, h) clip windows; when set, masking,
+    morphology and contour search only run inside those windows. With
+    `lut=True` the HSV band is compiled into a ColorLut and segmentation
+    skips the HSV conversion. With the "components" engine a blob's area is
+    its pixel count, "contours" uses the polygon area (slightly smaller), so
+    min_area should be calibrated with the engine used for detection.
+    """
+    def __init__(self, yellow_lower=(20, 100, 100), yellow_upper=(30, 255, 255),
+                 kernel_size=5, iterations=1, min_area=50, expected_clips=2,
+                 roi=None, color_order="RGB", lut=False, engine="contours"):
+        if color_order not in HSV_CONVERSIONS:
+            raise ValueError(f"unsupported color order: {color_order}")
+        if engine not in ENGINES:
+            raise ValueError(f"unknown detection engine: {engine}")
+        self.yellow_lower = np.array(yellow_lower, np.uint8)
+        self.yellow_upper = np.array(yellow_upper, np.uint8)
+        self.kernel_size = int(kernel_size)
+        self.iterations = int(iterations)
+        self.min_area = float(min_area)
+        self.expected_clips = int(expected_clips)
+        self.roi = [tuple(int(v) for v in win) for win in roi] if roi else None
+        self.color_order = color_order
+        self.engine = engine
+        self.kernel = np.ones((self.kernel_size, self.kernel_size), np.uint8)
+        self.lut = ColorLut(self.yellow_lower, self.yellow_upper) if lut else None
+
+    def windows(self, width, height):
+        """ROI windows clipped to the frame (the full frame when no ROI is set)."""
+        if not self.roi:
+            return [(0, 0, width, height)]
+        wins = []
+        for x, y, w, h in self.roi:
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(width, x + w), min(height, y + h)
+            if x1 > x0 and y1 > y0:
+                wins.append((x0, y0, x1 - x0, y1 - y0))
+        return wins
+
+
+def parse_roi(text):
+    """Parses "x,y,w,h;x,y,w,h" into a list of windows."""
+    wins = []
+    for part in text.split(";"):
+        part = part.strip()
+        if part:
+            x, y, w, h = (int(v) for v in part.split(","))
+            wins.append((x, y, w, h))
+    return wins
+
+
+# -------------------------
+# Detection result
+# -------------------------
+class DetectionResult:
+    def __init__(self, valid_contours, areas, boxes, centroids, mask, timings, expected_clips):
+        self.valid_contours = valid_contours
+        self.areas = areas          # list of float, one per valid clip
+        self.boxes = boxes          # list of (x, y, w, h)
+        self.centroids = centroids  # list of (cx, cy)
+        self.mask = mask
+        self.timings = timings      # stage name -> seconds
+        self.ok = valid_contours == expected_clips
+
+    @property
+    def verdict(self):
+        return "OK" if self.ok else "NOK"
+
+
+# -------------------------
+# Clip detector (no hardware dependency)
+# -------------------------
+STAGES = ("convert", "threshold", "morphology", "contours", "filter")
+
+
+class ClipDetector:
+    """Counts yellow locking clips in a camera frame and returns a verdict."""
+    def __init__(self, params=None):
+        self.params = params or DetectionParams()
+
+    def clone(self):
+        """A detector with the same parameters, for use on another thread."""
+        return ClipDetector(self.params)
+
+    def detect(self, frame):
+        p = self.params
+        height, width = frame.shape[:2]
+        conversion = HSV_CONVERSIONS[p.color_order]
+        lut = p.lut
+        timings = dict.fromkeys(STAGES, 0.0)
+        full_mask = np.zeros((height, width), np.uint8)
+        areas, boxes, centroids = [], [], []
+
+        t_start = time.perf_counter()
+        for wx, wy, ww, wh in p.windows(width, height):
+            t0 = time.perf_counter()
+            window = frame[wy:wy+wh, wx:wx+ww]
+            if lut is not None:
+                colors = lut.index(window, p.color_order)
+            else:
+                hsv = cv2.cvtColor(window, conversion)
+            t1 = time.perf_counter()
+
+            mask = full_mask[wy:wy+wh, wx:wx+ww]
+            if lut is not None:
+                lut.lookup(colors, mask)
+            else:
+                cv2.inRange(hsv, p.yellow_lower, p.yellow_upper, dst=mask)
+            t2 = time.perf_counter()
+
+            cv2.dilate(mask, p.kernel, dst=mask, iterations=p.iterations)
+            cv2.erode(mask, p.kernel, dst=mask, iterations=p.iterations)
+            t3 = time.perf_counter()
+
+            if p.engine == "components":
+                _, _, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+                    mask, 8, cv2.CV_32S, cv2.CCL_GRANA)
+                t4 = time.perf_counter()
+
+                # row 0 is the background; filter all blobs at once
+                blobs = stats[1:]
+                blobs = blobs[blobs[:, cv2.CC_STAT_AREA] > p.min_area]
+                if len(blobs):
+                    xs = blobs[:, cv2.CC_STAT_LEFT] + wx
+                    ys = blobs[:, cv2.CC_STAT_TOP] + wy
+                    ws = blobs[:, cv2.CC_STAT_WIDTH]
+                    hs = blobs[:, cv2.CC_STAT_HEIGHT]
+                    areas.extend(blobs[:, cv2.CC_STAT_AREA].astype(float).tolist())
+                    boxes.extend(zip(xs.tolist(), ys.tolist(), ws.tolist(), hs.tolist()))
+                    centroids.extend(zip((xs + ws//2).tolist(), (ys + hs//2).tolist()))
+            else:
+                # outer contours only: the hierarchy is never used, and holes in
+                # a clip must not count as clips of their own
+                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                t4 = time.perf_counter()
+
+                for cnt in contours:
+                    area = cv2.contourArea(cnt)
+                    if area > p.min_area:
+                        x, y, w, h = cv2.boundingRect(cnt)
+                        x += wx
+                        y += wy
+                        areas.append(area)
+                        boxes.append((x, y, w, h))
+                        centroids.append((x + w//2, y + h//2))
+            t5 = time.perf_counter()
+
+            timings["convert"] += t1 - t0
+            timings["threshold"] += t2 - t1
+            timings["morphology"] += t3 - t2
+            timings["contours"] += t4 - t3
+            timings["filter"] += t5 - t4
+        timings["total"] = time.perf_counter() - t_start
+
+        return DetectionResult(len(areas), areas, boxes, centroids, full_mask, timings, p.expected_clips)
+
+
+# -------------------------
+# Coarse-to-fine detector
+# -------------------------
+def _box_gap(a, b):
+    """Pixels between two (x, y, w, h) boxes (negative when they overlap)."""
+    return max(a[0] - (b[0] + b[2]), b[0] - (a[0] + a[2]),
+               a[1] - (b[1] + b[3]), b[1] - (a[1] + a[3]))
+
+
+class CoarseToFineDetector:
+    """Detects on a downscaled frame and only goes back to full resolution when unsure.
+
+    The coarse pass runs on a frame `scale` times smaller (area-averaged
+    resize, or the camera's lores frame passed as `small`). Its verdict stands unless a blob's
+    area is within `area_margin` of min_area, or two blobs nearly touch (they
+    could merge or split at the other resolution). Then the ROI windows
+    holding those blobs (the whole frame without ROI) are detected again at
+    full resolution and replace the coarse blobs inside them.
+    Same `detect()` result as ClipDetector; `result.refined` tells which
+    frames needed the second pass and `result.mask` is at the resolution the
+    frame was decided on.
+    """
+    def __init__(self, params=None, scale=2, area_margin=0.35):
+        if int(scale) < 2:
+            raise ValueError("scale must be an integer >= 2")
+        scale = int(scale)
+        self.params = params or DetectionParams()
+        self.scale = scale
+        self.area_margin = area_margin
+        self.full = ClipDetector(self.params)
+        self._window_detectors = {}     # refined ROI windows -> full-resolution detector
+        self.inspected = 0
+        self.refined = 0
+
+        p = self.params
+        coarse = copy.copy(p)
+        coarse.kernel_size = max(1, int(round(p.kernel_size / scale))) | 1
+        coarse.kernel = np.ones((coarse.kernel_size, coarse.kernel_size), np.uint8)
+        self.boundary_area = p.min_area / (scale * scale)
+        # keep blobs just under the limit too, so their closeness to it is visible
+        coarse.min_area = self.boundary_area * (1.0 - area_margin)
+        if p.roi:
+            coarse.roi = []
+            for x, y, w, h in p.roi:
+                x0, y0 = x // scale, y // scale
+                coarse.roi.append((x0, y0, -(-(x + w) // scale) - x0, -(-(y + h) // scale) - y0))
+        self.coarse = ClipDetector(coarse)
+
+    def _unsure(self, result):
+        """Indices of coarse blobs whose fate could change at full resolution."""
+        upper = self.boundary_area * (1.0 + self.area_margin)
+        unsure = {i for i, area in enumerate(result.areas) if area <= upper}
+        gap = self.coarse.params.kernel_size
+        boxes = result.boxes
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                if _box_gap(boxes[i], boxes[j]) < gap:
+                    unsure.update((i, j))
+        return unsure
+
+    def _window_detector(self, windows):
+        det = self._window_detectors.get(windows)
+        if det is None:
+            params = copy.copy(self.params)
+            params.roi = list(windows)
+            det = self._window_detectors[windows] = ClipDetector(params)
+        return det
+
+    def clone(self):
+        """A detector with the same parameters and its own buffers and counters."""
+        return CoarseToFineDetector(self.params, self.scale, self.area_margin)
+
+    def detect(self, frame, small=None):
+        s = self.scale
+        t0 = time.perf_counter()
+        if small is None:
+            height, width = frame.shape[:2]
+            small = cv2.resize(frame, (width // s, height // s), interpolation=cv2.INTER_AREA)
+        t1 = time.perf_counter()
+        coarse = self.coarse.detect(small)
+        self.inspected += 1
+
+        unsure = self._unsure(coarse)
+        areas, boxes, centroids = [], [], []
+        refined_windows = []
+        timings = dict(coarse.timings)
+        timings["downscale"] = t1 - t0
+        if unsure:
+            self.refined += 1
+            height, width = frame.shape[:2]
+            windows = self.params.windows(width, height)
+            if self.params.roi:
+                # only the ROI windows that hold an unsure blob
+                for i in unsure:
+                    cx, cy = coarse.centroids[i]
+                    for win in windows:
+                        x, y, w, h = win
+                        if x <= cx * s < x + w and y <= cy * s < y + h and win not in refined_windows:
+                            refined_windows.append(win)
+            if not refined_windows:
+                refined_windows = windows
+            t2 = time.perf_counter()
+            fine = self._window_detector(tuple(refined_windows)).detect(frame)
+            timings["refine"] = time.perf_counter() - t2
+            areas.extend(fine.areas)
+            boxes.extend(fine.boxes)
+            centroids.extend(fine.centroids)
+
+        for area, (x, y, w, h), (cx, cy) in zip(coarse.areas, coarse.boxes, coarse.centroids):
+            if area <= self.boundary_area:
+                continue
+            cx, cy = cx * s, cy * s
+            if any(wx <= cx < wx + ww and wy <= cy < wy + wh for wx, wy, ww, wh in refined_windows):
+                continue    # decided by the full-resolution pass
+            areas.append(area * s * s)
+            boxes.append((x * s, y * s, w * s, h * s))
+            centroids.append((cx, cy))
+        timings["total"] = time.perf_counter() - t0
+
+        result = DetectionResult(len(areas), areas, boxes, centroids, coarse.mask, timings,
+                                 self.params.expected_clips)
+        result.refined = bool(unsure)
+        return result
+
+
+def draw_detections(frame, result, color_order="RGB", roi=None, labels=True):
+    """Draws clip boxes, areas and centroids on a frame (in place).
+
+    Colours are picked for the frame's channel order so the frame can go to the
+    display without another conversion. `labels=False` skips the two text
+    labels per clip, the most expensive part when there are many blobs.
+    """
+    if color_order.startswith("RGB"):
+        yellow, red, grey = (255, 255, 0), (255, 0, 0), (128, 128, 128)
+    else:
+        yellow, red, grey = (0, 255, 255), (0, 0, 255), (128, 128, 128)
+    if frame.shape[2] == 4:
+        yellow, red, grey = yellow + (255,), red + (255,), grey + (255,)
+    for x, y, w, h in roi or ():
+        cv2.rectangle(frame, (x, y), (x+w, y+h), grey, 1)
+    for area, (x, y, w, h), (cx, cy) in zip(result.areas, result.boxes, result.centroids):
+        cv2.rectangle(frame, (x, y), (x+w, y+h), yellow, 2)
+        cv2.circle(frame, (cx, cy), 5, red, -1)
+        if labels:
+            cv2.putText(frame, f"Yellow ({int(area)})", (x, y-10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, yellow, 2)
+            cv2.putText(frame, f"({cx},{cy})", (cx+8, cy), cv2.FONT_HERSHEY_SIMPLEX, 0.5, red, 1)
+    return frame
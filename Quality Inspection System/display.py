@@ -0,0 +1,178 @@
+import numpy as np
+import cv2
+
+# -------------------------
+# RGB565 conversion
+# -------------------------
+# Channel layout -> OpenCV conversion to RGB565 (R in the top bits, stored
+# as little-endian uint16, which is what the panel is switched to below)
+RGB565_CONVERSIONS = {
+    3: cv2.COLOR_RGB2BGR565,
+    4: cv2.COLOR_RGBA2BGR565,
+}
+RGB565_SWAPPED_CONVERSIONS = {
+    3: cv2.COLOR_BGR2BGR565,
+    4: cv2.COLOR_BGRA2BGR565,
+}
+
+
+def to_rgb565(rgb, out=None, swap_rb=False):
+    """Packs an RGB(X) uint8 image into a (H, W) uint16 RGB565 array."""
+    table = RGB565_SWAPPED_CONVERSIONS if swap_rb else RGB565_CONVERSIONS
+    if out is None:
+        out = np.empty(rgb.shape[:2], np.uint16)
+    cv2.cvtColor(rgb, table[rgb.shape[2]], dst=out.view(np.uint8).reshape(out.shape + (2,)))
+    return out
+
+
+class DisplayBuffer:
+    """Reusable camera-frame -> panel conversion with no per-frame allocation.
+
+    Resize, inversion and the optional red/blue swap run in place on
+    preallocated buffers with OpenCV; the result is an RGB565 array that the
+    panel streams as is.
+    """
+    def __init__(self, width=320, height=240, invert=True, swap_rb=False):
+        self.size = (width, height)
+        self.invert = invert
+        self.swap_rb = swap_rb
+        self.rgb565 = np.empty((height, width), np.uint16)
+        self._scaled = {}    # channel count -> resize buffer
+
+    def convert(self, frame):
+        channels = frame.shape[2]
+        scaled = self._scaled.get(channels)
+        if scaled is None:
+            scaled = np.empty((self.size[1], self.size[0], channels), np.uint8)
+            self._scaled[channels] = scaled
+        if frame.shape[1::-1] == self.size:
+            np.copyto(scaled, frame)
+        else:
+            cv2.resize(frame, self.size, dst=scaled)
+        if self.invert:
+            # invert colors if your display gave negative images
+            cv2.bitwise_not(scaled, dst=scaled)
+        return to_rgb565(scaled, self.rgb565, self.swap_rb)
+
+
+# -------------------------
+# ST7789 rectangle writes
+# -------------------------
+class St7789Panel:
+    """Writes RGB565 pixel rectangles straight to an ST7789 driven by luma.lcd.
+
+    luma's `st7789.display()` always pushes the whole panel as 18-bit pixels
+    and first turns the frame into a Python list of bytes. Here the panel is
+    switched to 16-bit little-endian pixels, only the requested window is
+    addressed (CASET/RASET/RAMWR via `set_window`) and the uint16 buffer is
+    streamed with spidev's `writebytes2`, which accepts any buffer.
+    Once created, all screen updates must go through this panel.
+    """
+    def __init__(self, device, serial=None):
+        self.device = device
+        self.serial = serial if serial is not None else getattr(device, "_serial_interface", None)
+        self.width = device.width
+        self.height = device.height
+        device.command(0x3A, 0x55)          # COLMOD: 16 bit/pixel
+        device.command(0xB0, 0x00, 0xF8)    # RAMCTRL: little-endian pixel data
+
+    def write_rect(self, x0, y0, x1, y1, pixels):
+        """Sends `pixels` (contiguous (h, w) uint16 RGB565) to [x0,x1) x [y0,y1)."""
+        self.device.set_window(x0, y0, x1, y1)
+        self._write_data(pixels)
+
+    def _write_data(self, buf):
+        spi_dev = getattr(self.serial, "_spi", None)
+        if spi_dev is not None and hasattr(spi_dev, "writebytes2"):
+            # same DC handling as luma's serial.data(), without the list() copy
+            if self.serial._DC:
+                self.serial._gpio.output(self.serial._DC, self.serial._data_mode)
+            spi_dev.writebytes2(memoryview(buf).cast("B"))
+        else:
+            self.device.data(buf.view(np.uint8).reshape(-1).tolist())
+
+
+# -------------------------
+# Dirty-region display
+# -------------------------
+def changed_regions(prev, cur, merge_gap=8):
+    """Bounding boxes (x0, y0, x1, y1) of the row bands that differ between two frames.
+
+    Changed rows closer than `merge_gap` are merged into one band, so a moved
+    highlight gives one or two rectangles rather than one per scanline.
+    """
+    diff = prev != cur
+    if diff.ndim == 3:
+        diff = diff.any(axis=2)
+    rows = np.flatnonzero(diff.any(axis=1))
+    if rows.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(rows) > merge_gap)
+    starts = np.concatenate(([rows[0]], rows[breaks + 1]))
+    ends = np.concatenate((rows[breaks], [rows[-1]])) + 1
+    rects = []
+    for y0, y1 in zip(starts, ends):
+        cols = np.flatnonzero(diff[y0:y1].any(axis=0))
+        rects.append((int(cols[0]), int(y0), int(cols[-1]) + 1, int(y1)))
+    return rects
+
+
+class DirtyRegionDisplay:
+    """Drop-in for `tft.display()` that only pushes what changed since the last frame.
+
+    Without a panel (e.g. a fake display) every frame goes to
+    `device.display()` unchanged. When most of the frame changed anyway a
+    single full-frame write is cheaper than several windows.
+    """
+    def __init__(self, device, panel=None, full_frame_ratio=0.6):
+        self.device = device
+        self.panel = panel
+        self.width = device.width
+        self.height = device.height
+        self.full_frame_ratio = full_frame_ratio
+        self._last = None
+        self.frames = 0
+        self.pushed_pixels = 0
+
+    def show(self, image):
+        """Pushes a PIL image (HMI screens), diffed against the previous frame."""
+        self.frames += 1
+        if self.panel is None:
+            self.device.display(image)
+            self.pushed_pixels += self.width * self.height
+            return
+        cur = to_rgb565(np.asarray(image.convert("RGB")))
+        full = (0, 0, self.width, self.height)
+        if self._last is None:
+            rects = [full]
+        else:
+            rects = changed_regions(self._last, cur)
+            area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rects)
+            if area > self.full_frame_ratio * self.width * self.height:
+                rects = [full]
+        for x0, y0, x1, y1 in rects:
+            self.panel.write_rect(x0, y0, x1, y1, np.ascontiguousarray(cur[y0:y1, x0:x1]))
+            self.pushed_pixels += (x1 - x0) * (y1 - y0)
+        self._last = cur
+
+    def show_rgb565(self, buf):
+        """Pushes a full-screen RGB565 buffer (camera frames) without copying it."""
+        self.frames += 1
+        self.pushed_pixels += self.width * self.height
+        if self.panel is None:
+            self.device.display(buf)
+            return
+        self.panel.write_rect(0, 0, self.width, self.height, buf)
+        # the caller reuses buf, so there is nothing valid to diff against
+        self._last = None
+
+    def display(self, image):
+        # pipeline.DisplayThread and older call sites use display()
+        if isinstance(image, np.ndarray) and image.dtype == np.uint16:
+            self.show_rgb565(image)
+        else:
+            self.show(image)
+
+    def invalidate(self):
+        """Forces the next frame to be pushed in full (e.g. after the panel was cleared)."""
+        self._last = None
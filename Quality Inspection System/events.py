@@ -0,0 +1,210 @@
+"""One event queue for the HMI: GPIO edges, timers and screen refreshes."""
+import time
+import heapq
+import queue
+import itertools
+import threading
+
+# -------------------------
+# Events and timers
+# -------------------------
+class Event:
+    """Something that happened: `kind` ("button", "trigger", "refresh", ...) and an optional payload."""
+    __slots__ = ("kind", "payload", "t")
+
+    def __init__(self, kind, payload=None, t=None):
+        self.kind = kind
+        self.payload = payload
+        # time.perf_counter() when it was posted (edge time for GPIO events)
+        self.t = time.perf_counter() if t is None else t
+
+    def __repr__(self):
+        return f"Event({self.kind!r}, {self.payload!r})"
+
+
+class Timer:
+    """Handle of a scheduled event; `cancel()` stops it (also a repeating one)."""
+    __slots__ = ("due", "interval", "kind", "payload", "cancelled")
+
+    def __init__(self, due, interval, kind, payload):
+        self.due = due
+        self.interval = interval
+        self.kind = kind
+        self.payload = payload
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+# wakes a blocked wait() after a timer was added from another thread, or on stop()
+_WAKE = Event("_wake")
+
+
+# -------------------------
+# Dispatcher
+# -------------------------
+class EventDispatcher:
+    """Blocking event loop for the main thread.
+
+    GPIO callbacks (on RPi.GPIO's edge thread) and worker threads only
+    `post()` onto an unbounded queue, so no press is ever lost or
+    overwritten. The main thread blocks in `wait()` / `next_event()` until an
+    event arrives or the next timer is due; nothing runs between events.
+    Handlers registered with `on(kind, fn)` are called with the event on the
+    dispatching thread.
+    """
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._timers = []                   # heap of (due, seq, Timer)
+        self._seq = itertools.count()
+        self._timer_lock = threading.Lock()
+        self._handlers = {}
+        self._watched = []                  # (gpio, pin) with an edge callback
+        self._stopped = False
+        self.posted = 0
+        self.dispatched = 0
+        self.unhandled = 0
+
+    def post(self, kind, payload=None, t=None):
+        """Queues an event; safe from any thread, never blocks."""
+        self.posted += 1
+        self._queue.put(Event(kind, payload, t))
+
+    def on(self, kind, handler):
+        self._handlers.setdefault(kind, []).append(handler)
+
+    def off(self, kind, handler):
+        handlers = self._handlers.get(kind, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    # -------------------------
+    # Timers
+    # -------------------------
+    def call_later(self, delay, kind, payload=None):
+        """Posts `kind` once after `delay` seconds; returns a Timer."""
+        return self._schedule(time.monotonic() + delay, None, kind, payload)
+
+    def call_every(self, interval, kind, payload=None, first=None):
+        """Posts `kind` every `interval` seconds (first after `first`, default one interval)."""
+        delay = interval if first is None else first
+        return self._schedule(time.monotonic() + delay, interval, kind, payload)
+
+    def _schedule(self, due, interval, kind, payload):
+        timer = Timer(due, interval, kind, payload)
+        with self._timer_lock:
+            heapq.heappush(self._timers, (due, next(self._seq), timer))
+            earliest = self._timers[0][2] is timer
+        if earliest:
+            # a wait() already blocked on a later deadline has to recompute it
+            self._queue.put(_WAKE)
+        return timer
+
+    def _fire_timers(self, now):
+        # moves due timers onto the queue; returns seconds until the next one
+        with self._timer_lock:
+            while self._timers:
+                due, _, timer = self._timers[0]
+                if timer.cancelled:
+                    heapq.heappop(self._timers)
+                    continue
+                if due > now:
+                    return due - now
+                heapq.heappop(self._timers)
+                self._queue.put(Event(timer.kind, timer.payload))
+                if timer.interval:
+                    # a late tick (e.g. a slow handler) is not caught up in a burst
+                    timer.due = max(due + timer.interval, now)
+                    heapq.heappush(self._timers, (timer.due, next(self._seq), timer))
+        return None
+
+    # -------------------------
+    # Waiting and dispatching
+    # -------------------------
+    def wait(self, timeout=None):
+        """Next event, blocking up to `timeout` seconds (None = until one arrives or stop())."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stopped:
+            now = time.monotonic()
+            block = self._fire_timers(now)
+            if deadline is not None:
+                remaining = max(0.0, deadline - now)
+                block = remaining if block is None else min(block, remaining)
+            try:
+                event = self._queue.get(timeout=block) if block != 0.0 else self._queue.get_nowait()
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+                continue
+            if event is not _WAKE:
+                return event
+        return None
+
+    def dispatch(self, event):
+        """Calls the handlers of `event.kind`; returns False when there are none."""
+        handlers = self._handlers.get(event.kind)
+        if not handlers:
+            self.unhandled += 1
+            return False
+        self.dispatched += 1
+        for handler in list(handlers):
+            handler(event)
+        return True
+
+    def next_event(self, kinds, timeout=None):
+        """Waits for an event of one of `kinds`, dispatching any other event meanwhile.
+
+        Screens use this to read their own input: `timeout=0` only looks at
+        what is already queued. Returns None on timeout or after stop().
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            event = self.wait(remaining)
+            if event is None:
+                return None
+            if event.kind in kinds:
+                return event
+            self.dispatch(event)
+
+    def run(self):
+        """Dispatches events until stop()."""
+        while not self._stopped:
+            event = self.wait()
+            if event is not None:
+                self.dispatch(event)
+
+    def stop(self):
+        self._stopped = True
+        self._queue.put(_WAKE)
+
+    # -------------------------
+    # GPIO edges
+    # -------------------------
+    def watch_pin(self, gpio, pin, edge, kind, payload=None, bouncetime=None, callback=None):
+        """Posts `kind` on every `edge` of `pin` (RPi.GPIO or fakes.SimulatedGPIO).
+
+        `callback(pin)` runs first on the GPIO thread, for work that cannot
+        wait for the main loop (e.g. latching the part trigger).
+        """
+        def on_edge(channel):
+            t = time.perf_counter()
+            if callback is not None:
+                callback(channel)
+            self.post(kind, payload, t)
+
+        if bouncetime:
+            gpio.add_event_detect(pin, edge, callback=on_edge, bouncetime=bouncetime)
+        else:
+            gpio.add_event_detect(pin, edge, callback=on_edge)
+        self._watched.append((gpio, pin))
+
+    def unwatch(self):
+        """Removes every edge callback added by watch_pin()."""
+        for gpio, pin in self._watched:
+            try:
+                gpio.remove_event_detect(pin)
+            except Exception:
+                pass
+        self._watched = []
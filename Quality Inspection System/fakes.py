@@ -0,0 +1,365 @@
+"""Hardware stand-ins for running the inspection code off the Pi."""
+import time
+import queue
+import itertools
+import threading
+import numpy as np
+import cv2
+
+
+class SensorClock:
+    """Frame timing of a free-running sensor.
+
+    Frames complete every 1/`fps` seconds from when the clock is created,
+    whether or not anyone reads them. `wait()` blocks until the next frame
+    that completes after the call, so a capture after an idle spell (right
+    after a trigger, say) waits for the next frame boundary like the real
+    camera, and a reader slower than the sensor skips frames. Without `fps`
+    it never waits.
+    """
+    def __init__(self, fps=None):
+        self.interval = 1.0 / fps if fps else 0.0
+        self._t0 = time.perf_counter()
+        self._last = -1
+
+    def wait(self):
+        """Waits for the next frame; returns its number since the clock started."""
+        if not self.interval:
+            return 0
+        now = time.perf_counter()
+        n = max(self._last + 1, int((now - self._t0) / self.interval) + 1)
+        delay = self._t0 + n * self.interval - now
+        if delay > 0:
+            time.sleep(delay)
+        self._last = n
+        return n
+
+
+class ReplayCamera:
+    """Camera stand-in that replays recorded frames through `capture_array()`.
+
+    `fps` paces delivery like the free-running sensor (see SensorClock);
+    `loop=False` returns None once the recording is exhausted.
+    """
+    def __init__(self, frames, fps=None, loop=True):
+        self.frames = list(frames)
+        self.clock = SensorClock(fps)
+        self._source = itertools.cycle(self.frames) if loop else iter(self.frames)
+        self.captured = 0
+
+    def capture_array(self, name="main"):
+        self.clock.wait()
+        frame = next(self._source, None)
+        if frame is None:
+            return None
+        self.captured += 1
+        # the real camera hands out a fresh buffer every time
+        return frame.copy()
+
+
+class FakeDisplay:
+    """TFT stand-in; `delay` simulates the SPI transfer time of one full frame."""
+    width = 320
+    height = 240
+    mode = "RGB"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.frames = 0
+        self.last_image = None
+
+    def display(self, image):
+        if self.delay:
+            time.sleep(self.delay)
+        self.last_image = image
+        self.frames += 1
+
+
+class RecordingOutputs:
+    """Verdict output stand-in that records every decision with its timestamp."""
+    def __init__(self):
+        self.decisions = []
+
+    def apply(self, ok):
+        self.decisions.append((time.perf_counter(), ok))
+
+    def clear(self):
+        pass
+
+
+class FakeFrameSource:
+    """Synthetic camera: a grey casing with yellow clips, no recording needed.
+
+    Every `nok_every`-th frame is missing one clip, so both verdicts occur.
+    A few noisy variants are rendered up front; `capture_array()` returns a
+    fresh copy like the real camera, paced to `fps` when given.
+    """
+    def __init__(self, width=640, height=480, channels=3, clips=2, nok_every=5,
+                 fps=None, variants=8, seed=0):
+        rng = np.random.default_rng(seed)
+        self.frames = []
+        for i in range(variants):
+            frame = np.full((height, width, channels), 90, np.uint8)
+            frame += rng.integers(0, 20, frame.shape, np.uint8)
+            shown = clips - 1 if nok_every and i % nok_every == nok_every - 1 else clips
+            for c in range(shown):
+                x = (c + 1) * width // (clips + 1) - 20 + int(rng.integers(-6, 7))
+                y = height // 2 - 25 + int(rng.integers(-6, 7))
+                cv2.rectangle(frame, (x, y), (x + 40, y + 50), (230, 200, 20, 255)[:channels], -1)
+            self.frames.append(frame)
+        self.clock = SensorClock(fps)
+        self._index = 0
+        self.captured = 0
+
+    def capture_array(self, name="main"):
+        self.clock.wait()
+        frame = self.frames[self._index]
+        self._index = (self._index + 1) % len(self.frames)
+        self.captured += 1
+        return frame.copy()
+
+
+class FakeFixture:
+    """Synthetic fixture: plateaus slide in, stop for inspection and slide out.
+
+    Each cycle is `gap_frames` of empty fixture, `move_frames` sliding in,
+    `dwell_frames` at rest and `move_frames` sliding out; every
+    `nok_every`-th plateau is missing a clip. `parts` holds the ground truth
+    of every plateau shown so far: (id, ok, first frame, last frame in view).
+    """
+    def __init__(self, width=640, height=480, channels=3, clips=2, nok_every=4, move_frames=6,
+                 dwell_frames=20, gap_frames=15, fps=None, seed=0):
+        rng = np.random.default_rng(seed)
+        self.width = width
+        self.backgrounds = []
+        for _ in range(4):
+            frame = np.full((height, width, channels), 90, np.uint8)
+            frame += rng.integers(0, 20, frame.shape, np.uint8)
+            self.backgrounds.append(frame)
+        pw, ph = width * 9 // 16, height // 2
+        self.sprites = []
+        for shown in (clips, clips - 1):
+            sprite = np.empty((ph, pw, channels), np.uint8)
+            sprite[:] = (40, 45, 60, 255)[:channels]
+            for c in range(shown):
+                x = (c + 1) * pw // (clips + 1) - 20
+                cv2.rectangle(sprite, (x, ph // 2 - 25), (x + 40, ph // 2 + 25), (230, 200, 20, 255)[:channels], -1)
+            self.sprites.append(sprite)
+        self.y = (height - ph) // 2
+        self.x_rest = (width - pw) // 2
+        self.clips = clips
+        self.nok_every = nok_every
+        self.move_frames = move_frames
+        self.dwell_frames = dwell_frames
+        self.gap_frames = gap_frames
+        self.cycle = gap_frames + 2 * move_frames + dwell_frames
+        self.clock = SensorClock(fps)
+        self.index = 0
+        self.parts = []
+        self.captured = 0
+
+    def _offset(self, k):
+        """Plateau x position at frame k of the cycle (None while the fixture is empty)."""
+        k -= self.gap_frames
+        pw = self.sprites[0].shape[1]
+        if k < 0:
+            return None
+        if k < self.move_frames:
+            return -pw + (self.x_rest + pw) * (k + 1) // self.move_frames
+        k -= self.move_frames
+        if k < self.dwell_frames:
+            return self.x_rest
+        k -= self.dwell_frames
+        x = self.x_rest + (self.width - self.x_rest) * (k + 1) // self.move_frames
+        return x if x < self.width else None
+
+    def capture_array(self, name="main"):
+        self.clock.wait()
+        i = self.index
+        k = i % self.cycle
+        part = i // self.cycle
+        ok = not (self.nok_every and part % self.nok_every == self.nok_every - 1)
+        if k == self.gap_frames:
+            last = i + 2 * self.move_frames + self.dwell_frames - 2
+            self.parts.append((part + 1, ok, i, last))
+        frame = self.backgrounds[i % len(self.backgrounds)].copy()
+        x = self._offset(k)
+        if x is not None:
+            sprite = self.sprites[0 if ok else 1]
+            ph, pw = sprite.shape[:2]
+            x0, x1 = max(x, 0), min(x + pw, self.width)
+            frame[self.y:self.y+ph, x0:x1] = sprite[:, x0-x:x1-x]
+        self.index += 1
+        self.captured += 1
+        return frame
+
+
+class FakePicamera2:
+    """Picamera2 stand-in for camera.CameraManager.
+
+    The `main` stream comes from `source` (default: 4-channel synthetic frames,
+    like XBGR8888); `lores` is derived from it as YUV420 at the configured
+    size. `start_delay` simulates the sensor starting up.
+    """
+    def __init__(self, source=None, start_delay=0.0, open_delay=0.0):
+        if open_delay:
+            time.sleep(open_delay)
+        self.source = source or FakeFrameSource(channels=4)
+        self.start_delay = start_delay
+        self.config = None
+        self.started = False
+        self.starts = 0
+
+    def create_video_configuration(self, main=None, lores=None, **kwargs):
+        return {"main": dict(main or {}), "lores": dict(lores) if lores else None}
+
+    create_preview_configuration = create_video_configuration
+
+    def configure(self, config):
+        if self.started:
+            raise RuntimeError("Camera must be stopped before configuring")
+        self.config = config
+
+    def start(self):
+        if self.start_delay:
+            time.sleep(self.start_delay)
+        self.started = True
+        self.starts += 1
+
+    def stop(self):
+        self.started = False
+
+    def capture_array(self, name="main"):
+        if not self.started:
+            raise RuntimeError("Camera is not running")
+        frame = self.source.capture_array()
+        if name == "lores":
+            size = tuple(self.config["lores"]["size"])
+            rgb = cv2.resize(frame[:, :, :3], size, interpolation=cv2.INTER_AREA)
+            return cv2.cvtColor(rgb, cv2.COLOR_RGB2YUV_I420)
+        return frame
+
+
+class SimulatedGPIO:
+    """RPi.GPIO stand-in whose inputs are driven from code.
+
+    Implements the calls main.py makes (setmode, setup, input, output,
+    add_event_detect, remove_event_detect, cleanup). `press()` / `pulse()` /
+    `set_input()` change an input level; matching edges are debounced like
+    RPi.GPIO (`bouncetime` in ms) and their callbacks run on one edge thread,
+    in order, unless `threaded=False` runs them inline. `writes` records every
+    output change as (perf_counter, pin, level).
+    """
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, threaded=True):
+        self.mode = None
+        self.levels = {}
+        self.writes = []
+        self.edges = 0
+        self._detect = {}       # pin -> [edge, callback, bouncetime_s, last_accepted]
+        self._lock = threading.Lock()
+        self._calls = None
+        if threaded:
+            self._calls = queue.SimpleQueue()
+            threading.Thread(target=self._run_callbacks, name="gpio-edges", daemon=True).start()
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        if direction == self.IN:
+            self.levels[pin] = self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+        else:
+            self.levels[pin] = self.LOW if initial is None else initial
+
+    def input(self, pin):
+        return self.levels[pin]
+
+    def output(self, pin, value):
+        self.levels[pin] = int(bool(value))
+        self.writes.append((time.perf_counter(), pin, self.levels[pin]))
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self._lock:
+            if pin in self._detect:
+                raise RuntimeError(f"Conflicting edge detection already enabled for GPIO {pin}")
+            self._detect[pin] = [edge, callback, (bouncetime or 0) / 1000.0, None]
+
+    def add_event_callback(self, pin, callback):
+        self._detect[pin][1] = callback
+
+    def remove_event_detect(self, pin):
+        with self._lock:
+            self._detect.pop(pin, None)
+
+    def cleanup(self, pins=None):
+        with self._lock:
+            for pin in list(self._detect) if pins is None else pins:
+                self._detect.pop(pin, None)
+        self.levels.clear()
+
+    # -------------------------
+    # Driving inputs
+    # -------------------------
+    def set_input(self, pin, level):
+        """Changes an input level, firing the pin's callback on a matching edge."""
+        level = int(bool(level))
+        old = self.levels.get(pin, self.LOW)
+        self.levels[pin] = level
+        if level == old:
+            return
+        with self._lock:
+            entry = self._detect.get(pin)
+            if entry is None:
+                return
+            edge, callback, bounce, last = entry
+            if edge != self.BOTH and edge != (self.RISING if level else self.FALLING):
+                return
+            now = time.perf_counter()
+            if last is not None and now - last < bounce:
+                return
+            entry[3] = now
+            self.edges += 1
+        if callback is None:
+            return
+        if self._calls is not None:
+            self._calls.put((callback, pin))
+        else:
+            callback(pin)
+
+    def press(self, pin, hold=0.0):
+        """Pushes a pull-up button (falling edge) and releases it after `hold` seconds."""
+        self.set_input(pin, self.LOW)
+        if hold:
+            time.sleep(hold)
+        self.set_input(pin, self.HIGH)
+
+    def pulse(self, pin, width=0.0):
+        """Drives an active-high input (e.g. PIN_INT) high for `width` seconds."""
+        self.set_input(pin, self.HIGH)
+        if width:
+            time.sleep(width)
+        self.set_input(pin, self.LOW)
+
+    def _run_callbacks(self):
+        while True:
+            callback, pin = self._calls.get()
+            try:
+                callback(pin)
+            except Exception as e:
+                print(f"GPIO {pin} callback error:", e)
@@ -0,0 +1,239 @@
+"""Last-N frame ring and background writer for reject evidence."""
+import os
+import json
+import time
+import queue
+import shutil
+import threading
+import numpy as np
+import cv2
+
+# Camera channel order -> conversion to the BGR that cv2.imencode expects
+BGR_CONVERSIONS = {
+    "RGB": cv2.COLOR_RGB2BGR,
+    "RGBX": cv2.COLOR_RGBA2BGR,
+    "BGR": None,
+    "BGRX": cv2.COLOR_BGRA2BGR,
+}
+
+
+# -------------------------
+# Frame ring
+# -------------------------
+class FrameRing:
+    """The last `capacity` frames and their masks, overwritten in place.
+
+    The arrays are allocated once, on the first `push()`, from that frame's
+    shape; after that a push is two copies into the next slot and never
+    allocates. One thread pushes (the detection thread). Readers copy a
+    frame out with `read(seq, ...)`, which uses the slot's sequence number
+    like a seqlock: a frame overwritten while it was being copied is
+    reported as lost instead of returned torn.
+    """
+    def __init__(self, capacity=16):
+        self.capacity = capacity
+        self.frames = None
+        self.masks = None
+        self.seqs = np.full(capacity, -1, np.int64)
+        self.times = np.zeros(capacity, np.float64)
+        self.next_seq = 0
+        self._cond = threading.Condition()
+
+    def push(self, frame, mask=None, t=None):
+        """Stores a frame (and its detection mask); returns its sequence number."""
+        if self.frames is None:
+            self.frames = np.empty((self.capacity,) + frame.shape, frame.dtype)
+            self.masks = np.zeros((self.capacity,) + frame.shape[:2], np.uint8)
+        seq = self.next_seq
+        slot = seq % self.capacity
+        self.seqs[slot] = -1          # readers of the old frame now see it as lost
+        np.copyto(self.frames[slot], frame)
+        dst = self.masks[slot]
+        if mask is None:
+            dst.fill(0)
+        elif mask.shape == dst.shape:
+            np.copyto(dst, mask)
+        else:
+            # coarse-to-fine results carry a downscaled mask
+            cv2.resize(mask, dst.shape[::-1], dst=dst, interpolation=cv2.INTER_NEAREST)
+        self.times[slot] = time.perf_counter() if t is None else t
+        self.seqs[slot] = seq
+        with self._cond:
+            self.next_seq = seq + 1
+            self._cond.notify_all()
+        return seq
+
+    @property
+    def latest(self):
+        """Sequence number of the newest frame (-1 before the first push)."""
+        return self.next_seq - 1
+
+    def wait_for(self, seq, timeout):
+        """Blocks until frame `seq` has been pushed; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.next_seq > seq, timeout)
+
+    def read(self, seq, frame_out, mask_out):
+        """Copies frame `seq` into the given buffers; returns its time, or None if it is gone."""
+        if self.frames is None or seq < 0:
+            return None
+        slot = seq % self.capacity
+        if self.seqs[slot] != seq:
+            return None
+        np.copyto(frame_out, self.frames[slot])
+        np.copyto(mask_out, self.masks[slot])
+        t = float(self.times[slot])
+        if self.seqs[slot] != seq:
+            return None                 # overwritten during the copy
+        return t
+
+
+# -------------------------
+# Evidence writer
+# -------------------------
+class EvidenceRecorder(threading.Thread):
+    """Writes the frames around a rejected part to disk, off the detection thread.
+
+    `request(seq, label, info)` only queues the request (dropped and counted
+    if `max_pending` are already waiting), so detection never waits on
+    encoding or disk. The writer waits for the `post` frames after `seq`,
+    copies `pre` + 1 + `post` frames with their masks out of the ring into
+    its own buffers, JPEG-encodes the frames, PNG-encodes the masks and
+    writes them with a meta.json into one directory per event. Oldest
+    events are deleted to keep the directory under `max_bytes`.
+    """
+    def __init__(self, ring, directory, pre=4, post=4, color_order="RGB", max_bytes=200 * 1024 * 1024,
+                 jpeg_quality=85, max_pending=8, post_timeout=2.0, metrics=None):
+        super().__init__(name="evidence-writer", daemon=True)
+        self.ring = ring
+        self.directory = directory
+        self.pre = pre
+        self.post = post
+        self.conversion = BGR_CONVERSIONS[color_order]
+        self.max_bytes = max_bytes
+        self.jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+        self.post_timeout = post_timeout
+        self.metrics = metrics
+        self.written = 0
+        self.dropped = 0
+        self.lost_frames = 0
+        self._queue = queue.Queue(max_pending)
+        self._stop_event = threading.Event()
+        self._frames = None
+        self._masks = None
+        os.makedirs(directory, exist_ok=True)
+        self._events = self._scan()      # [(name, bytes)], oldest first
+        self.disk_bytes = sum(size for _, size in self._events)
+
+    def request(self, seq, label="reject", info=None, pre=None, post=None):
+        """Queues evidence for frame `seq`; never blocks. Returns False if it was dropped.
+
+        `pre` / `post` override the number of frames kept before and after it.
+        """
+        pre = self.pre if pre is None else pre
+        post = self.post if post is None else post
+        try:
+            self._queue.put_nowait((seq, label, info or {}, time.time(), pre, post))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def run(self):
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            try:
+                job = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                self._write(*job)
+            except (OSError, cv2.error) as e:
+                print("Evidence write failed:", e)
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        self.join(timeout)
+
+    # -------------------------
+    # Writer thread
+    # -------------------------
+    def _collect(self, seq, pre, post):
+        # copies the frames around seq out of the ring before they are overwritten
+        # once stopping, no more frames will come: write what is there
+        self.ring.wait_for(seq + post, 0 if self._stop_event.is_set() else self.post_timeout)
+        n = pre + 1 + post
+        if self._frames is None or len(self._frames) < n or self._frames.shape[1:] != self.ring.frames.shape[1:]:
+            self._frames = np.empty((n,) + self.ring.frames.shape[1:], self.ring.frames.dtype)
+            self._masks = np.empty((n,) + self.ring.masks.shape[1:], np.uint8)
+        kept = []
+        for i, s in enumerate(range(seq - pre, seq + post + 1)):
+            t = self.ring.read(s, self._frames[i], self._masks[i])
+            if t is None:
+                if s >= 0:
+                    self.lost_frames += 1
+                continue
+            kept.append((i, s - seq, t))
+        return kept
+
+    def _write(self, seq, label, info, wall_time, pre, post):
+        t0 = time.perf_counter()
+        kept = self._collect(seq, pre, post)
+        if not kept:
+            return
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(wall_time))
+        name = f"{stamp}-{int(wall_time * 1000) % 1000:03d}-{label}-{seq}"
+        tmp = os.path.join(self.directory, "." + name)
+        os.makedirs(tmp, exist_ok=True)
+        t_trigger = dict((offset, t) for _, offset, t in kept).get(0)
+        frames = []
+        for i, offset, t in kept:
+            frame = self._frames[i]
+            bgr = frame if self.conversion is None else cv2.cvtColor(frame, self.conversion)
+            ok, jpg = cv2.imencode(".jpg", bgr, self.jpeg_params)
+            if ok:
+                with open(os.path.join(tmp, f"frame{offset:+03d}.jpg"), "wb") as f:
+                    f.write(jpg)
+            ok, png = cv2.imencode(".png", self._masks[i])
+            if ok:
+                with open(os.path.join(tmp, f"mask{offset:+03d}.png"), "wb") as f:
+                    f.write(png)
+            frames.append({"offset": offset, "seq": seq + offset,
+                           "dt": None if t_trigger is None else t - t_trigger})
+        meta = dict(info, label=label, seq=seq, time=wall_time, frames=frames)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        final = os.path.join(self.directory, name)
+        os.replace(tmp, final)
+        size = _dir_size(final)
+        self._events.append((name, size))
+        self.disk_bytes += size
+        self.written += 1
+        self._enforce_budget()
+        if self.metrics is not None:
+            self.metrics.record("evidence.write", time.perf_counter() - t0)
+
+    def _enforce_budget(self):
+        # the newest event is always kept, even if it alone exceeds the budget
+        while self.disk_bytes > self.max_bytes and len(self._events) > 1:
+            name, size = self._events.pop(0)
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            self.disk_bytes -= size
+
+    def _scan(self):
+        events = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name.startswith("."):
+                # left over from an interrupted write
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.isdir(path):
+                events.append((name, _dir_size(path)))
+        return events
+
+
+def _dir_size(path):
+    total = 0
+    for entry in os.scandir(path):
+        if entry.is_file():
+            total += entry.stat().st_size
+    return total
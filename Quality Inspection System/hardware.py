@@ -0,0 +1,125 @@
+"""Hardware handles (GPIO, TFT, camera) opened on first use from injectable backends."""
+import time
+import threading
+
+from camera import CameraManager
+from display import DirtyRegionDisplay, St7789Panel
+
+# -------------------------
+# Default (Raspberry Pi) backends
+# -------------------------
+def rpi_gpio():
+    import RPi.GPIO as GPIO
+    return GPIO
+
+
+def st7789_screen(dc, rst, width=320, height=240, port=0, device=0):
+    """ST7789 on SPI through luma, wrapped for dirty-region updates."""
+    from luma.core.interface.serial import spi
+    from luma.lcd.device import st7789
+    serial = spi(port=port, device=device, gpio_DC=dc, gpio_RST=rst)
+    tft = st7789(serial, width=width, height=height, rotate=0)
+    return DirtyRegionDisplay(tft, St7789Panel(tft, serial))
+
+
+def picamera2_camera(index=0):
+    from picamera2 import Picamera2
+    return Picamera2(index)
+
+
+# -------------------------
+# Lazy handles
+# -------------------------
+class Hardware:
+    """Creates each hardware handle the first time it is used.
+
+    `gpio`, `screen` and `camera` are zero-argument factories: the Pi
+    defaults above, or fakes (`fakes.SimulatedGPIO`, a DirtyRegionDisplay
+    around `fakes.FakeDisplay`, `fakes.FakePicamera2`) to run off the Pi.
+    `setup_gpio(gpio)` configures the pins once the GPIO module is open.
+    `warm_up_camera()` opens and starts the camera on a background thread;
+    `camera` waits for it only when a screen actually needs frames.
+    Open times are recorded as `startup.<handle>`.
+    """
+    def __init__(self, gpio=rpi_gpio, screen=None, camera=picamera2_camera, setup_gpio=None,
+                 camera_options=None, metrics=None):
+        self._factories = {"gpio": gpio, "screen": screen, "camera": camera}
+        self._setup_gpio = setup_gpio
+        self.camera_options = camera_options or {}
+        self.metrics = metrics
+        self._handles = {}
+        # one lock per handle: the camera warming up never holds back the screen
+        self._locks = {name: threading.Lock() for name in self._factories}
+        self._camera_thread = None
+
+    def _open(self, name, opener):
+        with self._locks[name]:
+            handle = self._handles.get(name)
+            if handle is None:
+                t0 = time.perf_counter()
+                handle = opener()
+                self._handles[name] = handle
+                if self.metrics is not None:
+                    self.metrics.record(f"startup.{name}", time.perf_counter() - t0)
+            return handle
+
+    def is_open(self, name):
+        return name in self._handles
+
+    @property
+    def gpio(self):
+        def opener():
+            gpio = self._factories["gpio"]()
+            if self._setup_gpio is not None:
+                self._setup_gpio(gpio)
+            return gpio
+        return self._open("gpio", opener)
+
+    @property
+    def screen(self):
+        if self._factories["screen"] is None:
+            raise RuntimeError("no screen backend configured")
+        return self._open("screen", self._factories["screen"])
+
+    # -------------------------
+    # Camera (warmed up in the background)
+    # -------------------------
+    def _open_camera(self):
+        camera = CameraManager(self._factories["camera"](), metrics=self.metrics, **self.camera_options)
+        try:
+            camera.start()
+        except Exception as e:
+            # screens still get the manager; captures will fail like before
+            print("Warning: camera configuration failed:", e)
+        return camera
+
+    def warm_up_camera(self):
+        """Opens and starts the camera without blocking the caller."""
+        if self._camera_thread is None and not self.is_open("camera"):
+            self._camera_thread = threading.Thread(target=self._warm_up, name="camera-warmup", daemon=True)
+            self._camera_thread.start()
+        return self._camera_thread
+
+    def _warm_up(self):
+        try:
+            self._open("camera", self._open_camera)
+        except Exception as e:
+            # the next `camera` access retries and raises on the caller's thread
+            print("Warning: camera warm-up failed:", e)
+
+    @property
+    def camera(self):
+        # waits for a warm-up still in progress (the per-handle lock would too)
+        return self._open("camera", self._open_camera)
+
+    def camera_ready(self):
+        return self.is_open("camera")
+
+    def close(self):
+        """Stops the camera if it was ever opened (GPIO cleanup is left to the caller)."""
+        thread = self._camera_thread
+        if thread is not None:
+            thread.join(5.0)
+        camera = self._handles.get("camera")
+        if camera is not None:
+            camera.stop()
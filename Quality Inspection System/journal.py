@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import threading
+
+# -------------------------
+# Schema
+# -------------------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inspections (
+    id               INTEGER PRIMARY KEY,
+    uid              TEXT NOT NULL UNIQUE,
+    ts               REAL NOT NULL,
+    station          TEXT NOT NULL,
+    ok               INTEGER NOT NULL,
+    clips            INTEGER NOT NULL,
+    areas            TEXT,
+    centroids        TEXT,
+    plateau_number   INTEGER,
+    duration_seconds REAL,
+    latency_ms       REAL,
+    uploaded         INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS inspections_ts ON inspections (ts);
+"""
+
+# records still to be sent to the dashboard, oldest first; plateau_monitor
+# only takes parts with a plateau number and a dwell time (tracked mode),
+# every other record stays local
+PENDING_WHERE = "uploaded = 0 AND plateau_number IS NOT NULL AND duration_seconds IS NOT NULL"
+PENDING_INDEX = f"CREATE INDEX IF NOT EXISTS inspections_pending_plateau ON inspections (id) WHERE {PENDING_WHERE}"
+
+COLUMNS = ("uid", "ts", "station", "ok", "clips", "areas", "centroids",
+           "plateau_number", "duration_seconds", "latency_ms")
+
+INSERT_SQL = f"INSERT OR IGNORE INTO inspections ({', '.join(COLUMNS)}) " \
+             f"VALUES ({', '.join('?' for _ in COLUMNS)})"
+
+
+def open_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL: commits are atomic and survive a crash of the process;
+    # a power cut may lose the last batch but never corrupts the file
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.executescript(SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(inspections)")}
+    if "uploaded" not in columns:
+        # journals written before uploads were tracked
+        conn.execute("ALTER TABLE inspections ADD COLUMN uploaded INTEGER NOT NULL DEFAULT 0")
+    conn.execute("DROP INDEX IF EXISTS inspections_pending")
+    conn.execute(PENDING_INDEX)
+    conn.commit()
+    return conn
+
+
+def _row_to_dict(row):
+    rec = dict(zip(("id",) + COLUMNS, row))
+    rec["ok"] = bool(rec["ok"])
+    rec["areas"] = json.loads(rec["areas"]) if rec["areas"] else []
+    rec["centroids"] = [tuple(c) for c in json.loads(rec["centroids"])] if rec["centroids"] else []
+    return rec
+
+
+# -------------------------
+# Inspection journal
+# -------------------------
+class InspectionJournal:
+    """Append-only local log of per-part inspection records (SQLite, WAL mode).
+
+    `append()` only puts the record on a bounded queue and never blocks; a
+    background thread writes queued records in batches of up to `batch_size`
+    per transaction. When the database grows past `max_bytes` it is rotated
+    to `<path>.1` .. `<path>.<keep>` and a fresh file is started.
+
+    While `hold_unuploaded` is set (an uploader is attached), rotation does
+    not drop `<path>.<keep>` as long as it holds records still to upload: the
+    current file keeps growing until the uploader catches up, or until it
+    reaches `hold_max_bytes` (default 4 x `max_bytes`), when the oldest file
+    is dropped anyway and the lost records are counted in a warning.
+    """
+    def __init__(self, path, batch_size=64, flush_interval=1.0, max_bytes=64 * 1024 * 1024,
+                 keep=4, queue_size=10000, hold_unuploaded=False, hold_max_bytes=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.hold_unuploaded = hold_unuploaded
+        self.hold_max_bytes = hold_max_bytes if hold_max_bytes is not None else 4 * max_bytes
+        self.discarded = 0              # never-uploaded records lost to rotation
+        self.dropped = 0
+        self.written = 0
+        self.rotation_held = False      # oldest file still has records to upload
+        self._queue = queue.Queue(queue_size)
+        self._stop_event = threading.Event()
+        self._db_lock = threading.Lock()     # held by the writer while rotating
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, ok, clips, areas=(), centroids=(), station="main", ts=None,
+               plateau_number=None, duration_seconds=None, latency_ms=None):
+        """Queues one inspection record; returns its uid (None if the queue was full)."""
+        uid = uuid.uuid4().hex
+        row = (uid, time.time() if ts is None else ts, station, int(bool(ok)), int(clips),
+               json.dumps([round(float(a), 1) for a in areas]),
+               json.dumps([[int(x), int(y)] for x, y in centroids]),
+               plateau_number, duration_seconds, latency_ms)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return None
+        return uid
+
+    def append_result(self, result, **kwargs):
+        """Convenience wrapper for a detection.DetectionResult."""
+        return self.append(result.ok, result.valid_contours, result.areas, result.centroids, **kwargs)
+
+    # -------------------------
+    # Writer thread
+    # -------------------------
+    def _run(self):
+        conn = open_db(self.path)
+        try:
+            while not (self._stop_event.is_set() and self._queue.empty()):
+                try:
+                    first = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                batch = [first]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    with conn:
+                        conn.executemany(INSERT_SQL, batch)
+                    self.written += len(batch)
+                except sqlite3.Error as e:
+                    print("Journal write failed:", e)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if self._size() > self.max_bytes:
+                    conn = self._rotate(conn)
+        finally:
+            conn.close()
+
+    def _size(self):
+        total = 0
+        for suffix in ("", "-wal"):
+            try:
+                total += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        return total
+
+    def _pending_count(self, path):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM inspections WHERE {PENDING_WHERE}").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+        finally:
+            conn.close()
+
+    def _rotate(self, conn):
+        oldest = f"{self.path}.{self.keep}"
+        pending = self._pending_count(oldest) if os.path.exists(oldest) else 0
+        if pending and self.hold_unuploaded and self._size() < self.hold_max_bytes:
+            if not self.rotation_held:
+                print(f"Journal: {oldest} still has {pending} records to upload, "
+                      f"not rotating; {self.path} grows up to {self.hold_max_bytes / (1024 * 1024):.1f} MB")
+            self.rotation_held = True
+            return conn
+        if pending:
+            self.discarded += pending
+            print(f"Journal: rotating out {oldest} with {pending} records never uploaded")
+        elif self.rotation_held:
+            print("Journal: records uploaded, rotating again")
+        self.rotation_held = False
+        with self._db_lock:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.close()
+            for i in range(self.keep, 0, -1):
+                src = self.path if i == 1 else f"{self.path}.{i-1}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i}")
+            for suffix in ("-wal", "-shm"):
+                try:
+                    os.remove(self.path + suffix)
+                except OSError:
+                    pass
+            return open_db(self.path)
+
+    # -------------------------
+    # Queries
+    # -------------------------
+    def generations(self):
+        """Journal files, newest first."""
+        files = [self.path] + [f"{self.path}.{i}" for i in range(1, self.keep + 1)]
+        return [f for f in files if os.path.exists(f)]
+
+    def recent(self, limit=50, station=None):
+        """Newest records first, reaching into rotated files when needed."""
+        sql = f"SELECT id, {', '.join(COLUMNS)} FROM inspections"
+        params = []
+        if station is not None:
+            sql += " WHERE station = ?"
+            params.append(station)
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        records = []
+        with self._db_lock:
+            for path in self.generations():
+                conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+                try:
+                    rows = conn.execute(sql, params + [limit - len(records)]).fetchall()
+                except sqlite3.OperationalError:
+                    rows = []   # file created but schema not written yet
+                finally:
+                    conn.close()
+                records.extend(_row_to_dict(r) for r in rows)
+                if len(records) >= limit:
+                    break
+        return records
+
+    def pending(self, limit=200):
+        """Oldest records still to upload (see PENDING_WHERE), reading the oldest journal file first."""
+        sql = f"SELECT id, {', '.join(COLUMNS)} FROM inspections WHERE {PENDING_WHERE} ORDER BY id LIMIT ?"
+        out = []
+        with self._db_lock:
+            for path in reversed(self.generations()):
+                conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+                try:
+                    rows = conn.execute(sql, (limit - len(out),)).fetchall()
+                except sqlite3.OperationalError:
+                    rows = []
+                finally:
+                    conn.close()
+                out.extend(_row_to_dict(r) for r in rows)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def mark_uploaded(self, uids):
+        """Flags records as delivered (by uid, so a rotation in between is harmless)."""
+        params = [(uid,) for uid in uids]
+        with self._db_lock:
+            for path in self.generations():
+                conn = sqlite3.connect(path, timeout=5.0)
+                try:
+                    with conn:
+                        conn.executemany("UPDATE inspections SET uploaded = 1 "
+                                         "WHERE uid = ? AND uploaded = 0", params)
+                finally:
+                    conn.close()
+
+    def flush(self):
+        """Blocks until everything queued so far is written."""
+        self._queue.join()
+
+    def close(self, timeout=5.0):
+        self._stop_event.set()
+        self._thread.join(timeout)
@@ -1,14 +1,26 @@
 
 import time
+# start of the cold-start measurement (menu visible = startup.first_frame)
+T_STARTUP = time.perf_counter()
+import os
 import math
 import threading
-import numpy as np
 import cv2
-from picamera2 import Picamera2
-from PIL import Image, ImageDraw, ImageFont
-from luma.core.interface.serial import spi
-from luma.lcd.device import st7789
-import RPi.GPIO as GPIO
+from PIL import Image, ImageDraw
+
+from detection import ClipDetector, CoarseToFineDetector, DetectionParams, draw_detections
+from pipeline import DetectionPipeline, DropOldestQueue, DisplayThread, RateLimiter
+from trigger import GpioOutputs, TriggeredInspector
+from tracker import PartTracker
+from metrics import MetricsRegistry, MetricsExporter
+from display import DisplayBuffer
+from journal import InspectionJournal
+from calibration import HsvCalibrator, load_profile, save_profile
+from production_stats import ProductionStats
+from framering import FrameRing, EvidenceRecorder
+from events import EventDispatcher
+from hardware import Hardware, rpi_gpio, st7789_screen, picamera2_camera
+from assets import ASSET_VERSION, Fonts, LayerBundle, icons
 
 # -------------------------
 # Pin configuration
@@ -23,99 +35,162 @@ PIN_CTRL   = 26  # original control pin (used earlier in your detection)
 PIN_GREEN  = 5   # green LED
 PIN_RED    = 6   # red LED
 
-# TFT pins (for luma SPI)
+# TFT pins (for luma SPI) and panel size
 TFT_DC  = 25
 TFT_RST = 24
+TFT_WIDTH  = 320
+TFT_HEIGHT = 240
 # Interrupt pin
 PIN_INT    = 23  # external interrupt trigger (active high)
+
 # -------------------------
-# GPIO Setup
+# Detection configuration
 # -------------------------
-GPIO.setmode(GPIO.BCM)
-GPIO.setwarnings(False)
-
-# Buttons as inputs with pull-up
-for p in (PIN_BTN_PREV, PIN_BTN_NEXT, PIN_BTN_OK):
-    GPIO.setup(p, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-# Outputs initialised to LOW
-for p in (PIN_CTRL, PIN_GREEN, PIN_RED):
-    GPIO.setup(p, GPIO.OUT)
-    GPIO.output(p, GPIO.LOW)
-# Interrupt pin (default 0V â†’ pulled down)
-GPIO.setup(PIN_INT, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+# Channel order of the camera's 640x480 main stream (XBGR8888 -> R,G,B,X in
+# memory); the 320x240 lores preview stream is converted to plain RGB
+CAMERA_COLOR_ORDER = "RGBX"
+# Clip windows (x, y, w, h) in 640x480 frame coordinates; None = whole frame.
+# Restricting to the fixture's clip positions cuts most of the per-frame work,
+# e.g. [(140, 180, 140, 140), (360, 180, 140, 140)]
+CLIP_WINDOWS = None
+# Detect on a frame downscaled by this factor first and re-check at full
+# resolution only when a blob is close to the decision limits; None = always
+# full resolution (see benchmark.py coarse for speedup / agreement)
+COARSE_SCALE = None
+# Blob search: "contours" (fastest on clean masks) or "components" (one
+# labelling pass, much faster when noise leaves hundreds of blobs)
+DETECTION_ENGINE = "contours"
+# Live view: at most one annotated frame per DISPLAY_INTERVAL seconds goes
+# to the TFT (inspection itself runs on every frame); boxes are always drawn,
+# text labels only with ANNOTATION_LABELS
+DISPLAY_INTERVAL = 1.0 / 15
+ANNOTATE_DETECTIONS = True
+ANNOTATION_LABELS = True
+# "serial":    capture / detect / display in one loop
+# "pipelined": capture, detection and display on separate threads
+# "triggered": detect only a burst of frames after each PIN_INT edge
+# "stations":  this camera plus extra_stations(), one detection process each
+# "tracked":   no PIN_INT; plateaus are tracked in software and inspected
+#              once each, logged with their number and dwell time
+DETECTION_MODE = "pipelined"
+# Triggered mode: frames dropped after the edge (may predate the part),
+# frames voted on, and low-rate preview interval between triggers (s)
+TRIGGER_DISCARD = 1
+TRIGGER_BURST = 3
+TRIGGER_PREVIEW_INTERVAL = 0.5
+# Tracked mode: fixture area watched for plateaus (x, y, w, h; None = whole
+# frame), grey-level change that counts as covered, covered fraction that
+# means a plateau is there, and frames voted on once it has stopped. The
+# fixture must be empty when detection starts (NEXT re-learns it)
+TRACKER_ROI = None
+TRACKER_THRESHOLD = 30
+TRACKER_OCCUPIED = 0.15
+TRACKER_VOTES = 3
+# Further inspection points for the "stations" mode, each with its own
+# camera, clip windows, clip count and outputs (opened when the mode starts).
+# Outputs follow one verdict per part, taken after a rising edge on the
+# station's trigger pin (without one the verdicts are only shown), e.g.
+#   from stations import Station
+#   from camera import CameraManager
+#   return [Station("side", CameraManager(picamera2_camera(1)).start(),
+#                   DetectionParams(roi=[(200, 150, 240, 180)], expected_clips=1, color_order="RGBX"),
+#                   GpioOutputs(hw.gpio, 16, 20, 21), trigger_pin=12)]
+def extra_stations(hw):
+    return []
+# Band and minimum clip area derived on the Calibration screen from
+# known-good parts; detection uses them (as a colour LUT) once saved
+CALIBRATION_PATH = os.path.expanduser("~/inspection/calibration.json")
+CALIBRATION_MIN_SAMPLES = 5
+# Production screen: yield, reject rate and cycle-time percentiles over the
+# last PRODUCTION_WINDOW seconds; throughput decays with PRODUCTION_RATE_TAU.
+# The line shows as idle after PRODUCTION_IDLE seconds without a verdict
+PRODUCTION_WINDOW = 15 * 60
+PRODUCTION_RATE_TAU = 60.0
+PRODUCTION_IDLE = 30.0
+# Reject evidence: the last EVIDENCE_FRAMES inspected frames stay in a
+# preallocated ring; a reject (or OK on the detection screen) has
+# EVIDENCE_PRE frames before and EVIDENCE_POST after it, with their masks,
+# written to EVIDENCE_DIR in the background, oldest deleted past
+# EVIDENCE_MAX_BYTES. 0 frames = off; not available in the stations mode
+EVIDENCE_DIR = os.path.expanduser("~/inspection/evidence")
+EVIDENCE_FRAMES = 16
+EVIDENCE_PRE = 4
+EVIDENCE_POST = 4
+EVIDENCE_MAX_BYTES = 200 * 1024 * 1024
+# Static menu layers (gradient, headers, tiles with their text and icons)
+# rendered once and reloaded on later boots
+ASSET_PATH = os.path.expanduser("~/.cache/inspection/hmi_layers.npz")
+# -------------------------
+# GPIO Setup (run when the GPIO backend is first opened)
+# -------------------------
+def setup_gpio(GPIO):
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setwarnings(False)
+
+    # Buttons as inputs with pull-up
+    for p in (PIN_BTN_PREV, PIN_BTN_NEXT, PIN_BTN_OK):
+        GPIO.setup(p, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+
+    # Outputs initialised to LOW
+    for p in (PIN_CTRL, PIN_GREEN, PIN_RED):
+        GPIO.setup(p, GPIO.OUT)
+        GPIO.output(p, GPIO.LOW)
+    # Interrupt pin (default 0V â†’ pulled down)
+    GPIO.setup(PIN_INT, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+
+# Latency histograms (trigger, capture, detection stages, GPIO write)
+metrics = MetricsRegistry()
+METRICS_PATH = "/tmp/inspection_metrics.prom"
+METRICS_FORMAT = "prometheus"   # or "jsonl"
+METRICS_INTERVAL = 10.0         # seconds between dumps
+
+# Local inspection journal (SQLite, rotated past JOURNAL_MAX_BYTES)
+JOURNAL_PATH = os.path.expanduser("~/inspection/journal.db")
+JOURNAL_MAX_BYTES = 64 * 1024 * 1024
+# Dashboard batch endpoint (Dashbaord/plateau_batch.php); None = keep records local
+UPLOAD_URL = None
+# Network preview of the annotated detection frames (MJPEG at
+# http://<pi>:PREVIEW_PORT/); None = off. Frames are encoded only while
+# someone is watching, at most PREVIEW_FPS per second, once for all viewers
+PREVIEW_PORT = None
+PREVIEW_FPS = 10.0
+PREVIEW_QUALITY = 70
 
 # Global interrupt flag
 interrupt_triggered = threading.Event()
+last_interrupt_time = 0.0
+# Called with the edge timestamp (time.perf_counter) on every interrupt
+trigger_listeners = []
 
 def handle_interrupt(channel):
     """Callback when interrupt pin goes HIGH"""
+    global last_interrupt_time
+    t = time.perf_counter()
+    last_interrupt_time = t
     interrupt_triggered.set()
-# -------------------------
-# Initialize TFT display
-# -------------------------
-serial = spi(port=0, device=0, gpio_DC=TFT_DC, gpio_RST=TFT_RST)
-tft = st7789(serial, width=320, height=240, rotate=0)
-
-# -------------------------
-# Initialize Picamera2 (start in preview mode)
-# -------------------------
-picam2 = Picamera2()
-try:
-    preview_config = picam2.create_preview_configuration(main={"size": (320, 240)})
-    picam2.configure(preview_config)
-    picam2.start()
-except Exception as e:
-    print("Warning: camera preview configuration failed:", e)
+    for listener in list(trigger_listeners):
+        listener(t)
+    metrics.record("interrupt.handler", time.perf_counter() - t)
 
 # -------------------------
-# Simple icon drawing helpers
+# Hardware backends
 # -------------------------
-def create_icon(icon_type, size=24, color=(255,255,255)):
-    img = Image.new("RGBA", (size, size), (0,0,0,0))
-    draw = ImageDraw.Draw(img)
-    if icon_type == "detection":
-        draw.ellipse([(4,4),(size-4,size-4)], outline=color, width=2)
-        draw.ellipse([(8,8),(size-8,size-8)], fill=color)
-    elif icon_type == "calibration":
-        center = size//2
-        r = size//3
-        draw.ellipse([(center-r,center-r),(center+r,center+r)], outline=color, width=2)
-        for i in range(8):
-            a = i*(2*math.pi/8)
-            x1 = center + int(r*math.cos(a))
-            y1 = center + int(r*math.sin(a))
-            x2 = center + int((r+5)*math.cos(a))
-            y2 = center + int((r+5)*math.sin(a))
-            draw.line([(x1,y1),(x2,y2)], fill=color, width=2)
-    elif icon_type == "production":
-        draw.rectangle([(4,4),(size-4,size-4)], outline=color, width=2)
-        for i in range(1,3):
-            y = 4 + i * ((size-8)//3)
-            draw.line([(4,y),(size-4,y)], fill=color, width=1)
-        for i in range(1,3):
-            x = 4 + i * ((size-8)//3)
-            draw.line([(x,4),(x,size-4)], fill=color, width=1)
-    elif icon_type == "back":
-        draw.polygon([(4,size//2),(size-4,4),(size-4,size-4)], fill=color)
-    elif icon_type == "home":
-        draw.polygon([(size//2,4),(4,size//2),(size-4,size//2)], fill=color)
-        draw.rectangle([(size//4,size//2),(3*size//4,size-4)], fill=color)
-    return img
-
-ICONS = {
-    "detection": create_icon("detection"),
-    "calibration": create_icon("calibration"),
-    "production": create_icon("production"),
-    "back": create_icon("back"),
-    "home": create_icon("home"),
-}
+def default_hardware():
+    """The Pi's GPIO, ST7789 and camera; nothing is opened until first used."""
+    return Hardware(gpio=rpi_gpio,
+                    screen=lambda: st7789_screen(TFT_DC, TFT_RST, TFT_WIDTH, TFT_HEIGHT),
+                    camera=picamera2_camera, setup_gpio=setup_gpio,
+                    # one session: 640x480 main + 320x240 lores
+                    camera_options={"main_size": (640, 480), "lores_size": (TFT_WIDTH, TFT_HEIGHT)},
+                    metrics=metrics)
 
 # -------------------------
 # ModernMenu class
 # -------------------------
 class ModernMenu:
-    def __init__(self):
+    def __init__(self, hw):
+        # GPIO / screen / camera handles, opened on first use
+        self.hw = hw
         self.options = [
             {"name":"Detection","icon":"detection"},
             {"name":"Calibration","icon":"calibration"},
@@ -126,35 +201,70 @@ class ModernMenu:
         self.current_screen = "menu"
         self.animation_offset = 0.0
 
-        # Button event driven variable (set by GPIO callbacks)
-        self.lock = threading.Lock()
-        self.button_event = None     # 'prev', 'next', 'ok' or None
-
-        # Debounce protection for poll-based fallback
-        self.last_button_check = time.time()
-        self.button_debounce_time = 0.2
-
-        # Fonts
-        try:
-            self.title_font = ImageFont.truetype("DejaVuSans-Bold.ttf", 20)
-            self.option_font = ImageFont.truetype("DejaVuSans.ttf", 16)
-            self.small_font = ImageFont.truetype("DejaVuSans.ttf", 12)
-        except Exception:
-            self.title_font = ImageFont.load_default()
-            self.option_font = ImageFont.load_default()
-            self.small_font = ImageFont.load_default()
+        # Button edges, the part trigger and screen timers all arrive here;
+        # the menu blocks on it instead of polling (pins are watched by main())
+        self.events = EventDispatcher()
+        self.events.on("trigger", self._on_trigger)
+
+        # Fonts, loaded the first time something is drawn with them
+        self.fonts = Fonts()
+
+        # Pre-rendered static layers (gradient, headers, footer, option tiles),
+        # reloaded from the asset bundle when it matches this menu
+        self._bundle = LayerBundle(ASSET_PATH, {
+            "version": ASSET_VERSION, "size": [TFT_WIDTH, TFT_HEIGHT],
+            "options": [o["name"] for o in self.options]})
+        self._layers = self._bundle.load()
+        self.layers_cached = bool(self._layers)
+        # Reused camera-frame -> RGB565 buffer for the live screens
+        self.display_buffer = DisplayBuffer(TFT_WIDTH, TFT_HEIGHT, invert=True)
+
+        # Reject gate + LEDs
+        self.outputs = GpioOutputs(hw.gpio, PIN_CTRL, PIN_GREEN, PIN_RED)
+
+        # Local per-part result journal (opened by main())
+        self.journal = None
+        # Rolling line statistics, fed with every applied verdict
+        self.production = ProductionStats(PRODUCTION_WINDOW, tau=PRODUCTION_RATE_TAU,
+                                          idle_after=PRODUCTION_IDLE)
+        self._production_text = (0.0, "")   # (time, line) of the detection-screen summary
+        # Recent frames + background evidence writer (per detection session)
+        self.frame_ring = None
+        self.evidence = None
+        # Network preview (started by main() when PREVIEW_PORT is set)
+        self.preview = None
+        # Plateau numbers keep counting across detection sessions (tracked mode)
+        self.next_plateau = 1
+
+        # Calibrated HSV band / min clip area (None = built-in defaults)
+        self.calibration = load_profile(CALIBRATION_PATH)
 
     # callback entrance for GPIO events
     def handle_button_press(self, btn_name):
-        with self.lock:
-            # store the last event; main loop will process it
-            self.button_event = btn_name
+        # queued, so quick successive presses are all handled in order
+        self.events.post("button", btn_name)
+
+    def _pop_button_event(self, timeout=0):
+        # next queued press ('prev', 'next', 'ok'), waiting up to timeout
+        # seconds (None = until one arrives); other events are dispatched
+        ev = self.events.next_event(("button",), timeout)
+        return ev.payload if ev is not None else None
 
-    def _pop_button_event(self):
-        with self.lock:
-            ev = self.button_event
-            self.button_event = None
-            return ev
+    def _on_trigger(self, event):
+        # how long a PIN_INT edge waited for the HMI thread
+        metrics.record("interrupt.dispatch", time.perf_counter() - event.t)
+
+    @property
+    def title_font(self):
+        return self.fonts.get("title")
+
+    @property
+    def option_font(self):
+        return self.fonts.get("option")
+
+    @property
+    def small_font(self):
+        return self.fonts.get("small")
 
     def draw_background(self, draw, width, height):
         # simple vertical gradient
@@ -164,63 +274,109 @@ class ModernMenu:
             b = int(40 + (y / height) * 30)
             draw.line([(0,y),(width,y)], fill=(r,g,b))
 
-    def draw_menu(self):
-        image = Image.new("RGB", (tft.width, tft.height), "black")
-        draw = ImageDraw.Draw(image)
-        self.draw_background(draw, tft.width, tft.height)
+    # -------------------------
+    # Cached static layers
+    # -------------------------
+    def _layer(self, key, builder):
+        # static screen parts are drawn once and reused for every redraw
+        img = self._layers.get(key)
+        if img is None:
+            img = builder()
+            self._layers[key] = img
+        return img
+
+    def _background_layer(self):
+        def build():
+            image = Image.new("RGB", (TFT_WIDTH, TFT_HEIGHT), "black")
+            self.draw_background(ImageDraw.Draw(image), TFT_WIDTH, TFT_HEIGHT)
+            return image
+        return self._layer("background", build)
+
+    def _header_layer(self, title, show_back=True):
+        def build():
+            image = self._background_layer().copy()
+            self.show_header(ImageDraw.Draw(image), title, show_back)
+            return image
+        return self._layer(("header", title, show_back), build)
+
+    def _menu_layer(self):
+        def build():
+            image = self._header_layer("VISION SYSTEM", show_back=False).copy()
+            draw = ImageDraw.Draw(image)
+            footer_h = 30
+            draw.rectangle((0,TFT_HEIGHT-footer_h,TFT_WIDTH,TFT_HEIGHT), fill=(30,35,45))
+            instr = "UP/DOWN: Navigate    CENTER: Select"
+            try:
+                iw = draw.textlength(instr, font=self.small_font)
+                draw.text(((TFT_WIDTH-iw)//2, TFT_HEIGHT-20), instr, font=self.small_font, fill=(180,180,180))
+            except:
+                draw.text((20, TFT_HEIGHT-20), instr, fill=(180,180,180))
+            return image
+        return self._layer("menu", build)
 
+    def _option_y(self, i):
         header_h = 40
-        draw.rectangle((0,0,tft.width,header_h), fill=(30,35,45))
-        title = "VISION SYSTEM"
-        try:
-            tw = draw.textlength(title, font=self.title_font)
-            draw.text(((tft.width-tw)//2,10), title, font=self.title_font, fill=(220,220,220))
-        except:
-            draw.text(((tft.width-100)//2,10), title, fill=(220,220,220))
-
         option_h = 45
         spacing = 10
         total_h = len(self.options)*option_h + (len(self.options)-1)*spacing
-        start_y = (tft.height - header_h - 30 - total_h)//2 + header_h
-
-        for i,opt in enumerate(self.options):
-            y = start_y + i*(option_h + spacing)
-            icon = ICONS[opt["icon"]]
-            if i == self.selected_index:
-                draw.rounded_rectangle((20,y,tft.width-20,y+option_h), radius=12, fill=(65,105,225),
+        start_y = (TFT_HEIGHT - header_h - 30 - total_h)//2 + header_h
+        return start_y + i*(option_h + spacing)
+
+    def _option_tile(self, i, selected):
+        # tile = menu background under the option box + the box itself, so it
+        # can be pasted without re-blending the rounded corners
+        def build():
+            option_h = 45
+            y = self._option_y(i)
+            tile = self._menu_layer().crop((0, y, TFT_WIDTH, y+option_h+1))
+            draw = ImageDraw.Draw(tile)
+            opt = self.options[i]
+            icon = icons()[opt["icon"]]
+            if selected:
+                draw.rounded_rectangle((20,0,TFT_WIDTH-20,option_h), radius=12, fill=(65,105,225),
                                        outline=(100,150,255), width=2)
-                image.paste(icon, (40, y+10), icon)
+                tile.paste(icon, (40, 10), icon)
                 try:
-                    draw.text((80,y+15), opt["name"], font=self.option_font, fill=(255,255,255))
+                    draw.text((80,15), opt["name"], font=self.option_font, fill=(255,255,255))
                 except:
-                    draw.text((80,y+15), opt["name"], fill=(255,255,255))
-                draw.polygon([(25,y+20),(35,y+10),(35,y+30)], fill=(255,255,255))
+                    draw.text((80,15), opt["name"], fill=(255,255,255))
+                draw.polygon([(25,20),(35,10),(35,30)], fill=(255,255,255))
             else:
-                draw.rounded_rectangle((20,y,tft.width-20,y+option_h), radius=12, fill=(50,55,65),
+                draw.rounded_rectangle((20,0,TFT_WIDTH-20,option_h), radius=12, fill=(50,55,65),
                                        outline=(80,85,95), width=1)
-                image.paste(icon, (40, y+10), icon)
+                tile.paste(icon, (40, 10), icon)
                 try:
-                    draw.text((80,y+15), opt["name"], font=self.option_font, fill=(200,200,200))
+                    draw.text((80,15), opt["name"], font=self.option_font, fill=(200,200,200))
                 except:
-                    draw.text((80,y+15), opt["name"], fill=(200,200,200))
-
-        footer_h = 30
-        draw.rectangle((0,tft.height-footer_h,tft.width,tft.height), fill=(30,35,45))
-        instr = "UP/DOWN: Navigate    CENTER: Select"
+                    draw.text((80,15), opt["name"], fill=(200,200,200))
+            return tile
+        return self._layer(("option", i, selected), build)
+
+    def cache_layers(self):
+        # renders every static layer once and stores them for the next boot
+        for i in range(len(self.options)):
+            self._option_tile(i, False)
+            self._option_tile(i, True)
+        for title in ("PRODUCTION", "STATIONS"):
+            self._header_layer(title)
         try:
-            iw = draw.textlength(instr, font=self.small_font)
-            draw.text(((tft.width-iw)//2, tft.height-20), instr, font=self.small_font, fill=(180,180,180))
-        except:
-            draw.text((20, tft.height-20), instr, fill=(180,180,180))
+            self._bundle.save(self._layers)
+            self.layers_cached = True
+        except OSError as e:
+            print("Could not cache menu layers:", e)
 
-        tft.display(image)
+    def draw_menu(self):
+        image = self._menu_layer().copy()
+        for i in range(len(self.options)):
+            image.paste(self._option_tile(i, i == self.selected_index), (0, self._option_y(i)))
+        # only the two tiles whose highlight changed are sent over SPI
+        self.hw.screen.show(image)
         self.animation_offset += 0.1
 
     def show_loading_screen(self, title):
-        image = Image.new("RGB", (tft.width, tft.height), "black")
+        image = self._background_layer().copy()
         draw = ImageDraw.Draw(image)
-        self.draw_background(draw, tft.width, tft.height)
-        cx, cy = tft.width//2, tft.height//2
+        cx, cy = TFT_WIDTH//2, TFT_HEIGHT//2
         r = 30
         for i in range(8):
             a = self.animation_offset + (i*(2*math.pi/8))
@@ -229,30 +385,28 @@ class ModernMenu:
             draw.ellipse((x-5,y-5,x+5,y+5), fill=(65,105,225))
         try:
             tw = draw.textlength(title, font=self.title_font)
-            draw.text(((tft.width-tw)//2, cy+50), title, font=self.title_font, fill=(220,220,220))
+            draw.text(((TFT_WIDTH-tw)//2, cy+50), title, font=self.title_font, fill=(220,220,220))
         except:
-            draw.text(((tft.width-100)//2, cy+50), title, fill=(220,220,220))
-        tft.display(image)
+            draw.text(((TFT_WIDTH-100)//2, cy+50), title, fill=(220,220,220))
+        self.hw.screen.show(image)
         self.animation_offset += 0.2
 
     def show_header(self, draw, title, show_back=True):
         header_h = 40
-        draw.rectangle((0,0,tft.width,header_h), fill=(30,35,45))
+        draw.rectangle((0,0,TFT_WIDTH,header_h), fill=(30,35,45))
         if show_back:
-            back_icon = ICONS["back"]
-            # draw.bitmap not always available; paste with alpha
-            image = draw.im  # internal PIL ImageDraw accesses .im
+            back_icon = icons()["back"]
             try:
-                # small hack: paste icon on underlying image object
+                # paste icon with alpha on the image behind the ImageDraw
                 draw._image.paste(back_icon, (10,10), back_icon)
             except Exception:
                 # fallback to draw a simple triangle for back
                 draw.polygon([(10, header_h//2),(20,10),(20,header_h-10)], fill=(200,200,200))
         try:
             tw = draw.textlength(title, font=self.title_font)
-            draw.text(((tft.width-tw)//2,10), title, font=self.title_font, fill=(220,220,220))
+            draw.text(((TFT_WIDTH-tw)//2,10), title, font=self.title_font, fill=(220,220,220))
         except:
-            draw.text(((tft.width-100)//2,10), title, fill=(220,220,220))
+            draw.text(((TFT_WIDTH-100)//2,10), title, fill=(220,220,220))
         return header_h
 
     # Navigation helpers
@@ -281,312 +435,624 @@ class ModernMenu:
 
     def run_calibration(self):
         self.current_screen="calibration"
-        try:
-           picam2.stop()
-        except:
-              pass
-        try:
-            calib_cfg = picam2.create_video_configuration(main={"size":(320,240)})
-            picam2.configure(calib_cfg)
-            picam2.start()
-        except Exception as e :
-            print("faild to configure camera for calibration")
+        camera = self.hw.camera
+        screen = self.hw.screen
+        # main stream, same as detection, so the sampled clip areas carry over
+        camera.use("inspect")
+        calibrator = HsvCalibrator(DetectionParams(roi=CLIP_WINDOWS, color_order=CAMERA_COLOR_ORDER,
+                                                   engine=DETECTION_ENGINE))
+        status = "Place a good part, OK = add"
+        last = None
         try:
             while self.current_screen =="calibration":
-                frame =picam2.capture_array()
-                if frame.ndim == 3 and frame.shape[2] == 3:
-                    frame = frame[:, :, ::-1]  # BGR -> RGB
-
-					
-                frame_resized =cv2.resize(frame,(320,240))
-                tft_image =Image.fromarray(frame_resized)
-                image = Image.eval(tft_image, lambda x: 255 - x)
-
-                tft.display(image)
+                frame =camera.capture_array()
                 ev =self._pop_button_event()
                 if ev=='prev':
                     self.current_screen ="menu"
                     break
                 elif ev=='ok':
-                     pass
+                    # sample the part currently under the camera
+                    last = calibrator.add_sample(frame)
+                    status = (f"Added ({calibrator.accepted} good parts)" if last.ok
+                              else f"Rejected: {last.valid_contours} clips found")
+                elif ev=='next':
+                    if calibrator.accepted < CALIBRATION_MIN_SAMPLES:
+                        status = f"Need {CALIBRATION_MIN_SAMPLES - calibrator.accepted} more good parts"
+                    else:
+                        profile = calibrator.compute()
+                        try:
+                            save_profile(profile, CALIBRATION_PATH)
+                            self.calibration = profile
+                            status = f"Saved: H {profile.yellow_lower[0]}-{profile.yellow_upper[0]} " \
+                                     f"min area {profile.min_area:.0f}"
+                        except OSError as e:
+                            status = "Save failed"
+                            print("Could not save calibration:", e)
+                if last is not None:
+                    draw_detections(frame, last, CAMERA_COLOR_ORDER, CLIP_WINDOWS)
+                white = (255,255,255,255)[:frame.shape[2]]
+                cv2.putText(frame, status, (10,30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, white, 2)
+                cv2.putText(frame, f"Samples: {calibrator.accepted}  OK=add  NEXT=save", (10,60),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, white, 2)
+                screen.show_rgb565(self._frame_to_tft(frame))
         except Exception as e:
              print(e)
         finally:
-            try:
-                picam2.stop()
-            except:
-                pass
-            try:
-                preview_cfg = picam2.create_video_configuration(main={"size":(320,240)})
-                picam2.configuure(preview_cfg)
-                picam2.start()
-            except Exception as e:
-                print("Faild to return to preview after calibration",e)
+            camera.use("preview")
             print("Exiting calibration,returning to menu")
-				
-				
-			
-        
+
+    def _production_lines(self):
+        # the screen's text and bars; redrawn only when any of it changes
+        st = self.production.snapshot()
+        pct = lambda v: "--" if v is None else f"{v:.1f}%"
+        sec = lambda v: "--" if v is None else f"{v:.1f}s"
+        lines = (
+            f"Parts: {st['total']}   OK {st['ok']}   NOK {st['rejected']}",
+            f"Throughput: {st['parts_per_min']:.1f} parts/min",
+            f"Yield: {pct(st['yield'])}   Reject: {pct(st['reject_rate'])}",
+            f"Cycle p50 {sec(st['cycle_p50'])}   p95 {sec(st['cycle_p95'])}",
+        )
+        status = "Running" if st["running"] else "Idle" if st["inspecting"] else "Stopped (detection off)"
+        return lines, status, tuple(self.production.per_minute(10))
+
+    def _production_summary(self):
+        # one line of live figures for the detection screens, rebuilt once a second
+        t, text = self._production_text
+        now = time.perf_counter()
+        if now - t >= 1.0:
+            st = self.production.snapshot(now)
+            yld = "--" if st["yield"] is None else f"{st['yield']:.0f}%"
+            text = f"{st['parts_per_min']:.1f}/min  yield {yld}  NOK {st['rejected']}/{st['total']}"
+            self._production_text = (now, text)
+        return text
+
+    def _draw_production(self, base, lines, status, bars):
+        image = base.copy()
+        draw = ImageDraw.Draw(image)
+        y = 52
+        for line in lines:
+            draw.text((20, y), line, font=self.small_font, fill=(220,220,220))
+            y += 22
+        draw.text((20, y), f"Status: {status}",
+                  font=self.small_font, fill=(0,200,0) if status == "Running" else (180,180,180))
+        # parts per minute, last 10 minutes (newest on the right)
+        top, bottom = y + 24, TFT_HEIGHT - 12
+        peak = max(max(bars), 1)
+        for i, count in enumerate(bars):
+            x = 20 + i * 28
+            h = int((bottom - top) * count / peak)
+            draw.rectangle([x, bottom - h, x + 20, bottom], fill=(65,105,225))
+        self.hw.screen.show(image)
 
     def run_production(self):
         self.current_screen = "production"
-        image = Image.new("RGB",(tft.width,tft.height),"black")
-        draw = ImageDraw.Draw(image)
-        self.draw_background(draw, tft.width, tft.height)
-        header_h = self.show_header(draw, "PRODUCTION")
-        metrics_y = header_h + 20
-        for count in range(1,11):
-            if self.current_screen != "production":
+        base = self._header_layer("PRODUCTION")
+        # rates decay and windows slide even without new parts, so re-check
+        # every second; only a changed value triggers a redraw
+        refresh = self.events.call_every(1.0, "refresh", first=0)
+        shown = None
+        try:
+            while self.current_screen == "production":
+                ev = self.events.next_event(("button", "refresh"))
+                if ev is None:
+                    break
+                if ev.kind == "button":
+                    if ev.payload == 'prev':
+                        self.current_screen = "menu"
+                    continue
+                view = self._production_lines()
+                if view != shown:
+                    self._draw_production(base, *view)
+                    shown = view
+        finally:
+            refresh.cancel()
+
+    # menu navigation; every screen reads its own buttons from the same queue
+    def on_button(self, btn):
+        if btn == 'prev':
+            self.navigate_up()
+        elif btn == 'next':
+            self.navigate_down()
+        elif btn == 'ok':
+            self.select_option()
+
+    def run(self):
+        # sleeps until a button is pressed (timers and triggers are dispatched meanwhile)
+        while self.is_running:
+            btn = self._pop_button_event(timeout=None)
+            if btn is None:
                 break
-            # redraw background and header
-            draw.rectangle([0, header_h+1, tft.width, tft.height], fill="black")
-            self.draw_background(draw, tft.width, tft.height)
-            self.show_header(draw, "PRODUCTION")
-            draw.text((30, metrics_y), f"Units Produced: {count}", fill=(220,220,220))
-            draw.text((30, metrics_y+30), f"Quality: {95 - (count % 5)}%", fill=(220,220,220))
-            draw.text((30, metrics_y+60), "Status: Running", fill="green")
-            for i in range(3):
-                y_pos = metrics_y + 100 + i*20
-                width = 80 + int(40 * math.sin(time.time() * 2 + i))
-                draw.rectangle([40, y_pos, 40+width, y_pos+12], fill=(65,105,225))
-            tft.display(image)
-            time.sleep(0.5)
-            # check button events
+            self.on_button(btn)
+
+    def detection_params(self):
+        # calibrated band (as a colour LUT) and min clip area once calibrated
+        if self.calibration is not None:
+            return self.calibration.params(roi=CLIP_WINDOWS, color_order=CAMERA_COLOR_ORDER,
+                                           engine=DETECTION_ENGINE)
+        return DetectionParams(roi=CLIP_WINDOWS, color_order=CAMERA_COLOR_ORDER, engine=DETECTION_ENGINE)
+
+    # -------------------------
+    # Detection helpers (shared by serial and pipelined modes)
+    # -------------------------
+    def _apply_verdict(self, result):
+        # --- Control GPIOs only if interrupt triggered ---
+        # (returns True when this result decided the part)
+        if not interrupt_triggered.is_set():
+            return False
+        t_gpio = time.perf_counter()
+        self.outputs.apply(result.ok)
+        t_done = time.perf_counter()
+        metrics.record("gpio.write", t_done - t_gpio)
+        metrics.record("trigger.verdict", t_done - last_interrupt_time)
+        self.production.record(result.ok, last_interrupt_time)
+        if self.journal is not None:
+            self.journal.append_result(result, latency_ms=(t_done - last_interrupt_time) * 1000.0)
+
+        # reset flag so outputs only update once per interrupt
+        interrupt_triggered.clear()
+        return True
+
+    # -------------------------
+    # Reject evidence
+    # -------------------------
+    def _start_evidence(self):
+        if not EVIDENCE_FRAMES or DETECTION_MODE == "stations":
+            return
+        try:
+            self.frame_ring = FrameRing(EVIDENCE_FRAMES)
+            self.evidence = EvidenceRecorder(self.frame_ring, EVIDENCE_DIR, EVIDENCE_PRE, EVIDENCE_POST,
+                                             CAMERA_COLOR_ORDER, EVIDENCE_MAX_BYTES, metrics=metrics)
+            self.evidence.start()
+        except OSError as e:
+            print("Warning: reject evidence disabled:", e)
+            self.frame_ring = self.evidence = None
+
+    def _stop_evidence(self):
+        if self.evidence is not None:
+            # requests still queued are written before the thread exits
+            self.evidence.stop()
+            print(f"Evidence: {self.evidence.written} written, {self.evidence.dropped} dropped, "
+                  f"{self.evidence.disk_bytes / 1e6:.1f} MB on disk")
+        self.frame_ring = self.evidence = None
+
+    def _evidence_info(self, result):
+        return {"verdict": result.verdict, "clips": result.valid_contours,
+                "areas": [round(float(a), 1) for a in result.areas],
+                "boxes": [[int(v) for v in b] for b in result.boxes]}
+
+    def _on_detection(self, frame, result):
+        # the unannotated frame and its mask go into the ring (two copies, no
+        # allocation); a rejected part is handed to the evidence writer
+        if self.frame_ring is None:
+            self._apply_verdict(result)
+            return
+        seq = self.frame_ring.push(frame, result.mask)
+        if self._apply_verdict(result) and not result.ok:
+            self.evidence.request(seq, "reject", self._evidence_info(result))
+
+    def _save_evidence(self):
+        # OK on the detection screen: keep what was just inspected
+        if self.evidence is not None and self.frame_ring.latest >= 0:
+            self.evidence.request(self.frame_ring.latest, "manual", post=0)
+
+    def _annotate_frame(self, frame, result):
+        # annotate directly in the camera's channel order
+        if ANNOTATE_DETECTIONS:
+            draw_detections(frame, result, CAMERA_COLOR_ORDER, CLIP_WINDOWS, ANNOTATION_LABELS)
+        white = (255,255,255,255)[:frame.shape[2]]
+        # Put some status text on frame
+        cv2.putText(frame, f"Contours: {result.valid_contours}", (10,30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, white, 2)
+        cv2.putText(frame, "Press Prev to return", (10,60),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, white, 2)
+        cv2.putText(frame, self._production_summary(), (10, frame.shape[0]-45),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, white, 2)
+        lat = metrics.summary("trigger.verdict")
+        if lat:
+            cv2.putText(frame, f"trig->rej ms p50 {lat['p50']:.0f} p95 {lat['p95']:.0f} "
+                               f"p99 {lat['p99']:.0f} max {lat['max']:.0f}",
+                        (10, frame.shape[0]-15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, white, 2)
+
+    def _frame_to_tft(self, frame):
+        # the annotated frame also feeds the network preview (a no-op
+        # while nobody is watching)
+        if self.preview is not None:
+            self.preview.offer(frame)
+        # resize + invert + RGB565 pack into the reused display buffer
+        return self.display_buffer.convert(frame)
+
+    def _run_detection_serial(self, detector):
+        camera = self.hw.camera
+        screen = self.hw.screen
+        display_limiter = RateLimiter(DISPLAY_INTERVAL)
+        while self.current_screen == "detection":
+            # capture frame (Picamera2 returns RGB, converted once inside the detector)
+            t0 = time.perf_counter()
+            frame = camera.capture_array()
+            metrics.record("capture", time.perf_counter() - t0)
+            result = detector.detect(frame)
+            metrics.record_timings("detect", result.timings)
+            self._on_detection(frame, result)
+            if display_limiter.ready():
+                self._annotate_frame(frame, result)
+                screen.show_rgb565(self._frame_to_tft(frame))
+
+            # process any queued button event (capture paces this loop)
             ev = self._pop_button_event()
             if ev == 'prev':
+                # user asked to return to menu
                 self.current_screen = "menu"
                 break
-        if self.current_screen == "production":
-            draw.rectangle([0, header_h+1, tft.width, tft.height], fill="black")
-            self.draw_background(draw, tft.width, tft.height)
-            self.show_header(draw, "PRODUCTION")
-            draw.text((40,120), "Production Cycle Complete!", fill="green")
-            draw.text((60,150), "10 units produced", fill="white")
-            tft.display(image)
-            time.sleep(2)
-
-    # central button check (polling fallback + processes events set by interrupts)
-    def check_buttons(self):
-        # Prioritize event-driven button
-        ev = self._pop_button_event()
-        if ev:
-            # handle event
-            if ev == 'prev':
-                if self.current_screen == "menu":
-                    self.navigate_up()
-                else:
-                    # in submenu back to menu
-                    self.current_screen = "menu"
-                    self.draw_menu()
-                return True
             elif ev == 'next':
-                if self.current_screen == "menu":
-                    self.navigate_down()
-                return True
+                # optionally use next for other function
+                pass
             elif ev == 'ok':
-                if self.current_screen == "menu":
-                    self.select_option()
-                return True
-
-        # Polling fallback (in case event detect missed)
-        now = time.time()
-        if now - self.last_button_check < self.button_debounce_time:
-            return False
-        self.last_button_check = now
-
-        # check physical pins (active low)
-        if GPIO.input(PIN_BTN_PREV) == 0:
-            if self.current_screen == "menu":
-                self.navigate_up()
-            else:
-                self.current_screen = "menu"
-                self.draw_menu()
-            return True
-        if GPIO.input(PIN_BTN_NEXT) == 0:
-            if self.current_screen == "menu":
-                self.navigate_down()
-            return True
-        if GPIO.input(PIN_BTN_OK) == 0:
-            if self.current_screen == "menu":
-                self.select_option()
-            return True
-        return False
-
-    # -------------------------
-    # Detection routine (fully integrated)
-    # -------------------------
-    def run_detection(self):
-        print("Entering detection")
-        self.current_screen = "detection"
-
-        # Reconfigure camera to video size (stop/start required)
+                # keep the frames just inspected as evidence
+                self._save_evidence()
+
+    def _run_detection_pipelined(self, detector):
+        # capture, detection and the SPI push each run on their own thread, so
+        # a slow display never holds back inspection
+        pipeline = DetectionPipeline(
+            self.hw.camera, detector, display=self.hw.screen,
+            render=lambda packet: self._frame_to_tft(packet.frame),
+            on_result=lambda packet: self._on_detection(packet.frame, packet.result),
+            annotate=lambda packet: self._annotate_frame(packet.frame, packet.result),
+            metrics=metrics, display_interval=DISPLAY_INTERVAL,
+        ).start()
         try:
-            picam2.stop()
-        except Exception:
-            pass
+            while self.current_screen == "detection" and pipeline.is_alive():
+                # blocks until a press; the timeout only re-checks the threads
+                ev = self._pop_button_event(timeout=0.5)
+                if ev == 'prev':
+                    self.current_screen = "menu"
+                    break
+                elif ev == 'ok':
+                    self._save_evidence()
+        finally:
+            pipeline.stop()
+            print("Pipeline stats:", pipeline.stats())
+
+    def _run_detection_triggered(self, detector):
+        # detection runs only on the frames grabbed right after a PIN_INT edge;
+        # between parts the screen gets a low-rate preview
+        stop_event = threading.Event()
+        display_queue = DropOldestQueue(1)
+        display = DisplayThread(self.hw.screen, display_queue, stop_event,
+                                lambda packet: self._frame_to_tft(packet.frame))
+
+        def show(packet, status=None):
+            self._annotate_frame(packet.frame, packet.result)
+            if status:
+                cv2.putText(packet.frame, status, (10,90), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                            (255,255,255,255)[:packet.frame.shape[2]], 2)
+            display_queue.put(packet)
+
+        def on_inspection(inspection):
+            print(f"Part {inspection.seq}: {inspection.verdict} "
+                  f"({inspection.latency*1000:.1f} ms trigger->verdict)")
+            self.production.record(inspection.ok, inspection.t_trigger)
+            if self.journal is not None:
+                last = inspection.results[-1]
+                self.journal.append(inspection.ok, last.valid_contours, last.areas, last.centroids,
+                                    latency_ms=inspection.latency * 1000.0)
+            if self.frame_ring is not None:
+                # the burst goes into the ring before the last frame is annotated
+                seq = -1
+                for packet in inspection.packets:
+                    seq = self.frame_ring.push(packet.frame, packet.result.mask)
+                if not inspection.ok:
+                    info = dict(self._evidence_info(inspection.results[-1]), verdict=inspection.verdict)
+                    self.evidence.request(seq, "reject", info, pre=len(inspection.packets) - 1, post=0)
+            show(inspection.packets[-1], f"{inspection.verdict}  {inspection.latency*1000:.0f} ms")
+
+        inspector = TriggeredInspector(self.hw.camera, detector, self.outputs,
+                                       burst=TRIGGER_BURST, discard=TRIGGER_DISCARD,
+                                       preview_interval=TRIGGER_PREVIEW_INTERVAL,
+                                       on_preview=show, on_inspection=on_inspection,
+                                       metrics=metrics)
+        trigger_listeners.append(inspector.trigger)
+        interrupt_triggered.clear()
+        display.start()
+        inspector.start()
         try:
-            video_cfg = picam2.create_video_configuration(main={"size": (640,480)})
-            picam2.configure(video_cfg)
-            picam2.start()
-        except Exception as e:
-            print("Failed to configure camera for video:", e)
-
-        # Detection parameters
-        yellow_lower = np.array([20, 100, 100], np.uint8)
-        yellow_upper = np.array([30, 255, 255], np.uint8)
-        kernel = np.ones((5,5), np.uint8)
-
+            while self.current_screen == "detection" and inspector.is_alive():
+                ev = self._pop_button_event(timeout=0.5)
+                if ev == 'prev':
+                    self.current_screen = "menu"
+                    break
+                elif ev == 'ok':
+                    self._save_evidence()
+        finally:
+            trigger_listeners.remove(inspector.trigger)
+            inspector.stop()
+            stop_event.set()
+            display_queue.close()
+            display.join(2.0)
+            print("Trigger->verdict latency (ms):", inspector.latency_summary())
+
+    def _decide_part(self, part, seq, departed=False):
+        # one verdict per plateau: drive the outputs once (held until the next
+        # plateau arrives), keep evidence of a reject
+        t_gpio = time.perf_counter()
+        self.outputs.apply(part.ok)
+        t_done = time.perf_counter()
+        metrics.record("gpio.write", t_done - t_gpio)
+        if not departed:
+            metrics.record("track.verdict", t_done - part.t_arrive)
+            print(f"Plateau {part.id}: {part.verdict} ({part.latency*1000:.0f} ms arrival->verdict)")
+        else:
+            # decided as it left: the time is its dwell, not a verdict latency
+            metrics.record("track.departed", t_done - part.t_arrive)
+            seen = ("never inspected" if part.missed
+                    else f"{len(part.results)} of {TRACKER_VOTES} votes")
+            print(f"Plateau {part.id}: {part.verdict} as it left after {part.dwell*1000:.0f} ms ({seen})")
+        if not part.ok and seq is not None and part.results:
+            info = dict(self._evidence_info(part.results[-1]), verdict=part.verdict, plateau=part.id)
+            self.evidence.request(seq, "reject", info, pre=len(part.results) - 1, post=0)
+
+    def _finish_part(self, part, seq=None):
+        # logged when the plateau leaves, so its dwell time is known
+        if part.t_verdict is not None and part.t_verdict == part.t_depart:
+            # it left before its vote was complete and is decided only now
+            self._decide_part(part, seq, departed=True)
+        self.production.record(part.ok, part.t_arrive, cycle_time=part.cycle_time)
+        if self.journal is not None:
+            last = part.results[-1] if part.results else None
+            self.journal.append(part.ok, last.valid_contours if last else 0,
+                                last.areas if last else (), last.centroids if last else (),
+                                plateau_number=part.id, duration_seconds=part.dwell,
+                                latency_ms=part.latency * 1000.0)
+
+    def _run_detection_tracked(self, detector):
+        # the tracker's frame-differencing gate runs on every frame; the
+        # detector only on the few frames of each settled plateau
+        camera = self.hw.camera
+        screen = self.hw.screen
+        tracker = PartTracker(TRACKER_ROI, threshold=TRACKER_THRESHOLD, occupied_fraction=TRACKER_OCCUPIED,
+                              votes=TRACKER_VOTES, first_id=self.next_plateau)
+        display_limiter = RateLimiter(DISPLAY_INTERVAL)
+        seq = None      # ring slot of the last detected frame (only the current plateau is detected)
+        arrived = None  # plateau the outputs were last released for
         try:
             while self.current_screen == "detection":
-                # capture frame (Picamera2 returns RGB)
-                frame = picam2.capture_array()
-
-                # Convert RGB -> BGR for OpenCV operations
-                frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-
-                # Convert to HSV and create mask
-                hsv = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2HSV)
-                mask = cv2.inRange(hsv, yellow_lower, yellow_upper)
-                mask = cv2.dilate(mask, kernel, iterations=1)
-                mask = cv2.erode(mask, kernel, iterations=1)
-
-                # find contours
-                contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-                valid_contours = 0
-                for cnt in contours:
-                    area = cv2.contourArea(cnt)
-                    if area > 50:
-                        valid_contours += 1
-                        x,y,w,h = cv2.boundingRect(cnt)
-                        cv2.rectangle(frame_bgr, (x,y), (x+w, y+h), (0,255,255), 2)
-                        cv2.putText(frame_bgr, f"Yellow ({int(area)})", (x, y-10),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,255,255), 2)
-                        cx = x + w//2
-                        cy = y + h//2
-                        cv2.circle(frame_bgr, (cx,cy), 5, (0,0,255), -1)
-                        cv2.putText(frame_bgr, f"({cx},{cy})", (cx+8, cy), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,255), 1)
-
-                # --- Control GPIOs only if interrupt triggered ---
-                if interrupt_triggered.is_set():
-                    if valid_contours == 2:
-                        # ok
-                        GPIO.output(PIN_CTRL, GPIO.LOW)
-                        GPIO.output(PIN_GREEN, GPIO.HIGH)
-                        GPIO.output(PIN_RED, GPIO.LOW)
-                    else:
-                        # not ok
-                        GPIO.output(PIN_CTRL, GPIO.HIGH)
-                        GPIO.output(PIN_GREEN, GPIO.LOW)
-                        GPIO.output(PIN_RED, GPIO.HIGH)
-
-                    # reset flag so outputs only update once per interrupt
-                    interrupt_triggered.clear()
-
-                # Put some status text on frame
-                cv2.putText(frame_bgr, f"Contours: {valid_contours}", (10,30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,255,255), 2)
-                cv2.putText(frame_bgr, "Press Prev to return", (10,60),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 2)
-
-                # Convert BGR -> RGB for display
-                display_frame = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-                tft_frame = cv2.resize(display_frame, (320,240))
-                tft_image = Image.fromarray(tft_frame)
-                # invert colors if your display gave negative images
-                tft_image = Image.eval(tft_image, lambda x: 255 - x)
-
-                tft.display(tft_image)
-
-                # process any button event (interrupt-driven)
+                t0 = time.perf_counter()
+                frame = camera.capture_array()
+                t_frame = time.perf_counter()
+                metrics.record("capture", t_frame - t0)
+                departed = tracker.update(frame, t_frame)
+                metrics.record("track.gate", time.perf_counter() - t_frame)
+                if departed is not None:
+                    self._finish_part(departed, seq)
+                if tracker.part is not None and tracker.part is not arrived:
+                    # a new plateau: release the previous plateau's verdict
+                    arrived = tracker.part
+                    self.outputs.clear()
+                result = None
+                if tracker.wants_detection:
+                    result = detector.detect(frame)
+                    metrics.record_timings("detect", result.timings)
+                    seq = self.frame_ring.push(frame, result.mask) if self.frame_ring is not None else None
+                    part = tracker.add_result(result)
+                    if part is not None:
+                        self._decide_part(part, seq)
+                if display_limiter.ready():
+                    if result is not None:
+                        self._annotate_frame(frame, result)
+                    cv2.putText(frame, tracker.status(), (10,90), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                                (255,255,255,255)[:frame.shape[2]], 2)
+                    screen.show_rgb565(self._frame_to_tft(frame))
+
                 ev = self._pop_button_event()
                 if ev == 'prev':
-                    # user asked to return to menu
                     self.current_screen = "menu"
                     break
                 elif ev == 'next':
-                    # optionally use next for other function
-                    pass
+                    # the fixture has been cleared: learn it again
+                    tracker.reset_background()
                 elif ev == 'ok':
-                    # optionally use ok inside detection
-                    pass
+                    self._save_evidence()
+        finally:
+            # a plateau still in the fixture is logged without a dwell time
+            part = tracker.finish()
+            if part is not None:
+                self._finish_part(part)
+            self.next_plateau = tracker.next_id
+            print(f"Tracked {tracker.parts} plateaus ({tracker.missed} missed) in {tracker.frames} frames")
+
+    def _draw_stations(self, base, stats):
+        image = base.copy()
+        draw = ImageDraw.Draw(image)
+        for i, (name, s) in enumerate(stats.items()):
+            y = 60 + i*30
+            verdict = s["verdict"] or "--"
+            color = (0,200,0) if verdict == "OK" else (220,60,60) if verdict == "NOK" else (180,180,180)
+            draw.text((20, y), name, font=self.option_font, fill=(220,220,220))
+            draw.text((130, y), verdict, font=self.option_font, fill=color)
+            draw.text((190, y+3), f"{s['clips'] if s['clips'] is not None else '-'} clips  {s['fps']:.0f} fps",
+                      font=self.small_font, fill=(180,180,180))
+        draw.text((20, TFT_HEIGHT - 24), self._production_summary(), font=self.small_font, fill=(220,220,220))
+        self.hw.screen.show(image)
+
+    def _run_detection_stations(self, detector):
+        # every station's detection runs in its own process; the screen lists
+        # the latest verdict per station (multiprocessing imported only here)
+        from stations import Station, StationPool
+        main_station = Station("main", self.hw.camera, detector.params)
+        extra = extra_stations(self.hw)
+
+        def on_result(result):
+            # this camera keeps the PIN_INT-gated outputs and production stats;
+            # the other stations journal the verdict of each triggered part
+            if result.station == "main":
+                self._apply_verdict(result)
+            elif result.t_trigger is not None and self.journal is not None:
+                self.journal.append(result.ok, result.valid_contours, result.areas, result.centroids,
+                                    station=result.station,
+                                    latency_ms=(time.perf_counter() - result.t_trigger) * 1000.0)
+
+        # workers come from the forkserver and re-import this script, which
+        # opens no hardware at import
+        pool = StationPool([main_station] + extra, on_result=on_result, metrics=metrics).start()
+        gpio = self.hw.gpio
+        triggered = [s for s in extra if s.outputs is not None and s.trigger_pin is not None]
+        for station in triggered:
+            for pin in (station.outputs.pin_ctrl, station.outputs.pin_green, station.outputs.pin_red):
+                gpio.setup(pin, gpio.OUT)
+            station.outputs.clear()
+            gpio.setup(station.trigger_pin, gpio.IN, pull_up_down=gpio.PUD_DOWN)
+            gpio.add_event_detect(station.trigger_pin, gpio.RISING, bouncetime=200,
+                                  callback=lambda channel, name=station.name: pool.trigger(name))
+        base = self._header_layer("STATIONS")
+        refresh = self.events.call_every(0.25, "refresh", first=0)
+        try:
+            while self.current_screen == "detection" and pool.is_alive():
+                ev = self.events.next_event(("button", "refresh"))
+                if ev is None:
+                    break
+                if ev.kind == "refresh":
+                    self._draw_stations(base, pool.stats())
+                elif ev.payload == 'prev':
+                    self.current_screen = "menu"
+                    break
+        finally:
+            refresh.cancel()
+            for station in triggered:
+                gpio.remove_event_detect(station.trigger_pin)
+            pool.stop()
+            print("Station stats:", pool.stats())
+            for station in triggered:
+                station.outputs.clear()
+
+    # -------------------------
+    # Detection routine (fully integrated)
+    # -------------------------
+    def run_detection(self):
+        print("Entering detection")
+        self.current_screen = "detection"
 
-                # fallback poll check to be extra robust
-                self.check_buttons()
+        # full-size main stream; the sensor keeps running, nothing is reconfigured
+        # (waits here if the camera is still warming up)
+        camera = self.hw.camera
+        camera.use("inspect")
 
-                # slight delay
-                time.sleep(0.03)
+        params = self.detection_params()
+        detector = CoarseToFineDetector(params, COARSE_SCALE) if COARSE_SCALE else ClipDetector(params)
+        self._start_evidence()
+        self.production.resume()
 
+        try:
+            if DETECTION_MODE == "triggered":
+                self._run_detection_triggered(detector)
+            elif DETECTION_MODE == "stations":
+                self._run_detection_stations(detector)
+            elif DETECTION_MODE == "tracked":
+                self._run_detection_tracked(detector)
+            elif DETECTION_MODE == "pipelined":
+                self._run_detection_pipelined(detector)
+            else:
+                self._run_detection_serial(detector)
         except Exception as e:
             print("Detection loop error:", e)
         finally:
-            # ensure LEDs off and camera reconfigured back to preview
-            GPIO.output(PIN_CTRL, GPIO.LOW)
-            GPIO.output(PIN_GREEN, GPIO.LOW)
-            GPIO.output(PIN_RED, GPIO.LOW)
-
-            try:
-                picam2.stop()
-            except Exception:
-                pass
-
-            # go back to preview config for menu
-            try:
-                preview_cfg = picam2.create_preview_configuration(main={"size": (320,240)})
-                picam2.configure(preview_cfg)
-                picam2.start()
-            except Exception as e:
-                print("Failed to return camera to preview:", e)
+            # ensure LEDs off and camera back on the preview stream
+            self.outputs.clear()
+            camera.use("preview")
+            self.production.pause()
+            self._stop_evidence()
 
             print("Exiting detection, returning to menu.")
 
 # -------------------------
 # Main program
 # -------------------------
-def main():
-    menu = ModernMenu()
-    # register event-detect callbacks (use lambda to pass menu handle)
-    GPIO.add_event_detect(PIN_BTN_PREV, GPIO.FALLING, callback=lambda ch: menu.handle_button_press('prev'), bouncetime=100)
-    GPIO.add_event_detect(PIN_BTN_NEXT, GPIO.FALLING, callback=lambda ch: menu.handle_button_press('next'), bouncetime=300)
-    GPIO.add_event_detect(PIN_BTN_OK,   GPIO.FALLING, callback=lambda ch: menu.handle_button_press('ok'),   bouncetime=300)
-    # attach interrupt on pin 23
-    GPIO.add_event_detect(PIN_INT, GPIO.RISING, callback=handle_interrupt, bouncetime=200)
+def start_hmi(hw):
+    """Shows the menu as early as possible; returns it ready for input.
+
+    The camera warms up on its own thread meanwhile and is only waited for
+    when a camera screen is opened.
+    """
+    hw.warm_up_camera()
+    menu = ModernMenu(hw)
+    gpio = hw.gpio
+    events = menu.events
+    # button edges go onto the menu's event queue (nothing polls the pins)
+    events.watch_pin(gpio, PIN_BTN_PREV, gpio.FALLING, "button", 'prev', bouncetime=100)
+    events.watch_pin(gpio, PIN_BTN_NEXT, gpio.FALLING, "button", 'next', bouncetime=300)
+    events.watch_pin(gpio, PIN_BTN_OK,   gpio.FALLING, "button", 'ok',   bouncetime=300)
+    # interrupt on pin 23: latched on the GPIO thread, then queued for the HMI
+    events.watch_pin(gpio, PIN_INT, gpio.RISING, "trigger", bouncetime=200, callback=handle_interrupt)
 
     # show initial menu
     menu.draw_menu()
+    metrics.record("startup.first_frame", time.perf_counter() - T_STARTUP)
+    if not menu.layers_cached:
+        # first boot (or changed menu): store the static layers for next time
+        menu.cache_layers()
+    return menu
+
+
+def main(hw=None):
+    # pass a Hardware with fake backends to run off the Pi
+    hw = hw or default_hardware()
+    menu = start_hmi(hw)
+    print(f"Menu ready in {metrics.summary('startup.first_frame')['max']:.0f} ms")
+
+    # periodic latency dump (p50/p95/p99/max per stage)
+    exporter = MetricsExporter(metrics, METRICS_PATH, METRICS_FORMAT, METRICS_INTERVAL)
+    exporter.start()
+
+    # per-part records, written in batches off the detection thread
+    try:
+        menu.journal = InspectionJournal(JOURNAL_PATH, max_bytes=JOURNAL_MAX_BYTES)
+    except OSError as e:
+        print("Warning: inspection journal disabled:", e)
+
+    # ships journal records to the dashboard in batches, retrying with backoff
+    uploader = None
+    if menu.journal is not None and UPLOAD_URL:
+        # urllib / http.client are only imported when uploads are enabled
+        from uploader import BatchUploader, HttpTransport
+        uploader = BatchUploader(menu.journal, HttpTransport(UPLOAD_URL))
+        uploader.start()
+
+    # MJPEG preview for remote viewers (http.server only imported when enabled)
+    if PREVIEW_PORT:
+        from stream import PreviewStream
+        try:
+            menu.preview = PreviewStream(PREVIEW_PORT, max_fps=PREVIEW_FPS, jpeg_quality=PREVIEW_QUALITY,
+                                         color_order=CAMERA_COLOR_ORDER, metrics=metrics).start()
+            print(f"Preview stream on port {menu.preview.port}")
+        except OSError as e:
+            print("Warning: preview stream disabled:", e)
 
     try:
-        while menu.is_running:
-            # process any button events / polling fallback
-            menu.check_buttons()
-            time.sleep(0.05)
+        # blocks on the event queue until a button is pressed
+        menu.run()
 
     except KeyboardInterrupt:
         print("Interrupted by user")
 
     finally:
         # cleanup
-        try:
-            GPIO.remove_event_detect(PIN_BTN_PREV)
-            GPIO.remove_event_detect(PIN_BTN_NEXT)
-            GPIO.remove_event_detect(PIN_BTN_OK)
-        except Exception:
-            pass
-
-        try:
-            picam2.stop()
-        except Exception:
-            pass
+        exporter.stop()
+        if uploader is not None:
+            uploader.stop()
+        if menu.preview is not None:
+            menu.preview.stop()
+        if menu.journal is not None:
+            menu.journal.close()
+        menu.events.unwatch()
+        hw.close()
 
         try:
             # clear display
-            tft.display(Image.new("RGB", (tft.width, tft.height), (0,0,0)))
+            hw.screen.show(Image.new("RGB", (TFT_WIDTH, TFT_HEIGHT), (0,0,0)))
         except Exception:
             pass
 
-        GPIO.output(PIN_CTRL, GPIO.LOW)
-        GPIO.output(PIN_GREEN, GPIO.LOW)
-        GPIO.output(PIN_RED, GPIO.LOW)
-        GPIO.cleanup()
+        menu.outputs.clear()
+        hw.gpio.cleanup()
         print("Goodbye!")
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+
+# -------------------------
+# Latency histogram
+# -------------------------
+def _log_bounds(low=1e-5, high=10.0, ratio=1.2):
+    bounds = []
+    b = low
+    while b < high:
+        bounds.append(b)
+        b *= ratio
+    bounds.append(high)
+    return bounds
+
+
+# Shared bucket upper bounds in seconds: 10 us .. 10 s, 20% wide buckets
+BUCKET_BOUNDS = _log_bounds()
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram without locks.
+
+    Each histogram has a single writer thread (the stage that owns it), so a
+    record is just an index lookup and a list increment. Readers take a copy
+    of the counts and may see a snapshot that is one sample behind, which is
+    fine for monitoring.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)   # last bucket: overflow
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q, counts=None):
+        """Upper bound of the bucket holding quantile `q` (seconds)."""
+        counts = counts if counts is not None else list(self.counts)
+        n = sum(counts)
+        if n == 0:
+            return 0.0
+        rank = q * n
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank and c:
+                bound = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        """p50/p95/p99/max/mean in milliseconds."""
+        counts = list(self.counts)
+        n = sum(counts)
+        return {
+            "count": n,
+            "p50": self.percentile(0.50, counts) * 1000.0,
+            "p95": self.percentile(0.95, counts) * 1000.0,
+            "p99": self.percentile(0.99, counts) * 1000.0,
+            "max": self.max * 1000.0,
+            "mean": (self.total / self.count * 1000.0) if self.count else 0.0,
+        }
+
+
+class MetricsRegistry:
+    """Named latency histograms, one per instrumented stage."""
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()   # only taken when a new stage appears
+
+    def histogram(self, name):
+        h = self._histograms.get(name)
+        if h is None:
+            with self._lock:
+                h = self._histograms.setdefault(name, LatencyHistogram(name))
+        return h
+
+    def record(self, name, seconds):
+        self.histogram(name).record(seconds)
+
+    def record_timings(self, prefix, timings):
+        """Records a detector timings dict as `<prefix>.<stage>` histograms."""
+        for stage, seconds in timings.items():
+            self.histogram(f"{prefix}.{stage}").record(seconds)
+
+    def summary(self, name):
+        h = self._histograms.get(name)
+        return h.summary() if h is not None else None
+
+    def snapshot(self):
+        return {name: h.summary() for name, h in sorted(self._histograms.items())}
+
+
+# -------------------------
+# Export
+# -------------------------
+def to_prometheus(snapshot, prefix="inspection_latency"):
+    lines = [f"# TYPE {prefix}_ms summary"]
+    for name, s in snapshot.items():
+        stage = name.replace('"', "")
+        for q in ("p50", "p95", "p99"):
+            quantile = "0." + q[1:]
+            lines.append(f'{prefix}_ms{{stage="{stage}",quantile="{quantile}"}} {s[q]:.4f}')
+        lines.append(f'{prefix}_ms_count{{stage="{stage}"}} {s["count"]}')
+        lines.append(f'{prefix}_max_ms{{stage="{stage}"}} {s["max"]:.4f}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter(threading.Thread):
+    """Periodically dumps the registry to a file.
+
+    fmt="jsonl" appends one JSON object per dump; fmt="prometheus" rewrites a
+    textfile-collector file atomically.
+    """
+    def __init__(self, registry, path, fmt="prometheus", interval=10.0):
+        super().__init__(name="metrics-exporter", daemon=True)
+        if fmt not in ("prometheus", "jsonl"):
+            raise ValueError(f"unknown metrics format: {fmt}")
+        self.registry = registry
+        self.path = path
+        self.fmt = fmt
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def dump(self):
+        snap = self.registry.snapshot()
+        if self.fmt == "jsonl":
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"time": time.time(), "stages": snap}) + "\n")
+        else:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(to_prometheus(snap))
+            os.replace(tmp, self.path)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.dump()
+            except OSError as e:
+                print("Metrics dump failed:", e)
+
+    def stop(self):
+        self._stop_event.set()
+        try:
+            self.dump()
+        except OSError as e:
+            print("Metrics dump failed:", e)
@@ -0,0 +1,246 @@
+import time
+import threading
+from collections import deque
+
+# -------------------------
+# Bounded drop-oldest queue
+# -------------------------
+class DropOldestQueue:
+    """Bounded queue where a put on a full queue discards the oldest item.
+
+    Producers never block, so a slow consumer can only ever lose stale items.
+    """
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Returns the oldest queued item, or None on timeout / after close()."""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def get_latest(self, timeout=None):
+        """Returns the newest item and discards everything queued before it."""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.pop()
+            self.dropped += len(self._items)
+            self._items.clear()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class RateLimiter:
+    """Lets an action through at most once per `interval` seconds (0 = always)."""
+    def __init__(self, interval=0.0):
+        self.interval = interval
+        self.skipped = 0
+        self._next = 0.0
+
+    def ready(self, now=None):
+        now = time.perf_counter() if now is None else now
+        if now < self._next:
+            self.skipped += 1
+            return False
+        self._next = now + self.interval
+        return True
+
+
+class FramePacket:
+    """A captured frame travelling through the pipeline."""
+    def __init__(self, seq, frame, t_capture):
+        self.seq = seq
+        self.frame = frame
+        self.t_capture = t_capture
+        self.result = None
+
+
+# -------------------------
+# Pipeline stages
+# -------------------------
+class CaptureThread(threading.Thread):
+    """Pulls frames from `camera.capture_array()` as fast as the camera delivers them."""
+    def __init__(self, camera, out_queue, stop_event, metrics=None):
+        super().__init__(name="capture", daemon=True)
+        self.camera = camera
+        self.out_queue = out_queue
+        self.stop_event = stop_event
+        self.metrics = metrics
+        self.captured = 0
+        self.error = None
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                t0 = time.perf_counter()
+                frame = self.camera.capture_array()
+                t1 = time.perf_counter()
+                if frame is None:
+                    break
+                if self.metrics is not None:
+                    self.metrics.record("capture", t1 - t0)
+                self.out_queue.put(FramePacket(self.captured, frame, t1))
+                self.captured += 1
+        except Exception as e:
+            self.error = e
+            print("Capture thread error:", e)
+        finally:
+            self.out_queue.close()
+
+
+class DetectionWorker(threading.Thread):
+    """Runs the detector on the newest captured frame and hands results on.
+
+    `on_result(packet)` is called on the worker thread right after detection
+    (GPIO decisions belong there). At most one frame per `display_interval`
+    seconds is offered to the display queue, and only those frames go
+    through the optional `annotate(packet)`, so drawing never runs at the
+    inspection rate. The worker never waits on the display: the display
+    queue drops old frames instead.
+    """
+    def __init__(self, detector, in_queue, out_queue, stop_event, on_result=None, annotate=None,
+                 metrics=None, display_interval=0.0):
+        super().__init__(name="detection", daemon=True)
+        self.detector = detector
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.stop_event = stop_event
+        self.metrics = metrics
+        self.on_result = on_result
+        self.annotate = annotate
+        self.display_limiter = RateLimiter(display_interval)
+        self.processed = 0
+        self.last_result = None
+        self.error = None
+
+    def process_one(self, timeout=0.1):
+        """Processes the newest pending frame; returns the packet or None."""
+        packet = self.in_queue.get_latest(timeout)
+        if packet is None:
+            return None
+        packet.result = self.detector.detect(packet.frame)
+        self.last_result = packet.result
+        self.processed += 1
+        if self.metrics is not None:
+            self.metrics.record_timings("detect", packet.result.timings)
+        if self.on_result is not None:
+            self.on_result(packet)
+        if self.out_queue is not None and self.display_limiter.ready():
+            if self.annotate is not None:
+                self.annotate(packet)
+            self.out_queue.put(packet)
+        return packet
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                if self.process_one() is None and self.in_queue.closed:
+                    break
+        except Exception as e:
+            self.error = e
+            print("Detection worker error:", e)
+        finally:
+            if self.out_queue is not None:
+                self.out_queue.close()
+
+
+class DisplayThread(threading.Thread):
+    """Shows only the newest annotated frame; `render(packet)` builds the image."""
+    def __init__(self, display, in_queue, stop_event, render):
+        super().__init__(name="display", daemon=True)
+        self.display = display
+        self.in_queue = in_queue
+        self.stop_event = stop_event
+        self.render = render
+        self.displayed = 0
+        self.error = None
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                packet = self.in_queue.get_latest(timeout=0.1)
+                if packet is None:
+                    if self.in_queue.closed:
+                        break
+                    continue
+                self.display.display(self.render(packet))
+                self.displayed += 1
+        except Exception as e:
+            self.error = e
+            print("Display thread error:", e)
+
+
+# -------------------------
+# Pipeline
+# -------------------------
+class DetectionPipeline:
+    """Capture -> detection -> display on three threads joined by drop-oldest queues."""
+    def __init__(self, camera, detector, display=None, render=None, on_result=None,
+                 annotate=None, queue_size=2, metrics=None, display_interval=0.0):
+        self.stop_event = threading.Event()
+        self.frame_queue = DropOldestQueue(queue_size)
+        self.display_queue = DropOldestQueue(1) if display is not None else None
+        self.capture = CaptureThread(camera, self.frame_queue, self.stop_event, metrics)
+        self.worker = DetectionWorker(detector, self.frame_queue, self.display_queue,
+                                      self.stop_event, on_result, annotate, metrics,
+                                      display_interval)
+        self.display = None
+        if display is not None:
+            self.display = DisplayThread(display, self.display_queue, self.stop_event, render)
+
+    def start(self):
+        self.capture.start()
+        self.worker.start()
+        if self.display is not None:
+            self.display.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        self.frame_queue.close()
+        if self.display_queue is not None:
+            self.display_queue.close()
+        for t in (self.capture, self.worker, self.display):
+            if t is not None and t.is_alive():
+                t.join(timeout)
+
+    def is_alive(self):
+        return self.capture.is_alive() or self.worker.is_alive()
+
+    def stats(self):
+        return {
+            "captured": self.capture.captured,
+            "processed": self.worker.processed,
+            "displayed": self.display.displayed if self.display is not None else 0,
+            "dropped_frames": self.frame_queue.dropped,
+            "dropped_display": self.display_queue.dropped if self.display_queue is not None else 0,
+            "skipped_display": self.worker.display_limiter.skipped,
+        }
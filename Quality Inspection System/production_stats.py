@@ -0,0 +1,138 @@
+"""Rolling line performance (throughput, yield, cycle time) from inspection verdicts."""
+import math
+import time
+import threading
+import numpy as np
+
+# -------------------------
+# Building blocks
+# -------------------------
+class DecayingRate:
+    """Event rate (events/s) with exponential decay, O(1) time and memory.
+
+    Each event adds 1/tau; the total decays with time constant `tau`, so a
+    steady stream of r events/s converges to r and an idle line falls to 0.
+    """
+    def __init__(self, tau=60.0):
+        self.tau = tau
+        self._value = 0.0
+        self._t = None
+
+    def add(self, t):
+        if self._t is not None:
+            self._value *= math.exp(-max(0.0, t - self._t) / self.tau)
+        self._value += 1.0 / self.tau
+        self._t = t
+
+    def value(self, now):
+        if self._t is None:
+            return 0.0
+        return self._value * math.exp(-max(0.0, now - self._t) / self.tau)
+
+
+class PartRing:
+    """The last `capacity` parts (time, verdict, cycle time) in preallocated arrays."""
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, np.float64)
+        self.ok = np.zeros(capacity, np.bool_)
+        self.cycle = np.full(capacity, np.nan, np.float64)
+        self._next = 0
+        self.size = 0
+
+    def append(self, t, ok, cycle):
+        i = self._next
+        self.times[i] = t
+        self.ok[i] = ok
+        self.cycle[i] = np.nan if cycle is None else cycle
+        self._next = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def since(self, t0):
+        """Mask of the stored parts at or after t0 (order does not matter for the stats)."""
+        return self.times[:self.size] >= t0
+
+
+# -------------------------
+# Production statistics
+# -------------------------
+class ProductionStats:
+    """Live line statistics in constant memory, fed with one call per part.
+
+    Throughput is a decaying rate (`tau` seconds); yield, reject rate and
+    cycle-time percentiles cover the parts of the last `window` seconds kept
+    in a ring of `capacity` parts. Totals count everything since start.
+    `record()` is called from the detection threads and `snapshot()` from
+    the HMI, so both take a short lock. The line counts as running only
+    between `resume()` and `pause()` (while detection runs) and while a part
+    came in the last `idle_after` seconds. Times are time.perf_counter().
+    """
+    def __init__(self, window=900.0, capacity=4096, tau=60.0, idle_after=30.0):
+        self.window = window
+        self.idle_after = idle_after
+        self.ring = PartRing(capacity)
+        self.rate = DecayingRate(tau)
+        self.total = 0
+        self.rejected = 0
+        self.last_part = None
+        self.started = time.perf_counter()
+        self.inspecting = False
+        self._lock = threading.Lock()
+
+    def resume(self):
+        """Verdicts are being produced again (detection started)."""
+        self.inspecting = True
+
+    def pause(self):
+        """No more verdicts until resume() (detection stopped)."""
+        self.inspecting = False
+
+    def record(self, ok, t=None, cycle_time=None):
+        """Adds one inspected part; the cycle time defaults to the gap since the previous part."""
+        t = time.perf_counter() if t is None else t
+        with self._lock:
+            if cycle_time is None and self.last_part is not None:
+                cycle_time = t - self.last_part
+            self.ring.append(t, ok, cycle_time)
+            self.rate.add(t)
+            self.total += 1
+            if not ok:
+                self.rejected += 1
+            self.last_part = t
+
+    def snapshot(self, now=None):
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            mask = self.ring.since(now - self.window)
+            ok = self.ring.ok[:self.ring.size][mask]
+            cycles = self.ring.cycle[:self.ring.size][mask]
+            per_min = self.rate.value(now) * 60.0
+            total, rejected, last_part = self.total, self.rejected, self.last_part
+        cycles = cycles[~np.isnan(cycles)]
+        n = len(ok)
+        good = int(np.count_nonzero(ok))
+        if len(cycles):
+            p50, p95 = np.percentile(cycles, [50, 95])
+        else:
+            p50 = p95 = None
+        return {
+            "total": total,
+            "ok": total - rejected,
+            "rejected": rejected,
+            "window_parts": n,
+            "parts_per_min": per_min,
+            "yield": 100.0 * good / n if n else None,
+            "reject_rate": 100.0 * (n - good) / n if n else None,
+            "cycle_p50": None if p50 is None else float(p50),
+            "cycle_p95": None if p95 is None else float(p95),
+            "inspecting": self.inspecting,
+            "running": self.inspecting and last_part is not None and now - last_part < self.idle_after,
+        }
+
+    def per_minute(self, minutes=10, now=None):
+        """Parts counted in each of the last `minutes` minutes, oldest first."""
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            times = self.ring.times[:self.ring.size][self.ring.since(now - minutes * 60.0)]
+        counts, _ = np.histogram(now - times, bins=minutes, range=(0.0, minutes * 60.0))
+        return counts[::-1].tolist()
@@ -0,0 +1,339 @@
+"""Several inspection stations on one controller, one detection process each."""
+import time
+import queue
+import signal
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+import numpy as np
+import cv2
+
+from detection import ClipDetector, DetectionParams
+
+# -------------------------
+# Station
+# -------------------------
+class Station:
+    """One inspection point: frame source, clip rule and verdict outputs.
+
+    `source` is anything with `capture_array()` (Picamera2, fakes.ReplayCamera,
+    fakes.FakeFrameSource). The clip windows and the clip count of an OK part
+    are `params.roi` / `params.expected_clips`. `outputs` is a
+    trigger.GpioOutputs driven once per part: with the first frame captured
+    after the station's part-present edge (`trigger_pin`, reported through
+    `StationPool.trigger()`), like the main camera with PIN_INT. Frames
+    without a pending trigger never touch the outputs.
+    """
+    def __init__(self, name, source, params=None, outputs=None, trigger_pin=None):
+        self.name = name
+        self.source = source
+        self.params = params or DetectionParams()
+        self.outputs = outputs
+        self.trigger_pin = trigger_pin
+
+
+# -------------------------
+# Shared-memory result slots
+# -------------------------
+MAX_CLIPS = 32
+
+RESULT_DTYPE = np.dtype([
+    ("seq", np.int64),
+    ("ok", np.uint8),
+    ("clips", np.int32),
+    ("areas", np.float32, (MAX_CLIPS,)),
+    ("boxes", np.int32, (MAX_CLIPS, 4)),
+    ("centroids", np.int32, (MAX_CLIPS, 2)),
+    ("detect_time", np.float64),
+])
+
+
+class StationResult:
+    """Verdict of one frame of one station, copied out of shared memory."""
+    def __init__(self, station, seq, ok, valid_contours, areas, boxes, centroids,
+                 detect_time, t_capture, t_result):
+        self.station = station
+        self.seq = seq
+        self.ok = ok
+        self.valid_contours = valid_contours
+        self.areas = areas
+        self.boxes = boxes
+        self.centroids = centroids
+        self.detect_time = detect_time
+        self.t_capture = t_capture
+        self.t_result = t_result
+        self.t_trigger = None           # set on the result that decided a triggered part
+
+    @property
+    def verdict(self):
+        return "OK" if self.ok else "NOK"
+
+    @property
+    def latency(self):
+        """Capture -> result back in the controller, in seconds."""
+        return self.t_result - self.t_capture
+
+
+def _store_result(results, slot, seq, result):
+    n = min(result.valid_contours, MAX_CLIPS)
+    results["seq"][slot] = seq
+    results["ok"][slot] = result.ok
+    results["clips"][slot] = result.valid_contours
+    if n:
+        results["areas"][slot, :n] = result.areas[:n]
+        results["boxes"][slot, :n] = result.boxes[:n]
+        results["centroids"][slot, :n] = result.centroids[:n]
+    results["detect_time"][slot] = result.timings["total"]
+
+
+def _detect_worker(params, frames_name, results_name, frame_shape, slots, requests, replies):
+    # Ctrl-C is handled by the controller, which then stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # one station per core: OpenCV's own thread pool would only oversubscribe
+    cv2.setNumThreads(1)
+    frames_shm = shared_memory.SharedMemory(name=frames_name)
+    results_shm = shared_memory.SharedMemory(name=results_name)
+    frames = np.ndarray((slots,) + frame_shape, np.uint8, buffer=frames_shm.buf)
+    results = np.ndarray((slots,), RESULT_DTYPE, buffer=results_shm.buf)
+    detector = ClipDetector(params)
+    try:
+        while True:
+            try:
+                job = requests.recv()
+            except EOFError:
+                break
+            if job is None:
+                break
+            seq, slot, t_capture = job
+            _store_result(results, slot, seq, detector.detect(frames[slot]))
+            replies.send((seq, slot, t_capture))
+    finally:
+        del frames, results
+        frames_shm.close()
+        results_shm.close()
+
+
+# -------------------------
+# Worker process handle
+# -------------------------
+class StationWorker:
+    """Controller side of one station's detection process.
+
+    Frames are copied into one of `slots` shared-memory frame buffers and
+    only the slot index travels over the pipe; the worker writes the
+    result into the matching shared result record.
+    """
+    def __init__(self, station, frame_shape, slots=2, context=None):
+        ctx = context or mp.get_context()
+        self.station = station
+        self.frame_shape = tuple(frame_shape)
+        self.slots = slots
+        self.processed = 0
+        self.last_result = None
+        self._seq = 0
+        frame_bytes = int(np.prod(self.frame_shape))
+        self._frames_shm = shared_memory.SharedMemory(create=True, size=frame_bytes * slots)
+        self._results_shm = shared_memory.SharedMemory(create=True, size=RESULT_DTYPE.itemsize * slots)
+        self.frames = np.ndarray((slots,) + self.frame_shape, np.uint8, buffer=self._frames_shm.buf)
+        self.results = np.ndarray((slots,), RESULT_DTYPE, buffer=self._results_shm.buf)
+        self._free = queue.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+
+        requests_r, self._requests = ctx.Pipe(duplex=False)
+        self.replies, replies_w = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(
+            target=_detect_worker, name=f"station-{station.name}", daemon=True,
+            args=(station.params, self._frames_shm.name, self._results_shm.name,
+                  self.frame_shape, slots, requests_r, replies_w))
+        self.process.start()
+        # the worker holds its own copies of these ends
+        requests_r.close()
+        replies_w.close()
+
+    def acquire_slot(self, timeout=None):
+        """A free frame slot, or None when all are still being detected."""
+        try:
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def submit(self, slot, frame, t_capture):
+        np.copyto(self.frames[slot], frame)
+        self._requests.send((self._seq, slot, t_capture))
+        self._seq += 1
+
+    def read_result(self):
+        """Receives one finished slot and copies its result out (raises EOFError if the worker died)."""
+        seq, slot, t_capture = self.replies.recv()
+        rec = self.results[slot]
+        n = min(int(rec["clips"]), MAX_CLIPS)
+        result = StationResult(
+            self.station.name, seq, bool(rec["ok"]), int(rec["clips"]),
+            rec["areas"][:n].tolist(),
+            [tuple(b) for b in rec["boxes"][:n].tolist()],
+            [tuple(c) for c in rec["centroids"][:n].tolist()],
+            float(rec["detect_time"]), t_capture, time.perf_counter())
+        self._free.put(slot)
+        self.processed += 1
+        self.last_result = result
+        return result
+
+    def close(self, timeout=2.0):
+        try:
+            self._requests.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        self._requests.close()
+        self.replies.close()
+        del self.frames, self.results
+        for shm in (self._frames_shm, self._results_shm):
+            shm.close()
+            shm.unlink()
+
+
+# -------------------------
+# Station pool
+# -------------------------
+def default_context():
+    """Workers are forked from a small server process that preloaded this module.
+
+    They do not inherit the controller's camera / GPIO threads. Like spawn,
+    each worker imports the `__main__` script once more (as `__mp_main__`),
+    so that script must not open hardware at import time; otherwise pass
+    `mp.get_context("fork")`.
+    """
+    ctx = mp.get_context("forkserver")
+    ctx.set_forkserver_preload([__name__])
+    return ctx
+
+
+class StationPool:
+    """Inspects every station in its own detection process.
+
+    Per station, a feeder thread captures into a free shared-memory slot and
+    hands the slot to the worker; with `slots` > 1 the next frame is captured
+    while the previous one is detected. One collector thread waits on all
+    workers, drives a triggered station's outputs once per part and calls
+    `on_result(result)`.
+    """
+    def __init__(self, stations, slots=2, on_result=None, metrics=None, context=None):
+        self.stations = list(stations)
+        self.slots = max(1, int(slots))
+        self.on_result = on_result
+        self.metrics = metrics
+        self.context = context
+        self.workers = []
+        self._threads = []
+        self._collector = None
+        self._stop_event = threading.Event()
+        self._t_start = None
+        self._armed = {}                # station name -> part-present edge time
+        self._armed_lock = threading.Lock()
+
+    def trigger(self, name, t=None):
+        """A part arrived at station `name`; safe to call from the GPIO callback thread."""
+        with self._armed_lock:
+            self._armed[name] = time.perf_counter() if t is None else t
+
+    def start(self):
+        ctx = self.context or default_context()
+        for station in self.stations:
+            # the first frame sizes the station's shared frame slots
+            frame = station.source.capture_array()
+            if frame is None:
+                print(f"Station {station.name}: no frame from source, skipped")
+                continue
+            worker = StationWorker(station, frame.shape, self.slots, ctx)
+            self.workers.append(worker)
+            t = threading.Thread(target=self._feed, args=(worker, frame),
+                                 name=f"station-feed-{station.name}", daemon=True)
+            self._threads.append(t)
+        self._collector = threading.Thread(target=self._collect, name="station-collector", daemon=True)
+        self._t_start = time.perf_counter()
+        for t in self._threads:
+            t.start()
+        self._collector.start()
+        return self
+
+    def _feed(self, worker, frame):
+        source = worker.station.source
+        t_capture = time.perf_counter()
+        try:
+            while not self._stop_event.is_set():
+                slot = worker.acquire_slot(timeout=0.1)
+                if slot is None:
+                    continue
+                if frame is None:
+                    t_capture = time.perf_counter()
+                    frame = source.capture_array()
+                    if frame is None:
+                        break   # recording exhausted
+                worker.submit(slot, frame, t_capture)
+                frame = None
+        except Exception as e:
+            print(f"Station {worker.station.name} capture error:", e)
+
+    def _collect(self):
+        by_conn = {w.replies: w for w in self.workers}
+        metrics = self.metrics
+        while by_conn and not self._stop_event.is_set():
+            for conn in wait(list(by_conn), timeout=0.1):
+                worker = by_conn[conn]
+                try:
+                    result = worker.read_result()
+                except (EOFError, OSError):
+                    print(f"Station {worker.station.name}: detection process exited")
+                    del by_conn[conn]
+                    continue
+                station = worker.station
+                if station.outputs is not None:
+                    self._decide(station, result)
+                if metrics is not None:
+                    metrics.record(f"station.{station.name}.detect", result.detect_time)
+                    metrics.record(f"station.{station.name}.latency", result.latency)
+                if self.on_result is not None:
+                    self.on_result(result)
+
+    def _decide(self, station, result):
+        # one verdict per part: the first frame captured after the edge
+        with self._armed_lock:
+            t_trigger = self._armed.get(station.name)
+            if t_trigger is None or result.t_capture < t_trigger:
+                return
+            del self._armed[station.name]
+        station.outputs.apply(result.ok)
+        result.t_trigger = t_trigger
+        if self.metrics is not None:
+            self.metrics.record(f"station.{station.name}.verdict", time.perf_counter() - t_trigger)
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        for t in self._threads:
+            t.join(timeout)
+        if self._collector is not None:
+            self._collector.join(timeout)
+        for worker in self.workers:
+            worker.close(timeout)
+
+    def is_alive(self):
+        return self._collector is not None and self._collector.is_alive()
+
+    def stats(self):
+        """Per-station processed frames, throughput and latest verdict."""
+        elapsed = time.perf_counter() - self._t_start if self._t_start else 0.0
+        out = {}
+        for w in self.workers:
+            last = w.last_result
+            out[w.station.name] = {
+                "processed": w.processed,
+                "fps": w.processed / elapsed if elapsed > 0 else 0.0,
+                "verdict": last.verdict if last is not None else None,
+                "clips": last.valid_contours if last is not None else None,
+            }
+        return out
@@ -0,0 +1,210 @@
+"""Optional MJPEG preview of the annotated detection frames over HTTP."""
+import time
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+
+from framering import BGR_CONVERSIONS
+
+BOUNDARY = "frame"
+
+PAGE = b"""<!doctype html>
+<html><head><title>Inspection preview</title></head>
+<body style="margin:0;background:#111">
+<img src="/stream.mjpg" style="display:block;margin:auto;max-width:100%">
+</body></html>
+"""
+
+
+# -------------------------
+# Shared encoder
+# -------------------------
+class PreviewStream:
+    """Encodes the offered frames once and serves the JPEG to every viewer.
+
+    `offer(frame)` is called wherever a frame goes to the TFT. With nobody
+    connected it returns after one comparison: nothing is copied or encoded.
+    With viewers it keeps at most `max_fps` frames per second and hands the
+    newest to the encoder thread, which JPEG-encodes it once. Each viewer
+    then sends the latest JPEG when it is ready for the next one, so a slow
+    client skips frames instead of holding back the others or detection.
+    An offered frame must not be modified afterwards (the detection loops
+    never touch a frame once it is shown).
+    """
+    def __init__(self, port=8080, host="0.0.0.0", max_fps=10.0, jpeg_quality=70,
+                 color_order="RGB", size=None, client_timeout=10.0, send_buffer=64 * 1024, metrics=None):
+        self.host = host
+        self.port = port
+        self.interval = 1.0 / max_fps if max_fps else 0.0
+        self.jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+        self.conversion = BGR_CONVERSIONS[color_order]
+        self.size = tuple(size) if size else None
+        self.client_timeout = client_timeout
+        self.send_buffer = send_buffer
+        self.metrics = metrics
+        self.viewers = 0
+        self.offered = 0
+        self.encoded = 0
+        self.sent = 0
+        self.skipped = 0
+        self._next_due = 0.0
+        self._pending = None
+        self._jpeg = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._encoder = threading.Thread(target=self._encode_loop, name="preview-encoder", daemon=True)
+        self._server = None
+        self._server_thread = None
+
+    def start(self):
+        """Binds the HTTP server (raises OSError if the port is taken) and starts serving."""
+        self._server = ThreadingHTTPServer((self.host, self.port), MjpegHandler)
+        self._server.daemon_threads = True
+        self._server.preview = self
+        self.port = self._server.server_address[1]
+        self._encoder.start()
+        self._server_thread = threading.Thread(target=self._server.serve_forever, args=(0.5,),
+                                               name="preview-http", daemon=True)
+        self._server_thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self._encoder.join(2.0)
+
+    # -------------------------
+    # Producer side (detection / display threads)
+    # -------------------------
+    def offer(self, frame):
+        """Queues a frame for viewers; returns False when it was not needed."""
+        if not self.viewers:
+            return False
+        now = time.perf_counter()
+        if now < self._next_due:
+            return False
+        self._next_due = now + self.interval
+        with self._cond:
+            self._pending = frame       # an older frame not yet encoded is dropped
+            self.offered += 1
+            self._cond.notify_all()
+        return True
+
+    def _encode_loop(self):
+        while not self._stop_event.is_set():
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._stop_event.is_set())
+                frame, self._pending = self._pending, None
+            if frame is None:
+                continue
+            t0 = time.perf_counter()
+            if self.size is not None and frame.shape[1::-1] != self.size:
+                frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+            bgr = frame if self.conversion is None else cv2.cvtColor(frame, self.conversion)
+            ok, jpg = cv2.imencode(".jpg", bgr, self.jpeg_params)
+            if not ok:
+                continue
+            with self._cond:
+                self._jpeg = jpg.tobytes()
+                self._seq += 1
+                self.encoded += 1
+                self._cond.notify_all()
+            if self.metrics is not None:
+                self.metrics.record("stream.encode", time.perf_counter() - t0)
+
+    # -------------------------
+    # Viewer side (one HTTP thread per client)
+    # -------------------------
+    def _join(self):
+        with self._cond:
+            self.viewers += 1
+
+    def _leave(self):
+        with self._cond:
+            self.viewers -= 1
+
+    def next_frame(self, last_seq, timeout=1.0):
+        """(jpeg, seq) newer than `last_seq`, or (None, last_seq) on timeout or stop."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > last_seq or self._stop_event.is_set(), timeout)
+            if self._seq <= last_seq or self._stop_event.is_set():
+                return None, last_seq
+            if last_seq > 0:
+                self.skipped += self._seq - last_seq - 1
+            self.sent += 1
+            return self._jpeg, self._seq
+
+    def stats(self):
+        return {"viewers": self.viewers, "offered": self.offered, "encoded": self.encoded,
+                "sent": self.sent, "skipped": self.skipped}
+
+
+class MjpegHandler(BaseHTTPRequestHandler):
+    """`/` a viewer page, `/stream.mjpg` the live stream, `/snapshot.jpg` one frame."""
+    protocol_version = "HTTP/1.0"
+
+    def setup(self):
+        self.timeout = self.server.preview.client_timeout
+        # a small send buffer makes a slow client block (and skip frames)
+        # instead of queueing seconds of stale video in the kernel
+        self.request.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.server.preview.send_buffer)
+        super().setup()
+
+    def do_GET(self):
+        preview = self.server.preview
+        path = self.path.split("?", 1)[0]
+        if path == "/":
+            self._send(200, "text/html", PAGE)
+        elif path == "/stream.mjpg":
+            self._stream(preview)
+        elif path == "/snapshot.jpg":
+            preview._join()
+            try:
+                # a fresh frame, not one left over from an earlier session
+                jpeg, _ = preview.next_frame(preview._seq, timeout=max(2.0, 2 * preview.interval))
+            finally:
+                preview._leave()
+            if jpeg is None:
+                self._send(503, "text/plain", b"no frame (is the detection screen open?)\n")
+            else:
+                self._send(200, "image/jpeg", jpeg)
+        else:
+            self._send(404, "text/plain", b"not found\n")
+
+    def _send(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, preview):
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        preview._join()
+        seq = 0
+        try:
+            while not preview._stop_event.is_set():
+                jpeg, seq = preview.next_frame(seq)
+                if jpeg is None:
+                    continue            # detection not running; keep the viewer connected
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                 f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass
+        finally:
+            preview._leave()
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,255 @@
+"""Part arrival / departure at the fixture from a cheap frame-differencing gate."""
+import time
+import numpy as np
+import cv2
+
+from trigger import majority_vote
+
+EMPTY = "empty"
+PRESENT = "present"
+
+
+# -------------------------
+# Tracked part
+# -------------------------
+class Part:
+    """One plateau, from the first frame it was seen to the first frame without it."""
+    def __init__(self, part_id, t_arrive, cycle_time):
+        self.id = part_id
+        self.t_arrive = t_arrive
+        self.cycle_time = cycle_time    # since the previous arrival (None for the first part)
+        self.t_settled = None
+        self.t_verdict = None
+        self.t_depart = None
+        self.results = []
+        self.ok = None
+        self.missed = False             # left before any frame was inspected
+
+    @property
+    def verdict(self):
+        return "--" if self.ok is None else "OK" if self.ok else "NOK"
+
+    @property
+    def dwell(self):
+        """Seconds at the fixture (None while the part is still there)."""
+        return None if self.t_depart is None else self.t_depart - self.t_arrive
+
+    @property
+    def latency(self):
+        """Arrival -> verdict, in seconds."""
+        return None if self.t_verdict is None else self.t_verdict - self.t_arrive
+
+
+# -------------------------
+# Part tracker
+# -------------------------
+class PartTracker:
+    """Follows plateaus through the fixture and asks for detection only when one is there.
+
+    Each frame is reduced to every `step`-th pixel of one channel inside `roi`
+    (x, y, w, h), copied into a reused buffer. Occupancy is the fraction of
+    those pixels that differ from the empty-fixture background by more than
+    `threshold`; motion is the same fraction against the previous frame.
+    A part arrives after `arrive_frames` occupied frames and has settled once
+    `settle_frames` frames in a row are still (or `settle_timeout` s after
+    arrival). `votes` frames are then detected and the part gets one majority
+    verdict (ties reject). It departs after `depart_frames` unoccupied frames;
+    a part that leaves before any frame was inspected is reported as missed
+    and rejected. `wants_detection` is True only between settling and the
+    verdict, so an empty fixture costs no detection at all.
+
+    The background is learnt from the first `learn_frames` frames, so the
+    fixture must be empty when tracking starts (or after `reset_background()`),
+    and follows slow lighting changes while the fixture stays empty.
+    Times are time.perf_counter() unless given.
+    """
+    def __init__(self, roi=None, step=8, channel=1, threshold=30, occupied_fraction=0.15,
+                 motion_fraction=0.02, arrive_frames=2, settle_frames=2, depart_frames=3, votes=3,
+                 settle_timeout=2.0, learn_frames=5, adapt_rate=0.02, first_id=1):
+        self.roi = roi
+        self.step = max(1, int(step))
+        self.channel = channel
+        self.threshold = threshold
+        self.occupied_fraction = occupied_fraction
+        self.motion_fraction = motion_fraction
+        self.arrive_frames = max(1, int(arrive_frames))
+        self.settle_frames = max(1, int(settle_frames))
+        self.depart_frames = max(1, int(depart_frames))
+        self.votes = max(1, int(votes))
+        self.settle_timeout = settle_timeout
+        self.learn_frames = max(1, int(learn_frames))
+        self.adapt_rate = adapt_rate
+        self.next_id = first_id
+        self.state = EMPTY
+        self.part = None
+        self.occupancy = 0.0
+        self.motion = 0.0
+        self.frames = 0
+        self.parts = 0
+        self.missed = 0
+        self._small = None
+        self._prev = None
+        self._diff = None
+        self._background = None         # float32 running average
+        self._background_u8 = None
+        self._learnt = 0
+        self._count = 0                 # consecutive frames towards arrival / departure
+        self._still = 0
+        self._first_seen = None
+        self._first_empty = None
+        self._last_arrival = None
+
+    def reset_background(self):
+        """Re-learns the empty fixture from the next frames (the fixture must be empty)."""
+        self._learnt = 0
+        self.state = EMPTY
+        self.part = None
+        self._count = 0
+
+    @property
+    def learning(self):
+        return self._learnt < self.learn_frames
+
+    @property
+    def wants_detection(self):
+        """True when the current frame should go through the detector."""
+        part = self.part
+        return part is not None and part.t_settled is not None and part.ok is None
+
+    # -------------------------
+    # Per-frame gate
+    # -------------------------
+    def _reduce(self, frame):
+        view = frame
+        if self.roi is not None:
+            x, y, w, h = self.roi
+            view = view[y:y+h, x:x+w]
+        view = view[::self.step, ::self.step]
+        if view.ndim == 3:
+            view = view[:, :, self.channel]
+        if self._small is None or self._small.shape != view.shape:
+            self._small = np.empty(view.shape, np.uint8)
+            self._prev = np.empty(view.shape, np.uint8)
+            self._diff = np.empty(view.shape, np.uint8)
+            self._background = np.zeros(view.shape, np.float32)
+            self._background_u8 = np.empty(view.shape, np.uint8)
+            self._learnt = 0
+        np.copyto(self._small, view)
+        return self._small
+
+    def _fraction(self, a, b):
+        cv2.absdiff(a, b, dst=self._diff)
+        return np.count_nonzero(self._diff > self.threshold) / self._diff.size
+
+    def update(self, frame, t=None):
+        """Feeds one frame; returns the Part that has just left the fixture, or None."""
+        t = time.perf_counter() if t is None else t
+        small = self._reduce(frame)
+        self.frames += 1
+        if self.learning:
+            cv2.accumulateWeighted(small, self._background, 1.0 / (self._learnt + 1))
+            self._learnt += 1
+            self._background_u8[:] = self._background
+            self._prev, self._small = self._small, self._prev
+            return None
+        self.occupancy = self._fraction(small, self._background_u8)
+        self.motion = self._fraction(small, self._prev)
+        self._prev, self._small = self._small, self._prev
+        occupied = self.occupancy >= self.occupied_fraction
+
+        if self.state == EMPTY:
+            if not occupied:
+                self._count = 0
+                # follow slow lighting drift while nothing is there
+                cv2.accumulateWeighted(self._prev, self._background, self.adapt_rate)
+                self._background_u8[:] = self._background
+                return None
+            if self._count == 0:
+                self._first_seen = t
+            self._count += 1
+            if self._count >= self.arrive_frames:
+                self._arrive()
+            return None
+
+        # a part is present
+        part = self.part
+        if occupied:
+            self._count = 0
+        else:
+            if self._count == 0:
+                self._first_empty = t
+            self._count += 1
+            if self._count >= self.depart_frames:
+                return self._depart()
+        if part.t_settled is None:
+            self._still = self._still + 1 if self.motion < self.motion_fraction else 0
+            if self._still >= self.settle_frames or t - part.t_arrive >= self.settle_timeout:
+                part.t_settled = t
+        return None
+
+    def _arrive(self):
+        t = self._first_seen
+        cycle = None if self._last_arrival is None else t - self._last_arrival
+        self.part = Part(self.next_id, t, cycle)
+        self.next_id += 1
+        self._last_arrival = t
+        self.state = PRESENT
+        self._count = 0
+        self._still = 0
+
+    def _depart(self):
+        part = self.part
+        part.t_depart = self._first_empty
+        if part.ok is None:
+            # left before the vote was complete: decide on what was seen,
+            # and reject a part nobody inspected
+            part.missed = not part.results
+            part.ok = majority_vote(part.results) if part.results else False
+            part.t_verdict = part.t_depart
+            if part.missed:
+                self.missed += 1
+        self.parts += 1
+        self.part = None
+        self.state = EMPTY
+        self._count = 0
+        return part
+
+    def finish(self):
+        """Stops tracking the current part and returns it, if its verdict was given.
+
+        For when tracking ends with a plateau still in the fixture: the part
+        keeps its verdict but has no dwell time.
+        """
+        part, self.part = self.part, None
+        self.state = EMPTY
+        self._count = 0
+        if part is None or part.ok is None:
+            return None
+        self.parts += 1
+        return part
+
+    # -------------------------
+    # Detection results
+    # -------------------------
+    def add_result(self, result, t=None):
+        """Adds the detection of the current frame; returns the Part once its verdict is in."""
+        part = self.part
+        if part is None or part.ok is not None:
+            return None
+        part.results.append(result)
+        if len(part.results) < self.votes:
+            return None
+        part.ok = majority_vote(part.results)
+        part.t_verdict = time.perf_counter() if t is None else t
+        return part
+
+    def status(self):
+        """Short text for the live view."""
+        if self.learning:
+            return "learning empty fixture"
+        part = self.part
+        if part is None:
+            return f"empty ({self.occupancy * 100:.0f}%)"
+        if part.ok is None:
+            return f"plateau {part.id}: " + ("inspecting" if part.t_settled is not None else "settling")
+        return f"plateau {part.id}: {part.verdict}"
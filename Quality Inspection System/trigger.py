@@ -0,0 +1,241 @@
+import time
+import queue
+import threading
+from collections import deque
+
+from pipeline import FramePacket, DropOldestQueue
+
+# -------------------------
+# Verdict outputs
+# -------------------------
+class GpioOutputs:
+    """Drives the reject gate and the LEDs for one verdict."""
+    def __init__(self, gpio, pin_ctrl, pin_green, pin_red):
+        self.gpio = gpio
+        self.pin_ctrl = pin_ctrl
+        self.pin_green = pin_green
+        self.pin_red = pin_red
+
+    def apply(self, ok):
+        g = self.gpio
+        if ok:
+            g.output(self.pin_ctrl, g.LOW)
+            g.output(self.pin_green, g.HIGH)
+            g.output(self.pin_red, g.LOW)
+        else:
+            g.output(self.pin_ctrl, g.HIGH)
+            g.output(self.pin_green, g.LOW)
+            g.output(self.pin_red, g.HIGH)
+
+    def clear(self):
+        for pin in (self.pin_ctrl, self.pin_green, self.pin_red):
+            self.gpio.output(pin, self.gpio.LOW)
+
+
+# -------------------------
+# Inspection outcome
+# -------------------------
+class Inspection:
+    """Result of one triggered inspection (a burst of frames and their vote)."""
+    def __init__(self, seq, t_trigger, results, ok, t_first_frame, t_verdict):
+        self.seq = seq
+        self.t_trigger = t_trigger
+        self.results = results
+        self.ok = ok
+        self.t_first_frame = t_first_frame
+        self.t_verdict = t_verdict
+
+    @property
+    def verdict(self):
+        return "OK" if self.ok else "NOK"
+
+    @property
+    def capture_latency(self):
+        return self.t_first_frame - self.t_trigger
+
+    @property
+    def latency(self):
+        """Trigger edge -> outputs written, in seconds."""
+        return self.t_verdict - self.t_trigger
+
+
+def majority_vote(results):
+    """OK only when a strict majority of the burst is OK; ties reject the part."""
+    ok_votes = sum(1 for r in results if r.ok)
+    return ok_votes * 2 > len(results)
+
+
+# -------------------------
+# Triggered inspector
+# -------------------------
+class TriggeredInspector:
+    """Inspects only when the part-present trigger fires.
+
+    `trigger()` is safe to call from the GPIO callback thread; every edge is
+    queued with its timestamp so none is lost while a burst is in progress.
+    After a trigger, `discard` frames are dropped (they may have been exposed
+    before the edge) and the next `burst` frames are detected and voted on.
+    Between triggers the camera is only read every `preview_interval` seconds
+    for the low-rate preview (`on_preview(packet)`), or not at all when no
+    preview callback is given. A preview frame is grabbed only while no
+    trigger is queued and is detected on a separate preview thread, so a
+    trigger never waits behind a preview detection; a preview grabbed before
+    an inspection is dropped rather than shown over its verdict. The preview
+    thread detects with its own `detector.clone()`, so the two threads never
+    share a detector's buffers or counters.
+
+    With a `metrics` registry, capture, detection stages, the GPIO write and
+    trigger-to-capture / trigger-to-verdict times are recorded per part.
+    """
+    def __init__(self, camera, detector, outputs, burst=3, discard=1,
+                 preview_interval=0.5, on_preview=None, on_inspection=None, history=1000,
+                 metrics=None):
+        self.camera = camera
+        self.detector = detector
+        self.outputs = outputs
+        self.burst = max(1, int(burst))
+        self.discard = max(0, int(discard))
+        self.preview_interval = preview_interval
+        self.on_preview = on_preview
+        self.on_inspection = on_inspection
+        self.metrics = metrics
+        self.triggers = queue.Queue()
+        self.latencies = deque(maxlen=history)
+        self.inspections = 0
+        self.last_inspection = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._previews = DropOldestQueue(1)
+        self._preview_detector = detector.clone() if on_preview is not None else None
+        self._preview_thread = None
+        self._inspecting = False
+
+    def trigger(self, t=None):
+        self.triggers.put(time.perf_counter() if t is None else t)
+
+    def inspect(self, t_trigger):
+        self._inspecting = True
+        try:
+            return self._inspect(t_trigger)
+        finally:
+            self._inspecting = False
+
+    def _inspect(self, t_trigger):
+        for _ in range(self.discard):
+            self.camera.capture_array()
+        results = []
+        packets = []
+        t_first = None
+        metrics = self.metrics
+        for i in range(self.burst):
+            t0 = time.perf_counter()
+            frame = self.camera.capture_array()
+            t_frame = time.perf_counter()
+            if t_first is None:
+                t_first = t_frame
+            packet = FramePacket(i, frame, t_frame)
+            packet.result = self.detector.detect(frame)
+            results.append(packet.result)
+            packets.append(packet)
+            if metrics is not None:
+                metrics.record("capture", t_frame - t0)
+                metrics.record_timings("detect", packet.result.timings)
+        ok = majority_vote(results)
+        t_gpio = time.perf_counter()
+        self.outputs.apply(ok)
+        t_verdict = time.perf_counter()
+        if metrics is not None:
+            metrics.record("gpio.write", t_verdict - t_gpio)
+            metrics.record("trigger.capture", t_first - t_trigger)
+            metrics.record("trigger.verdict", t_verdict - t_trigger)
+
+        inspection = Inspection(self.inspections, t_trigger, results, ok, t_first, t_verdict)
+        inspection.packets = packets
+        self.inspections += 1
+        self.last_inspection = inspection
+        self.latencies.append(inspection.latency)
+        if self.on_inspection is not None:
+            self.on_inspection(inspection)
+        return inspection
+
+    def preview(self):
+        """Grabs a preview frame for the preview thread; False when a trigger is waiting."""
+        if not self.triggers.empty():
+            return False
+        frame = self.camera.capture_array()
+        if not self.triggers.empty():
+            return False                # a part arrived during the capture: serve it first
+        packet = FramePacket(-1, frame, time.perf_counter())
+        packet.inspections = self.inspections
+        self._previews.put(packet)
+        return True
+
+    def _preview_loop(self):
+        while not self._stop.is_set():
+            packet = self._previews.get(timeout=0.5)
+            if packet is None or self._stale(packet):
+                continue
+            packet.result = self._preview_detector.detect(packet.frame)
+            if not self._stale(packet):
+                self.on_preview(packet)
+
+    def _stale(self, packet):
+        # an inspection started or finished since the preview frame was grabbed
+        return self._inspecting or not self.triggers.empty() or packet.inspections != self.inspections
+
+    def run_once(self, timeout):
+        """Waits up to `timeout` for a trigger; returns the inspection or None."""
+        try:
+            t_trigger = self.triggers.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return self.inspect(t_trigger)
+
+    def run(self):
+        while not self._stop.is_set():
+            if self.run_once(self.preview_interval) is None and self.on_preview is not None \
+                    and not self._stop.is_set():
+                self.preview()
+
+    def start(self):
+        if self.on_preview is not None:
+            self._preview_thread = threading.Thread(target=self._preview_guarded,
+                                                    name="trigger-preview", daemon=True)
+            self._preview_thread.start()
+        self._thread = threading.Thread(target=self._run_guarded, name="triggered-inspector", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run_guarded(self):
+        try:
+            self.run()
+        except Exception as e:
+            print("Triggered inspection error:", e)
+
+    def _preview_guarded(self):
+        try:
+            self._preview_loop()
+        except Exception as e:
+            print("Trigger preview error:", e)
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        self._previews.close()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._preview_thread is not None:
+            self._preview_thread.join(timeout)
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def latency_summary(self):
+        """Trigger-to-verdict latency percentiles in milliseconds."""
+        samples = sorted(self.latencies)
+        if not samples:
+            return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+        def pct(q):
+            return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000.0
+        return {"count": len(samples), "p50": pct(0.50), "p95": pct(0.95),
+                "p99": pct(0.99), "max": samples[-1] * 1000.0}
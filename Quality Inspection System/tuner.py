@@ -0,0 +1,406 @@
+"""Parallel sweep of the detection parameters over a labelled frame set.
+
+Frames of good and bad parts are decoded once into shared memory; every
+worker process evaluates whole configurations against them, e.g.:
+
+    python tuner.py labelled/ --samples 300
+    python tuner.py labelled/ --grid --set kernel_size=3,5 --set min_area=30,50,100
+    python tuner.py labelled.npz --max-false-reject 0.5 --csv sweep.csv
+
+`labelled/` holds `good/` and `bad/` image directories (recorded with cv2,
+so BGR); a `.npz` holds an RGB `frames` stack and a boolean `ok` array.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import random
+import signal
+import argparse
+import itertools
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import cv2
+
+from detection import ClipDetector, CoarseToFineDetector, DetectionParams, ENGINES, parse_roi
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+GOOD_DIRS = ("good", "ok")
+BAD_DIRS = ("bad", "nok")
+
+# Values tried for each parameter (the hand-tuned line setup is
+# h 20-30, s/v >= 100, 5x5 kernel, 1 iteration, area > 50, contours)
+SEARCH_SPACE = {
+    "h_low": [15, 20, 25],
+    "h_high": [30, 35, 40],
+    "s_min": [70, 100, 130],
+    "v_min": [70, 100, 130],
+    "kernel_size": [3, 5, 7],
+    "iterations": [0, 1, 2],
+    "min_area": [30, 50, 100, 200],
+    "engine": list(ENGINES),
+    "lut": [False, True],
+    "coarse_scale": [None, 2],
+}
+
+PARAM_TYPES = {"h_low": int, "h_high": int, "s_min": int, "v_min": int, "kernel_size": int,
+               "iterations": int, "min_area": float, "engine": str}
+
+
+# -------------------------
+# Labelled frames
+# -------------------------
+def _read_dir(path):
+    frames = []
+    for name in sorted(os.listdir(path)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        img = cv2.imread(os.path.join(path, name), cv2.IMREAD_COLOR)
+        if img is None:
+            print("Warning: could not read", name)
+            continue
+        frames.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    return frames
+
+
+def load_labelled(path):
+    """(frames, ok labels) from a good/ + bad/ directory or a .npz with `frames` and `ok`."""
+    if os.path.isfile(path) and path.endswith(".npz"):
+        with np.load(path) as data:
+            frames = [np.ascontiguousarray(f) for f in data["frames"]]
+            labels = [bool(v) for v in data["ok"]]
+        return frames, labels
+    if not os.path.isdir(path):
+        raise ValueError(f"not a labelled directory or .npz: {path}")
+    frames, labels = [], []
+    for names, ok in ((GOOD_DIRS, True), (BAD_DIRS, False)):
+        for name in names:
+            sub = os.path.join(path, name)
+            if os.path.isdir(sub):
+                found = _read_dir(sub)
+                frames.extend(found)
+                labels.extend([ok] * len(found))
+    return frames, labels
+
+
+class SharedFrames:
+    """Decoded frames packed into one shared-memory block.
+
+    Frames may differ in size; `spec` (block name + offset / shape / dtype
+    per frame) is all a worker needs to map them as read-only numpy views,
+    so no frame is pickled or copied per worker or per configuration.
+    """
+    def __init__(self, frames):
+        layout = []
+        offset = 0
+        for f in frames:
+            layout.append((offset, f.shape, f.dtype.str))
+            offset += f.nbytes
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for f, (start, shape, dtype) in zip(frames, layout):
+            view = np.ndarray(shape, dtype, buffer=self.shm.buf, offset=start)
+            view[...] = f
+            del view
+        self.spec = (self.shm.name, layout)
+        self.nbytes = offset
+
+    @staticmethod
+    def attach(spec):
+        """(shared memory handle, list of frame views) in a worker process."""
+        name, layout = spec
+        shm = shared_memory.SharedMemory(name=name)
+        views = []
+        for start, shape, dtype in layout:
+            view = np.ndarray(shape, dtype, buffer=shm.buf, offset=start)
+            view.flags.writeable = False
+            views.append(view)
+        return shm, views
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# -------------------------
+# Configurations
+# -------------------------
+def make_detector(config, base):
+    """Detector for one configuration; ROI, colour order and clip count come from `base`."""
+    params = DetectionParams(
+        yellow_lower=(config["h_low"], config["s_min"], config["v_min"]),
+        yellow_upper=(config["h_high"], 255, 255),
+        kernel_size=config["kernel_size"], iterations=config["iterations"],
+        min_area=config["min_area"], expected_clips=base.expected_clips, roi=base.roi,
+        color_order=base.color_order, lut=config["lut"], engine=config["engine"])
+    if config["coarse_scale"]:
+        return CoarseToFineDetector(params, config["coarse_scale"])
+    return ClipDetector(params)
+
+
+def _valid(config):
+    return config["h_low"] < config["h_high"] and config["kernel_size"] % 2 == 1
+
+
+def grid(space):
+    """Every combination of the space's values."""
+    keys = list(space)
+    for values in itertools.product(*(space[k] for k in keys)):
+        config = dict(zip(keys, values))
+        if _valid(config):
+            yield config
+
+
+def random_configs(space, samples, seed=0):
+    """`samples` distinct random combinations (fewer if the space is smaller)."""
+    rng = random.Random(seed)
+    keys = list(space)
+    size = 1
+    for k in keys:
+        size *= len(space[k])
+    seen = set()
+    attempts = 0
+    while len(seen) < samples and attempts < samples * 50 and len(seen) < size:
+        attempts += 1
+        config = {k: rng.choice(space[k]) for k in keys}
+        key = tuple(config[k] for k in keys)
+        if key in seen or not _valid(config):
+            continue
+        seen.add(key)
+        yield config
+
+
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"expected an integer >= 1, got {text}")
+    return value
+
+
+def parse_setting(text):
+    """"name=v1,v2" -> (name, [values]) with the parameter's type."""
+    name, _, values = text.partition("=")
+    name = name.strip()
+    if name not in SEARCH_SPACE or not values:
+        raise argparse.ArgumentTypeError(f"expected one of {', '.join(SEARCH_SPACE)} as name=v1,v2")
+    out = []
+    for v in values.split(","):
+        v = v.strip()
+        if name == "lut":
+            out.append(v.lower() in ("1", "true", "yes", "on"))
+        elif name == "coarse_scale":
+            out.append(None if v.lower() in ("none", "0", "") else int(v))
+        else:
+            out.append(PARAM_TYPES[name](v))
+    return name, out
+
+
+# -------------------------
+# Worker side
+# -------------------------
+_worker = {}
+
+
+def _init_worker(spec, labels, base):
+    # the controller handles Ctrl-C; one config per core, so no OpenCV threads
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cv2.setNumThreads(1)
+    shm, frames = SharedFrames.attach(spec)
+    _worker.update(shm=shm, frames=frames, labels=labels, base=base)
+
+
+def evaluate(job):
+    """Runs one configuration over every frame; returns its scores."""
+    index, config, repeat = job
+    frames, labels = _worker["frames"], _worker["labels"]
+    detector = make_detector(config, _worker["base"])
+    detector.detect(frames[0])      # warm-up (LUT, buffers)
+    times = np.empty(len(frames))
+    good_ok = good_rejected = bad_ok = bad_rejected = 0
+    for i, (frame, ok) in enumerate(zip(frames, labels)):
+        best = None
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            result = detector.detect(frame)
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        times[i] = best
+        if ok:
+            good_ok += result.ok
+            good_rejected += not result.ok
+        else:
+            bad_ok += result.ok
+            bad_rejected += not result.ok
+    good, bad = good_ok + good_rejected, bad_ok + bad_rejected
+    return {
+        "id": index,
+        "config": config,
+        "accuracy": 100.0 * (good_ok + bad_rejected) / len(frames),
+        "false_reject": 100.0 * good_rejected / good if good else 0.0,
+        "escape": 100.0 * bad_ok / bad if bad else 0.0,
+        # rows: actual good / bad; columns: passed / rejected
+        "confusion": [[good_ok, good_rejected], [bad_ok, bad_rejected]],
+        "ms_p50": float(np.median(times)) * 1000.0,
+        "ms_mean": float(times.mean()) * 1000.0,
+    }
+
+
+# -------------------------
+# Sweep
+# -------------------------
+def default_context():
+    """Workers forked from a server that preloaded this module (as in stations.py)."""
+    ctx = mp.get_context("forkserver")
+    ctx.set_forkserver_preload(["tuner"])
+    return ctx
+
+
+def sweep(frames, labels, configs, base=None, processes=None, repeat=1, context=None, progress=None):
+    """Evaluates every configuration on `processes` worker processes (default: all cores)."""
+    base = base or DetectionParams()
+    configs = list(configs)
+    shared = SharedFrames(frames)
+    ctx = context or default_context()
+    results = []
+    try:
+        with ctx.Pool(processes or os.cpu_count(), initializer=_init_worker,
+                      initargs=(shared.spec, list(labels), base)) as pool:
+            jobs = [(i, c, repeat) for i, c in enumerate(configs)]
+            for r in pool.imap_unordered(evaluate, jobs):
+                results.append(r)
+                if progress is not None:
+                    progress(len(results), len(configs))
+    finally:
+        shared.close()
+    results.sort(key=lambda r: r["id"])
+    return results
+
+
+def pareto_front(results):
+    """Configurations no other one beats on both speed (ms_p50) and accuracy, fastest first."""
+    front = []
+    best = -1.0
+    for r in sorted(results, key=lambda r: (r["ms_p50"], -r["accuracy"])):
+        if r["accuracy"] > best:
+            front.append(r)
+            best = r["accuracy"]
+    return front
+
+
+def recommend(results, max_false_reject=1.0, max_escape=0.0):
+    """Fastest configuration within the quality targets (percent), or None."""
+    ok = [r for r in results if r["false_reject"] <= max_false_reject and r["escape"] <= max_escape]
+    return min(ok, key=lambda r: (r["ms_p50"], -r["accuracy"])) if ok else None
+
+
+def params_text(config):
+    """The configuration as lines to paste into main.py: DetectionParams(...) and COARSE_SCALE."""
+    text = (f"DetectionParams(yellow_lower=({config['h_low']}, {config['s_min']}, {config['v_min']}), "
+            f"yellow_upper=({config['h_high']}, 255, 255), kernel_size={config['kernel_size']}, "
+            f"iterations={config['iterations']}, min_area={config['min_area']:g}, "
+            f"lut={config['lut']}, engine=\"{config['engine']}\")")
+    if config["coarse_scale"]:
+        text += f"\nCOARSE_SCALE = {config['coarse_scale']}"
+    return text
+
+
+# -------------------------
+# Command line
+# -------------------------
+def _row(r, front_ids):
+    c = r["config"]
+    (go, gr), (bo, br) = r["confusion"]
+    return (f"{'*' if r['id'] in front_ids else ' '}{r['id']:>5} {r['accuracy']:6.1f}% "
+            f"{r['false_reject']:6.1f}% {r['escape']:6.1f}%  {go:>4}/{gr:<4} {bo:>4}/{br:<4} "
+            f"{r['ms_p50']:7.2f} {r['ms_mean']:7.2f}  "
+            f"h {c['h_low']}-{c['h_high']} s>={c['s_min']} v>={c['v_min']} k{c['kernel_size']}x{c['iterations']} "
+            f"area>{c['min_area']:g} {c['engine']}{' lut' if c['lut'] else ''}"
+            f"{' coarse/' + str(c['coarse_scale']) if c['coarse_scale'] else ''}")
+
+
+def write_csv(results, path, front_ids):
+    keys = list(SEARCH_SPACE)
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "pareto"] + keys + ["accuracy", "false_reject", "escape", "good_ok",
+                                               "good_rejected", "bad_ok", "bad_rejected",
+                                               "ms_p50", "ms_mean"])
+        for r in results:
+            (go, gr), (bo, br) = r["confusion"]
+            w.writerow([r["id"], int(r["id"] in front_ids)] + [r["config"][k] for k in keys]
+                       + [f"{r['accuracy']:.2f}", f"{r['false_reject']:.2f}", f"{r['escape']:.2f}",
+                          go, gr, bo, br, f"{r['ms_p50']:.4f}", f"{r['ms_mean']:.4f}"])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Detection parameter sweep over labelled frames")
+    parser.add_argument("frames", help="directory with good/ and bad/ images, or .npz with frames + ok")
+    parser.add_argument("--grid", action="store_true", help="every combination instead of a random sample")
+    parser.add_argument("--samples", type=int, default=200, help="random configurations to try")
+    parser.add_argument("--set", type=parse_setting, action="append", default=[], metavar="NAME=V1,V2",
+                        help="values to try for one parameter (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--repeat", type=positive_int, default=1, help="timed runs per frame (fastest is kept)")
+    parser.add_argument("--clips", type=int, default=2, help="expected clip count for an OK part")
+    parser.add_argument("--roi", help='clip windows "x,y,w,h;x,y,w,h"')
+    parser.add_argument("--max-false-reject", type=float, default=1.0, help="target, percent of good parts")
+    parser.add_argument("--max-escape", type=float, default=0.0, help="target, percent of bad parts")
+    parser.add_argument("--top", type=int, default=15, help="rows of the accuracy ranking to print")
+    parser.add_argument("--csv", help="write every result to this file")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    frames, labels = load_labelled(args.frames)
+    if not frames:
+        print("No labelled frames found in", args.frames)
+        return 1
+    space = dict(SEARCH_SPACE)
+    space.update(dict(args.set))
+    configs = list(grid(space) if args.grid else random_configs(space, args.samples, args.seed))
+    base = DetectionParams(expected_clips=args.clips, roi=parse_roi(args.roi) if args.roi else None)
+
+    def progress(done, total):
+        if not args.json and (done == total or done % max(1, total // 10) == 0):
+            print(f"  {done}/{total} configurations", file=sys.stderr)
+
+    t0 = time.perf_counter()
+    results = sweep(frames, labels, configs, base, args.processes, args.repeat, progress=progress)
+    elapsed = time.perf_counter() - t0
+    front = pareto_front(results)
+    front_ids = {r["id"] for r in front}
+    best = recommend(results, args.max_false_reject, args.max_escape)
+    if args.csv:
+        write_csv(results, args.csv, front_ids)
+    if args.json:
+        print(json.dumps({"frames": len(frames), "good": sum(labels), "configs": len(results),
+                          "seconds": elapsed, "results": results, "pareto": [r["id"] for r in front],
+                          "recommended": best["id"] if best else None}))
+        return 0
+
+    header = ("    id  accuracy  f.rej  escape  good ok/rej  bad ok/rej  ms p50  ms mean  configuration")
+    print(f"{len(results)} configurations x {len(frames)} frames ({sum(labels)} good, "
+          f"{len(labels) - sum(labels)} bad) in {elapsed:.1f} s on {args.processes or os.cpu_count()} processes")
+    print(f"\nMost accurate (* = on the speed/accuracy Pareto front):\n{header}")
+    for r in sorted(results, key=lambda r: (-r["accuracy"], r["ms_p50"]))[:args.top]:
+        print(_row(r, front_ids))
+    print(f"\nPareto front, fastest first:\n{header}")
+    for r in front:
+        print(_row(r, front_ids))
+    if best is None:
+        print(f"\nNo configuration meets false reject <= {args.max_false_reject}% and "
+              f"escape <= {args.max_escape}%")
+        return 2
+    print(f"\nFastest within false reject <= {args.max_false_reject}% and escape <= {args.max_escape}%:")
+    print(_row(best, front_ids))
+    for line in params_text(best["config"]).splitlines():
+        print("  " + line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
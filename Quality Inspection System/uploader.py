@@ -0,0 +1,143 @@
+import json
+import random
+import sqlite3
+import threading
+import urllib.request
+import urllib.error
+
+# -------------------------
+# Transports
+# -------------------------
+class UploadError(Exception):
+    """A batch could not be delivered; the uploader retries it later."""
+
+
+def to_plateau_rows(records):
+    """Maps journal records to the rows plateau_batch.php inserts into plateau_monitor.
+
+    Only records with a plateau number and a dwell time belong there
+    (InspectionJournal.pending() returns no others); anything else is an error.
+    """
+    for r in records:
+        if r["plateau_number"] is None or r["duration_seconds"] is None:
+            raise ValueError(f"record {r['uid']} has no plateau number / duration")
+    return [{
+        "uid": r["uid"],
+        "plateau_number": r["plateau_number"],
+        "duration_seconds": r["duration_seconds"],
+        "record_time": r["ts"],
+        "ok": int(r["ok"]),
+        "station": r["station"],
+    } for r in records]
+
+
+class HttpTransport:
+    """POSTs a JSON batch to Dashbaord/plateau_batch.php."""
+    def __init__(self, url, timeout=5.0, token=None):
+        self.url = url
+        self.timeout = timeout
+        self.token = token
+
+    def send(self, rows):
+        body = json.dumps({"records": rows}).encode("utf-8")
+        req = urllib.request.Request(self.url, data=body, method="POST",
+                                     headers={"Content-Type": "application/json"})
+        if self.token:
+            req.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                reply = json.loads(resp.read().decode("utf-8") or "{}")
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise UploadError(str(e)) from e
+        if reply.get("status") != "ok":
+            raise UploadError(reply.get("error", "unexpected reply"))
+        return reply
+
+
+class SqliteTransport:
+    """Local stand-in for the dashboard database (same idempotent insert)."""
+    def __init__(self, path):
+        self.path = path
+        with sqlite3.connect(path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS plateau_monitor (
+                    id INTEGER PRIMARY KEY,
+                    record_uid TEXT UNIQUE,
+                    plateau_number INTEGER,
+                    duration_seconds REAL,
+                    record_time REAL
+                )""")
+
+    def send(self, rows):
+        try:
+            with sqlite3.connect(self.path, timeout=5.0) as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO plateau_monitor "
+                    "(record_uid, plateau_number, duration_seconds, record_time) VALUES (?, ?, ?, ?)",
+                    [(r["uid"], r["plateau_number"], r["duration_seconds"], r["record_time"]) for r in rows])
+        except sqlite3.Error as e:
+            raise UploadError(str(e)) from e
+        return {"status": "ok", "received": len(rows)}
+
+
+# -------------------------
+# Batch uploader
+# -------------------------
+class BatchUploader(threading.Thread):
+    """Drains not-yet-uploaded journal records to the dashboard in batches.
+
+    Runs on its own thread and only reads the journal, so a slow or absent
+    dashboard host never reaches the inspection loop. Failed batches are
+    retried with capped exponential backoff (with jitter); every record
+    carries its journal uid, so a batch that was stored but not acknowledged
+    is simply ignored by the server on the retry.
+    """
+    def __init__(self, journal, transport, batch_size=200, poll_interval=2.0,
+                 min_backoff=1.0, max_backoff=120.0):
+        super().__init__(name="batch-uploader", daemon=True)
+        self.journal = journal
+        self.transport = transport
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.sent = 0
+        self.failures = 0
+        self.last_error = None
+        self._backoff = 0.0
+        self._stop_event = threading.Event()
+
+    def start(self):
+        # keep records the dashboard has not seen from being rotated away
+        self.journal.hold_unuploaded = True
+        super().start()
+
+    def upload_once(self):
+        """Sends one batch; returns the number of records delivered (0 = nothing to do)."""
+        records = self.journal.pending(self.batch_size)
+        if not records:
+            return 0
+        self.transport.send(to_plateau_rows(records))
+        self.journal.mark_uploaded([r["uid"] for r in records])
+        self.sent += len(records)
+        return len(records)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                delivered = self.upload_once()
+                self._backoff = 0.0
+                # a full batch means there is a backlog: keep draining
+                delay = 0.0 if delivered == self.batch_size else self.poll_interval
+            except (UploadError, sqlite3.Error) as e:
+                self.failures += 1
+                self.last_error = str(e)
+                self._backoff = min(self.max_backoff, max(self.min_backoff, self._backoff * 2))
+                delay = self._backoff * random.uniform(0.5, 1.0)
+            if delay:
+                self._stop_event.wait(delay)
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        self.join(timeout)
+        self.journal.hold_unuploaded = False